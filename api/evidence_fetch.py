@@ -0,0 +1,132 @@
+"""
+Evidence Fetcher for F3 Quality Check
+Downloads STL files and QC photos concurrently with a shared, pooled async HTTP client
+"""
+
+import asyncio
+import os
+from typing import List, Optional
+
+import httpx
+
+# Tunables (override via environment)
+FETCH_CONCURRENCY = int(os.getenv('QC_FETCH_CONCURRENCY', '8'))  # max in-flight downloads per request
+FETCH_TIMEOUT = float(os.getenv('QC_FETCH_TIMEOUT', '30'))  # per-download timeout (seconds)
+FETCH_DEADLINE = float(os.getenv('QC_FETCH_DEADLINE', '60'))  # overall deadline for one request (seconds)
+FETCH_MAX_BYTES = int(os.getenv('QC_FETCH_MAX_MB', '100')) * 1024 * 1024  # per downloaded file
+POOL_MAX_CONNECTIONS = int(os.getenv('QC_FETCH_MAX_CONNECTIONS', '32'))
+POOL_MAX_KEEPALIVE = int(os.getenv('QC_FETCH_MAX_KEEPALIVE', '16'))
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class FetchTooLarge(ValueError):
+    """A download exceeded its byte limit"""
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled client (created lazily, keep-alive enabled)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(FETCH_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            ),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared client (called on app shutdown)"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+async def fetch_all(
+    urls: List[str],
+    client: Optional[httpx.AsyncClient] = None,
+    concurrency: int = FETCH_CONCURRENCY,
+    deadline: float = FETCH_DEADLINE,
+    max_bytes: int = FETCH_MAX_BYTES,
+    max_total_bytes: Optional[int] = None,
+) -> List[Optional[bytes]]:
+    """
+    Download all URLs in parallel
+
+    Bodies are streamed, and a download is aborted as soon as it passes max_bytes (or
+    declares a larger Content-Length), so one huge URL cannot exhaust memory.
+
+    Args:
+        urls: URLs to download
+        client: Optional client (defaults to the shared pooled client)
+        concurrency: Max simultaneous downloads for this call
+        deadline: Overall deadline in seconds; unfinished downloads are cancelled
+        max_bytes: Byte limit per download
+        max_total_bytes: Byte limit over all downloads of this call (None: unlimited)
+
+    Returns:
+        List aligned with urls; None for downloads that failed, were too large or missed
+        the deadline
+
+    Raises:
+        FetchTooLarge: if the downloads together pass max_total_bytes (all are cancelled)
+    """
+    if not urls:
+        return []
+
+    client = client or get_client()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    received = 0  # bytes over all downloads of this call
+    over_total = False
+
+    async def _fetch(url: str) -> bytes:
+        nonlocal received, over_total
+        async with semaphore:
+            async with client.stream('GET', url) as response:
+                response.raise_for_status()
+                declared = response.headers.get('content-length')
+                if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+                    raise FetchTooLarge(f"{declared} bytes exceeds the {max_bytes} byte limit")
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    received += len(chunk)
+                    if len(body) > max_bytes:
+                        raise FetchTooLarge(f"more than the {max_bytes} byte limit")
+                    if max_total_bytes is not None and received > max_total_bytes:
+                        # The call fails as a whole: stop the other downloads too
+                        over_total = True
+                        for task in tasks:
+                            if task is not asyncio.current_task():
+                                task.cancel()
+                        raise FetchTooLarge(f"downloads exceed the {max_total_bytes} byte limit")
+                return bytes(body)
+
+    tasks = [asyncio.create_task(_fetch(url)) for url in urls]
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    if over_total:
+        for task in done:
+            if not task.cancelled():
+                task.exception()  # mark as retrieved: the call fails as a whole
+        raise FetchTooLarge(f"Downloads exceed the {max_total_bytes} byte limit")
+
+    results: List[Optional[bytes]] = []
+    for url, task in zip(urls, tasks):
+        if task in pending:
+            print(f"Warning: Download of {url} missed the {deadline:.0f}s deadline")
+            results.append(None)
+        elif task.exception() is not None:
+            print(f"Warning: Could not download {url}: {task.exception()}")
+            results.append(None)
+        else:
+            results.append(task.result())
+    return results
@@ -0,0 +1,170 @@
+"""
+Streaming Evidence Upload for F3 Quality Check
+Parses multipart/form-data uploads as the body arrives, yielding each field or file as
+soon as its part is complete (so analysis can start while later files are still uploading)
+"""
+
+import os
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from starlette.requests import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    from multipart.multipart import MultipartParser, parse_options_header
+
+try:
+    from PIL import ImageFile
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Tunables (override via environment)
+UPLOAD_MAX_BYTES = int(os.getenv('QC_UPLOAD_MAX_MB', '200')) * 1024 * 1024  # whole request body
+UPLOAD_MAX_FIELD_BYTES = 64 * 1024  # non-file form fields (job_id, tier, JSON dimensions)
+
+
+class UploadError(ValueError):
+    """Malformed or oversized upload (status_code is the HTTP status to answer with)"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadedPart:
+    """One form field or file of a multipart upload"""
+
+    def __init__(
+        self,
+        name: str,
+        filename: Optional[str],
+        content_type: Optional[str],
+        inspect_image: bool,
+        max_image_pixels: Optional[int] = None,
+    ):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.data = bytearray()
+        self.image_size: Optional[tuple] = None  # (width, height) from the header, once known
+        self.max_image_pixels = max_image_pixels
+        # Incremental image parser, fed only until the header has been read
+        self._header_parser = ImageFile.Parser() if inspect_image and PIL_AVAILABLE else None
+
+    @property
+    def is_file(self) -> bool:
+        return self.filename is not None
+
+    @property
+    def value(self) -> str:
+        """Text value of a form field"""
+        return self.data.decode('utf-8', errors='replace')
+
+    def feed(self, chunk: bytes):
+        self.data += chunk
+        if not self.is_file and len(self.data) > UPLOAD_MAX_FIELD_BYTES:
+            raise UploadError(f"Form field '{self.name}' is too large")
+        if self._header_parser is not None:
+            try:
+                self._header_parser.feed(chunk)
+            except Exception:
+                self._header_parser = None  # not an image PIL knows; the model reports it
+                return
+            if self._header_parser.image is not None:
+                self.image_size = self._header_parser.image.size
+                self._header_parser = None  # decoding is left to the model (reduced-resolution)
+                width, height = self.image_size
+                if self.max_image_pixels and width * height > self.max_image_pixels:
+                    raise UploadError(
+                        f"Image {self.filename} is {width}x{height}, above the {self.max_image_pixels} px limit"
+                    )
+
+
+async def iter_multipart(
+    request: Request,
+    image_fields: Iterable[str] = (),
+    max_image_pixels: Optional[int] = None,
+) -> AsyncIterator[UploadedPart]:
+    """
+    Yield the parts of a multipart/form-data request as each one finishes arriving
+
+    Args:
+        request: Incoming request (its body is consumed as a stream)
+        image_fields: File fields whose image header is parsed as it arrives (see
+            UploadedPart.image_size), so oversized images can be rejected early
+        max_image_pixels: Reject images in image_fields above this many pixels (from the header)
+
+    Raises:
+        UploadError: if the body is not multipart/form-data, exceeds UPLOAD_MAX_BYTES, or
+            holds an image above max_image_pixels
+    """
+    content_type, params = parse_options_header(request.headers.get('content-type', ''))
+    boundary = params.get(b'boundary')
+    if content_type != b'multipart/form-data' or not boundary:
+        raise UploadError("Expected a multipart/form-data body")
+
+    image_fields = set(image_fields)
+    completed: List[UploadedPart] = []
+    state: Dict = {'part': None, 'header_field': b'', 'header_value': b'', 'headers': {}}
+
+    def on_part_begin():
+        state['headers'] = {}
+
+    def on_header_field(data, start, end):
+        state['header_field'] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state['header_value'] += data[start:end]
+
+    def on_header_end():
+        state['headers'][state['header_field'].lower()] = state['header_value']
+        state['header_field'], state['header_value'] = b'', b''
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state['headers'].get(b'content-disposition', b''))
+        name = disposition.get(b'name', b'').decode('utf-8', errors='replace')
+        filename = disposition.get(b'filename')
+        content_type = state['headers'].get(b'content-type')
+        state['part'] = UploadedPart(
+            name,
+            filename.decode('utf-8', errors='replace') if filename is not None else None,
+            content_type.decode('latin-1') if content_type else None,
+            inspect_image=filename is not None and name in image_fields,
+            max_image_pixels=max_image_pixels,
+        )
+
+    def on_part_data(data, start, end):
+        state['part'].feed(data[start:end])
+
+    def on_part_end():
+        completed.append(state['part'])
+        state['part'] = None
+
+    parser = MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end,
+    })
+
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > UPLOAD_MAX_BYTES:
+            raise UploadError(f"Upload exceeds {UPLOAD_MAX_BYTES // (1024 * 1024)} MB", status_code=413)
+        try:
+            parser.write(chunk)
+        except UploadError:
+            raise
+        except Exception as e:
+            raise UploadError(f"Malformed multipart body: {e}")
+        while completed:
+            yield completed.pop(0)
+    parser.finalize()
+    while completed:
+        yield completed.pop(0)
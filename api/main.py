@@ -3,6 +3,7 @@ FastAPI Server for M.A.M.A AI Models
 Handles all AI model endpoints: F1-F4, rating, pricing
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -12,10 +13,32 @@ import os
 # Add models directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'models'))
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Worker processes for queued QC jobs (QC_JOB_WORKERS=0 to run them separately)
+    try:
+        from qc_jobs import start_workers
+        start_workers()
+    except ImportError:
+        pass
+    yield
+    try:
+        from qc_jobs import stop_workers
+        stop_workers()
+    except ImportError:
+        pass
+    # Close pooled HTTP client used for QC evidence downloads
+    try:
+        from evidence_fetch import close_client
+        await close_client()
+    except ImportError:
+        pass
+
 app = FastAPI(
     title="M.A.M.A AI Models API",
     description="AI endpoints for Maker Ranking, Pay Estimation, Quality Check, and Workflow Scheduling",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware - allow Next.js frontend
@@ -0,0 +1,415 @@
+"""
+Durable Job Queue for F3 Quality Check
+Submit/poll mode for QC: requests are stored in a local SQLite queue, analyzed by
+separate worker processes and their results persisted by job_id.
+
+- Durable: jobs survive API restarts; a worker that dies mid-job loses its lease and
+  the job is picked up again (up to QC_JOB_MAX_ATTEMPTS)
+- Coalescing: resubmitting a job_id with the same payload returns the existing job
+  instead of re-running it; a changed payload replaces the job
+- Callbacks: if a callback_url is given, the finished job is POSTed to it. Only
+  public addresses are accepted (QC_JOB_CALLBACK_SCHEMES, QC_JOB_CALLBACK_HOSTS)
+"""
+
+import asyncio
+import hashlib
+import ipaddress
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+# Tunables (override via environment)
+JOB_DB_PATH = os.getenv('QC_JOB_DB', os.path.join(os.path.dirname(__file__), 'qc_jobs.sqlite3'))
+JOB_WORKERS = int(os.getenv('QC_JOB_WORKERS', '2'))  # worker processes started with the API
+JOB_LEASE_SECONDS = float(os.getenv('QC_JOB_LEASE', '600'))  # running jobs older than this are retried
+JOB_MAX_ATTEMPTS = int(os.getenv('QC_JOB_MAX_ATTEMPTS', '3'))
+JOB_POLL_INTERVAL = float(os.getenv('QC_JOB_POLL_INTERVAL', '0.5'))  # idle worker sleep (seconds)
+CALLBACK_TIMEOUT = float(os.getenv('QC_JOB_CALLBACK_TIMEOUT', '10'))
+CALLBACK_SCHEMES = {s.strip() for s in os.getenv('QC_JOB_CALLBACK_SCHEMES', 'https').split(',') if s.strip()}
+# Comma-separated hosts callbacks may go to ('.example.com' also allows subdomains); empty: any public host
+CALLBACK_HOSTS = [h.strip().lower() for h in os.getenv('QC_JOB_CALLBACK_HOSTS', '').split(',') if h.strip()]
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS qc_jobs (
+    job_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    callback_url TEXT,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS qc_jobs_status ON qc_jobs (status, created_at);
+"""
+
+
+def payload_fingerprint(payload: Dict[str, Any]) -> str:
+    """SHA-256 of the canonical JSON payload (identifies duplicate submissions)"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class JobStore:
+    """
+    SQLite-backed QC job table
+
+    One connection per process/thread; writes use BEGIN IMMEDIATE so concurrent
+    workers never claim the same job.
+    """
+
+    def __init__(self, db_path: str = JOB_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    class _Tx:
+        def __init__(self, conn: sqlite3.Connection):
+            self.conn = conn
+
+        def __enter__(self) -> sqlite3.Connection:
+            self.conn.execute('BEGIN IMMEDIATE')
+            return self.conn
+
+        def __exit__(self, exc_type, exc, tb):
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+            return False
+
+    def _transaction(self) -> '_Tx':
+        return JobStore._Tx(self._connection())
+
+    def submit(self, job_id: str, payload: Dict[str, Any], callback_url: Optional[str] = None) -> Dict:
+        """
+        Enqueue a job (or coalesce with an identical existing one)
+
+        Returns:
+            Job record plus 'coalesced' (True if an existing job was reused)
+        """
+        fingerprint = payload_fingerprint(payload)
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT status, fingerprint FROM qc_jobs WHERE job_id = ?', (job_id,)
+            ).fetchone()
+            if row is not None and row['fingerprint'] == fingerprint and row['status'] != FAILED:
+                if callback_url:
+                    conn.execute(
+                        'UPDATE qc_jobs SET callback_url = ?, updated_at = ? WHERE job_id = ?',
+                        (callback_url, now, job_id),
+                    )
+                coalesced = True
+            elif row is not None:
+                # Payload changed (or the previous run failed): start over
+                conn.execute(
+                    'UPDATE qc_jobs SET fingerprint = ?, payload = ?, callback_url = ?, status = ?, '
+                    'result = NULL, error = NULL, attempts = 0, worker_id = NULL, lease_until = NULL, '
+                    'updated_at = ? WHERE job_id = ?',
+                    (fingerprint, json.dumps(payload), callback_url, QUEUED, now, job_id),
+                )
+                coalesced = False
+            else:
+                conn.execute(
+                    'INSERT INTO qc_jobs (job_id, fingerprint, payload, callback_url, status, '
+                    'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, fingerprint, json.dumps(payload), callback_url, QUEUED, now, now),
+                )
+                coalesced = False
+        job = self.get(job_id)
+        job['coalesced'] = coalesced
+        return job
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """Take the oldest queued job (or one whose lease expired) and mark it running"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT job_id, fingerprint, payload, attempts FROM qc_jobs '
+                'WHERE status = ? OR (status = ? AND lease_until < ?) '
+                'ORDER BY created_at LIMIT 1',
+                (QUEUED, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            if row['attempts'] >= JOB_MAX_ATTEMPTS:
+                # Lease expired on the last attempt: the worker kept dying on this job
+                conn.execute(
+                    'UPDATE qc_jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?',
+                    (FAILED, 'Worker lost the job too many times', now, row['job_id']),
+                )
+                return None
+            conn.execute(
+                'UPDATE qc_jobs SET status = ?, worker_id = ?, lease_until = ?, '
+                'attempts = attempts + 1, updated_at = ? WHERE job_id = ?',
+                (RUNNING, worker_id, now + JOB_LEASE_SECONDS, now, row['job_id']),
+            )
+        return {
+            'job_id': row['job_id'],
+            'fingerprint': row['fingerprint'],
+            'payload': json.loads(row['payload']),
+            'attempt': row['attempts'] + 1,
+        }
+
+    def complete(self, job_id: str, fingerprint: str, result: Dict) -> bool:
+        """Persist a result; ignored if the job was resubmitted with a new payload meanwhile"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'UPDATE qc_jobs SET status = ?, result = ?, error = NULL, lease_until = NULL, '
+                'updated_at = ? WHERE job_id = ? AND fingerprint = ?',
+                (DONE, json.dumps(result, default=str), time.time(), job_id, fingerprint),
+            )
+        return cursor.rowcount > 0
+
+    def fail(self, job_id: str, fingerprint: str, error: str, retry: bool = True) -> bool:
+        """Record a failure; the job is re-queued while attempts remain"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT attempts FROM qc_jobs WHERE job_id = ? AND fingerprint = ?',
+                (job_id, fingerprint),
+            ).fetchone()
+            if row is None:
+                return False
+            status = QUEUED if retry and row['attempts'] < JOB_MAX_ATTEMPTS else FAILED
+            conn.execute(
+                'UPDATE qc_jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ? '
+                'WHERE job_id = ?',
+                (status, error, time.time(), job_id),
+            )
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Public view of a job (None if unknown)"""
+        row = self._connection().execute(
+            'SELECT job_id, status, result, error, attempts, callback_url, created_at, updated_at '
+            'FROM qc_jobs WHERE job_id = ?',
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        rows = self._connection().execute(
+            'SELECT status, COUNT(*) AS n FROM qc_jobs GROUP BY status'
+        ).fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> JobStore:
+    """Process-wide job store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def check_callback_url(callback_url: str):
+    """
+    Refuse callback URLs the server must not POST to
+
+    The scheme and host must be allowed by configuration, and every address the host
+    resolves to must be public (no loopback, private, link-local or reserved ranges), so
+    a submitter cannot make the server reach internal services.
+
+    Raises:
+        ValueError: If the URL is not an allowed public callback target
+    """
+    parts = urlsplit(callback_url)
+    if parts.scheme not in CALLBACK_SCHEMES:
+        raise ValueError(f"callback_url scheme must be one of: {', '.join(sorted(CALLBACK_SCHEMES))}")
+    host = (parts.hostname or '').lower()
+    if not host:
+        raise ValueError("callback_url has no host")
+    if CALLBACK_HOSTS and not any(
+        host == allowed or (allowed.startswith('.') and host.endswith(allowed)) for allowed in CALLBACK_HOSTS
+    ):
+        raise ValueError(f"callback_url host {host} is not allowed")
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise ValueError(f"callback_url host {host} cannot be resolved: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if getattr(ip, 'ipv4_mapped', None):
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"callback_url host {host} resolves to a non-public address")
+
+
+def _post_callback(callback_url: str, job: Dict):
+    """Notify the submitter; failures are logged, the result stays pollable"""
+    import httpx
+
+    try:
+        # Checked again at send time: the host may resolve differently than at submit
+        check_callback_url(callback_url)
+        response = httpx.post(callback_url, json=job, timeout=CALLBACK_TIMEOUT, follow_redirects=False)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Warning: QC job callback to {callback_url} failed: {e}")
+
+
+def pool_workers_per_process(num_workers: int) -> int:
+    """
+    Image-analysis pool size for the API process and each of num_workers job workers
+
+    The CPUs are shared out between them instead of every process sizing its pool to
+    the whole machine. MAMA_F3_POOL_WORKERS, when set, still wins.
+    """
+    configured = int(os.getenv('MAMA_F3_POOL_WORKERS', '0'))
+    if configured > 0:
+        return configured
+    return max(1, (os.cpu_count() or 1) // (num_workers + 1))
+
+
+def worker_main(db_path: str = JOB_DB_PATH, stop_event=None, pool_workers: Optional[int] = None):
+    """
+    Worker process loop: claim a job, run the QC check, persist the result
+
+    One model and one event loop (so one pooled HTTP client) are kept for the life
+    of the worker.
+
+    Args:
+        db_path: Job queue database
+        stop_event: Event that asks the worker to exit after its current job
+        pool_workers: Size of this worker's image-analysis pool (default: CPU count)
+    """
+    # Imported here so the API process can import this module without the models
+    from routes.qc import QCRequest, run_check
+    from fastapi import HTTPException
+    from evidence_fetch import close_client
+
+    if pool_workers:
+        _configure_image_pool(pool_workers)
+
+    store = JobStore(db_path)
+    worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    loop = asyncio.new_event_loop()
+    model = None
+
+    try:
+        while stop_event is None or not stop_event.is_set():
+            job = store.claim(worker_id)
+            if job is None:
+                time.sleep(JOB_POLL_INTERVAL)
+                continue
+
+            try:
+                if model is None:
+                    model = _create_model()
+                result = loop.run_until_complete(run_check(QCRequest(**job['payload']), model))
+                store.complete(job['job_id'], job['fingerprint'], result)
+            except HTTPException as e:
+                # Bad input (e.g. no usable photos): retrying will not help
+                store.fail(job['job_id'], job['fingerprint'], str(e.detail), retry=False)
+            except Exception as e:
+                print(f"Warning: QC job {job['job_id']} failed (attempt {job['attempt']}): {e}")
+                store.fail(job['job_id'], job['fingerprint'], str(e))
+
+            finished = store.get(job['job_id'])
+            if finished and finished['status'] in (DONE, FAILED) and finished['callback_url']:
+                _post_callback(finished['callback_url'], finished)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if model is not None and model.image_pool is not None:
+            # Stop the decode pool first: exiting with live pool children deadlocks
+            model.image_pool.shutdown()
+        loop.run_until_complete(close_client())
+        loop.close()
+
+
+def _configure_image_pool(max_workers: int):
+    """Size this process's shared image-analysis pool (before the model first uses it)"""
+    try:
+        from f3_parallel import configure_image_pool
+    except ImportError:
+        return
+    if not configure_image_pool(max_workers):
+        print(f"Warning: image analysis pool already started; not resized to {max_workers} workers")
+
+
+def _create_model():
+    """Model instance for a worker (None when the F3 model is unavailable: fallback QC)"""
+    from routes.qc import F3_MODEL_AVAILABLE, VisionQualityCheckModel
+
+    return VisionQualityCheckModel() if F3_MODEL_AVAILABLE else None
+
+
+_workers: List[multiprocessing.Process] = []
+_stop_event = None
+
+
+def start_workers(num_workers: int = JOB_WORKERS, db_path: str = JOB_DB_PATH):
+    """
+    Spawn worker processes (no-op if already running or num_workers <= 0)
+
+    The API process and the workers each get pool_workers_per_process(num_workers)
+    analysis workers, so together they do not oversubscribe the CPUs.
+    """
+    global _stop_event
+    if _workers or num_workers <= 0:
+        return
+    JobStore(db_path)  # create the schema before workers race for it
+    pool_workers = pool_workers_per_process(num_workers)
+    _configure_image_pool(pool_workers)
+    ctx = multiprocessing.get_context('spawn')
+    _stop_event = ctx.Event()
+    for _ in range(num_workers):
+        # Not daemonic: the model starts its own decode pool inside the worker
+        process = ctx.Process(target=worker_main, args=(db_path, _stop_event, pool_workers))
+        process.start()
+        _workers.append(process)
+
+
+def stop_workers(timeout: float = 10.0):
+    """Ask workers to finish their current job and exit"""
+    global _stop_event
+    if _stop_event is not None:
+        _stop_event.set()
+    for process in _workers:
+        process.join(timeout)
+        if process.is_alive():
+            process.terminate()
+    _workers.clear()
+    _stop_event = None
+
+
+if __name__ == "__main__":
+    # Standalone worker: python qc_jobs.py (run several for more throughput)
+    worker_main()
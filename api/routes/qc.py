@@ -3,21 +3,38 @@ F3: Vision Quality Check API Route
 Compares manufactured part photos to STL design using F3 model
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional, Dict
+import asyncio
+import json
+import math
 import sys
 import os
-import requests
-from io import BytesIO
 
 # Add models directory to path
 models_path = os.path.join(os.path.dirname(__file__), '..', '..', 'models')
 if models_path not in sys.path:
     sys.path.insert(0, models_path)
 
+# Batch QC limits
+BATCH_MAX_PARTS = int(os.getenv('QC_BATCH_MAX_PARTS', '50'))
+BATCH_CONCURRENCY = int(os.getenv('QC_BATCH_CONCURRENCY', '4'))  # parts fetched and checked at once
+BATCH_MAX_BYTES = int(os.getenv('QC_BATCH_MAX_MB', '512')) * 1024 * 1024  # evidence in memory at once, over all parts
+
+# Add api directory to path (for shared helpers)
+api_path = os.path.join(os.path.dirname(__file__), '..')
+if api_path not in sys.path:
+    sys.path.insert(0, api_path)
+
+from evidence_fetch import FetchTooLarge, fetch_all
+from evidence_upload import UploadError, iter_multipart
+from qc_jobs import check_callback_url, get_store
+
 try:
-    from f3_vision_quality_check import VisionQualityCheckModel, QualityCheckInput, QualityCheckOutput
+    from f3_vision_quality_check import (
+        MAX_IMAGE_PIXELS, VisionQualityCheckModel, QualityCheckInput, QualityCheckOutput, coarse_pass_metrics,
+    )
     F3_MODEL_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: F3 model not available: {e}")
@@ -31,109 +48,358 @@ class QCRequest(BaseModel):
     job_id: str
     stl_file_url: Optional[str] = None  # URL to STL file in Supabase Storage
     evidence_photo_urls: List[str]  # URLs to QC photos in Supabase Storage
+    evidence_video_urls: Optional[List[str]] = None  # URLs to QC videos (e.g. turntable clips); frames are sampled
     tolerance_tier: str = "medium"  # 'low', 'medium', 'high'
     tolerance_thou: Optional[float] = None  # Actual tolerance in thou
     material: Optional[str] = None
     critical_dimensions: Optional[Dict[str, float]] = None
 
+class QCJobRequest(QCRequest):
+    """Request for an asynchronous (queued) quality check"""
+    callback_url: Optional[str] = None  # POSTed the finished job record, if given
+
+class QCBatchPart(BaseModel):
+    """Evidence for one produced part (e.g. one maker's job assignment)"""
+    part_id: str  # e.g. the job_assignments id
+    job_id: str
+    manufacturer_id: Optional[str] = None
+    stl_file_url: Optional[str] = None
+    evidence_photo_urls: List[str]
+    tolerance_tier: str = "medium"
+    critical_dimensions: Optional[Dict[str, float]] = None
+
+class QCBatchRequest(BaseModel):
+    """Request for quality checks of many parts (one or more jobs)"""
+    parts: List[QCBatchPart]
+
+class QCEvidenceRequest(BaseModel):
+    """Additional photos for an already checked job"""
+    evidence_photo_urls: List[str]  # URLs to the new QC photos only
+
 @router.post("/")
 async def check_quality(request: QCRequest):
     """
     Run F3 Vision Quality Check on manufactured part
     """
     try:
-        if not F3_MODEL_AVAILABLE or VisionQualityCheckModel is None:
-            # Fallback: Simple heuristic QC
-            return await _fallback_qc(request)
+        return await run_check(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running quality check: {str(e)}")
+
+@router.post("/upload")
+async def check_quality_upload(request: Request):
+    """
+    Run F3 Vision Quality Check on files uploaded directly (multipart/form-data)
+
+    Form fields: job_id, tolerance_tier (default 'medium'), critical_dimensions (JSON
+    object), stl_file (file), evidence_photos (files, repeatable), evidence_videos
+    (files, repeatable). The body is parsed as it streams in: each photo (and the STL)
+    is analyzed as soon as its part has arrived, while later files are still uploading.
+    """
+    if not F3_MODEL_AVAILABLE or VisionQualityCheckModel is None:
+        raise HTTPException(status_code=503, detail="F3 model not available; use POST / with photo URLs")
+    
+    model = VisionQualityCheckModel()
+    fields: Dict[str, str] = {}
+    stl_bytes = None
+    photos: List[bytes] = []
+    videos: List[bytes] = []
+    prefetches = []
+    try:
+        async for part in iter_multipart(request, image_fields={'evidence_photos'}, max_image_pixels=MAX_IMAGE_PIXELS):
+            if not part.is_file:
+                fields[part.name] = part.value
+            elif not part.data:
+                continue  # empty file input
+            elif part.name == 'evidence_photos':
+                photos.append(bytes(part.data))
+                prefetches.append(asyncio.create_task(asyncio.to_thread(model.prefetch_evidence, [photos[-1]])))
+            elif part.name == 'stl_file':
+                stl_bytes = bytes(part.data)
+                prefetches.append(asyncio.create_task(asyncio.to_thread(model.prefetch_evidence, None, stl_bytes)))
+            elif part.name == 'evidence_videos':
+                videos.append(bytes(part.data))
         
-        # Initialize model
-        model = VisionQualityCheckModel()
+        if not fields.get('job_id'):
+            raise HTTPException(status_code=400, detail="job_id is required")
+        if not photos and not videos:
+            raise HTTPException(status_code=400, detail="At least one evidence photo is required")
+        critical_dimensions = _parse_critical_dimensions(fields.get('critical_dimensions'))
         
-        # Download STL file if URL provided
-        stl_file_path = None
-        if request.stl_file_url:
+        # Prefetch failures are not fatal: check_quality redoes (and reports) anything not cached
+        await asyncio.gather(*prefetches, return_exceptions=True)
+        qc_input = QualityCheckInput(
+            stl_file_path=stl_bytes,
+            design_image_paths=None,
+            evidence_image_paths=photos,
+            evidence_video_paths=videos or None,
+            job_id=fields['job_id'],
+            tolerance_tier=fields.get('tolerance_tier', 'medium'),
+            critical_dimensions=critical_dimensions,
+        )
+        result = await asyncio.to_thread(model.check_quality, qc_input)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running quality check: {str(e)}")
+    finally:
+        for task in prefetches:
+            task.cancel()  # no-op for finished tasks; running threads finish on their own
+    return _result_response(result)
+
+@router.post("/batch")
+async def check_quality_batch(request: QCBatchRequest):
+    """
+    Run F3 Quality Check on many parts at once
+
+    Each part is downloaded and checked on its own, at most BATCH_CONCURRENCY parts at a
+    time, so only those parts' evidence is in memory: a part may hold up to
+    BATCH_MAX_BYTES / BATCH_CONCURRENCY bytes and gets its own download deadline. The
+    first part of a design analyzes its STL while parts sharing it wait, then read the
+    analysis from the feature cache. A failing part reports an error without failing the
+    batch. Follow-up photos for a part can be sent to POST /{job_id}:{part_id}/photos.
+
+    Returns:
+        {'parts': [per-part result], 'jobs': {job_id: aggregate statistics}}
+    """
+    parts = request.parts
+    if not parts:
+        raise HTTPException(status_code=400, detail="At least one part is required")
+    if len(parts) > BATCH_MAX_PARTS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_PARTS} parts per batch")
+    
+    if not F3_MODEL_AVAILABLE or VisionQualityCheckModel is None:
+        results = [
+            {'part_id': part.part_id, 'job_id': part.job_id, **await _fallback_qc(part)}
+            for part in parts
+        ]
+        return {'parts': results, 'jobs': _batch_aggregates(results)}
+    
+    semaphore = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    part_max_bytes = max(1, BATCH_MAX_BYTES // max(1, BATCH_CONCURRENCY))
+    design_locks = {part.stl_file_url: asyncio.Lock() for part in parts if part.stl_file_url}
+    
+    async def check_part(part: QCBatchPart) -> Dict:
+        record = {'part_id': part.part_id, 'job_id': part.job_id}
+        if part.manufacturer_id:
+            record['manufacturer_id'] = part.manufacturer_id
+        async with semaphore:
+            urls = ([part.stl_file_url] if part.stl_file_url else []) + list(part.evidence_photo_urls)
             try:
-                stl_response = requests.get(request.stl_file_url, timeout=30)
-                stl_response.raise_for_status()
-                # Save to temp file
-                import tempfile
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.stl') as tmp:
-                    tmp.write(stl_response.content)
-                    stl_file_path = tmp.name
-            except Exception as e:
-                print(f"Warning: Could not download STL file: {e}")
-                # Continue without STL file (model will use photos only)
-        
-        # Download evidence photos (support both field names)
-        photo_urls = request.evidence_photo_urls or request.photo_urls or []
-        evidence_image_paths = []
-        for photo_url in photo_urls:
+                downloads = await fetch_all(urls, max_total_bytes=part_max_bytes)
+            except FetchTooLarge:
+                return {**record, 'error': f"Evidence exceeds the {part_max_bytes} byte per-part limit"}
+            stl_bytes = downloads.pop(0) if part.stl_file_url else None
+            photos = [photo for photo in downloads if photo is not None]
+            if not photos:
+                return {**record, 'error': "At least one evidence photo is required"}
+            qc_input = QualityCheckInput(
+                stl_file_path=stl_bytes,
+                design_image_paths=None,
+                evidence_image_paths=photos,
+                evidence_video_paths=None,
+                job_id=f"{part.job_id}:{part.part_id}",  # session key for follow-up photos
+                tolerance_tier=part.tolerance_tier,
+                critical_dimensions=part.critical_dimensions,
+            )
+            # One model per part, as for single checks (the caches behind it are shared)
+            model = VisionQualityCheckModel()
             try:
-                photo_response = requests.get(photo_url, timeout=30)
-                photo_response.raise_for_status()
-                # Save to temp file
-                import tempfile
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp:
-                    tmp.write(photo_response.content)
-                    evidence_image_paths.append(tmp.name)
+                if stl_bytes is not None:
+                    async with design_locks[part.stl_file_url]:
+                        await asyncio.to_thread(model.prefetch_evidence, None, stl_bytes)
+                result = await asyncio.to_thread(model.check_quality, qc_input)
             except Exception as e:
-                print(f"Warning: Could not download photo {photo_url}: {e}")
-                # Skip this photo
-        
-        if len(evidence_image_paths) < 1:
-            raise HTTPException(
-                status_code=400,
-                detail="At least one evidence photo is required"
-            )
-        
-        # Build QC input
-        qc_input = QualityCheckInput(
-            stl_file_path=stl_file_path,
-            design_image_paths=None,  # Will be generated from STL if needed
-            evidence_image_paths=evidence_image_paths,
-            evidence_video_paths=None,
-            job_id=request.job_id,
-            tolerance_tier=request.tolerance_tier,
-            critical_dimensions=request.critical_dimensions,
+                return {**record, 'error': f"Error running quality check: {str(e)}"}
+        return {**record, **_result_response(result)}
+    
+    results = await asyncio.gather(*(check_part(part) for part in parts))
+    return {'parts': results, 'jobs': _batch_aggregates(results)}
+
+def _parse_critical_dimensions(text: Optional[str]) -> Optional[Dict[str, float]]:
+    """critical_dimensions form field: a JSON object of dimension name -> number (400 otherwise)"""
+    if not text:
+        return None
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = None
+    if not isinstance(value, dict) or not all(
+        isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in value.values()
+    ):
+        raise HTTPException(
+            status_code=400, detail="critical_dimensions must be a JSON object of dimension names to numbers"
         )
-        
-        # Run quality check
-        result = model.check_quality(qc_input)
-        
-        # Clean up temp files
-        import os
-        if stl_file_path and os.path.exists(stl_file_path):
-            try:
-                os.unlink(stl_file_path)
-            except:
-                pass
-        for img_path in evidence_image_paths:
-            if os.path.exists(img_path):
-                try:
-                    os.unlink(img_path)
-                except:
-                    pass
-        
-        # Return results
-        return {
-            'qc_score': result.qc_score,
-            'status': result.status,
-            'similarity': result.similarity,
-            'dimensional_accuracy': getattr(result, 'dimensional_accuracy', result.similarity * 0.95),
-            'surface_quality': getattr(result, 'surface_quality', result.similarity * 0.90),
-            'anomaly_score': result.anomaly_score,
-            'notes': result.notes,
-            'confidence': result.confidence,
-            'model_version': result.model_version,
+    return {name: float(v) for name, v in value.items()}
+
+def _batch_aggregates(results: List[Dict]) -> Dict[str, Dict]:
+    """Per-job statistics over batch part results"""
+    jobs: Dict[str, List[Dict]] = {}
+    for result in results:
+        jobs.setdefault(result['job_id'], []).append(result)
+    
+    aggregates = {}
+    for job_id, job_results in jobs.items():
+        scored = [r for r in job_results if 'qc_score' in r]
+        scores = [r['qc_score'] for r in scored]
+        statuses = {status: sum(r['status'] == status for r in scored) for status in ('pass', 'review', 'fail')}
+        aggregates[job_id] = {
+            'parts': len(job_results),
+            'errors': len(job_results) - len(scored),
+            **statuses,
+            'pass_rate': statuses['pass'] / len(scored) if scored else 0.0,
+            'mean_qc_score': sum(scores) / len(scores) if scores else None,
+            'min_qc_score': min(scores) if scores else None,
+            'max_qc_score': max(scores) if scores else None,
         }
-        
+    return aggregates
+
+@router.post("/{job_id}/photos")
+async def add_quality_check_photos(job_id: str, request: QCEvidenceRequest):
+    """
+    Re-run F3 Quality Check for a job with additional photos
+
+    Only the new photos are downloaded and analyzed; the earlier analysis is kept in a
+    per-process session from the last POST / for this job_id. Returns 404 when there is
+    no session (never checked by this process, evicted, or checked by a queue worker).
+    """
+    if not F3_MODEL_AVAILABLE or VisionQualityCheckModel is None:
+        raise HTTPException(status_code=404, detail=f"No QC session for job {job_id}")
+    
+    downloads = await fetch_all(list(request.evidence_photo_urls))
+    evidence_images = [photo for photo in downloads if photo is not None]
+    if len(evidence_images) < 1:
+        raise HTTPException(
+            status_code=400,
+            detail="At least one evidence photo is required"
+        )
+    
+    try:
+        result = await asyncio.to_thread(VisionQualityCheckModel().add_evidence, job_id, evidence_images)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No QC session for job {job_id}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error running quality check: {str(e)}")
+    return _result_response(result)
+
+@router.post("/jobs", status_code=202)
+async def submit_quality_check(request: QCJobRequest):
+    """
+    Queue an F3 Quality Check and return immediately
+
+    Poll GET /jobs/{job_id} (or pass callback_url) for the result. Resubmitting the
+    same job_id with the same payload returns the existing job instead of re-running it.
+    """
+    if request.callback_url:
+        try:
+            await asyncio.to_thread(check_callback_url, request.callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    payload = request.model_dump(exclude={'callback_url'})
+    job = await asyncio.to_thread(get_store().submit, request.job_id, payload, request.callback_url)
+    return {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'coalesced': job['coalesced'],
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_quality_check_job(job_id: str):
+    """
+    Status (queued, running, done, failed) and result of a queued quality check
+    """
+    job = await asyncio.to_thread(get_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown QC job: {job_id}")
+    job.pop('callback_url', None)
+    return job
+
+@router.get("/metrics")
+async def quality_check_metrics():
+    """
+    Coarse-to-fine pipeline metrics for this API process (escalation rate to full-resolution analysis)
+    """
+    if not F3_MODEL_AVAILABLE:
+        return {'checks': 0, 'escalations': 0, 'early_exits': 0, 'escalation_rate': 0.0}
+    return coarse_pass_metrics()
+
+async def run_check(request: QCRequest, model=None) -> Dict:
+    """
+    Download the evidence for a QC request and run the F3 model on it
+
+    Shared by the synchronous endpoint and the queue workers.
+
+    Args:
+        request: QC request
+        model: Optional VisionQualityCheckModel to reuse (a new one is created otherwise)
+
+    Returns:
+        QC response dict
+    """
+    if not F3_MODEL_AVAILABLE or VisionQualityCheckModel is None:
+        # Fallback: Simple heuristic QC
+        return await _fallback_qc(request)
+    
+    # Initialize model
+    model = model or VisionQualityCheckModel()
+    
+    # Download STL file and evidence photos concurrently (support both field names)
+    photo_urls = request.evidence_photo_urls or getattr(request, 'photo_urls', None) or []
+    video_urls = getattr(request, 'evidence_video_urls', None) or []
+    urls = ([request.stl_file_url] if request.stl_file_url else []) + list(photo_urls) + list(video_urls)
+    downloads = await fetch_all(urls)
+    
+    # Assets stay in memory - the model decodes straight from the downloaded bytes
+    stl_bytes = downloads.pop(0) if request.stl_file_url else None
+    # (without the STL the model will use photos only)
+    evidence_images = [photo for photo in downloads[:len(photo_urls)] if photo is not None]
+    evidence_videos = [video for video in downloads[len(photo_urls):] if video is not None]
+    
+    if len(evidence_images) + len(evidence_videos) < 1:
+        raise HTTPException(
+            status_code=400,
+            detail="At least one evidence photo is required"
+        )
+    
+    # Build QC input
+    qc_input = QualityCheckInput(
+        stl_file_path=stl_bytes,
+        design_image_paths=None,  # STL views are rendered by the model
+        evidence_image_paths=evidence_images,
+        evidence_video_paths=evidence_videos or None,
+        job_id=request.job_id,
+        tolerance_tier=request.tolerance_tier,
+        critical_dimensions=request.critical_dimensions,
+    )
+    
+    # Run quality check off the event loop so the API stays responsive
+    result = await asyncio.to_thread(model.check_quality, qc_input)
+    return _result_response(result)
+
+def _result_response(result: QualityCheckOutput) -> Dict:
+    """QC response dict for a model result"""
+    return {
+        'qc_score': result.qc_score,
+        'status': result.status,
+        'similarity': result.similarity,
+        'dimensional_accuracy': getattr(result, 'dimensional_accuracy', result.similarity * 0.95),
+        'surface_quality': getattr(result, 'surface_quality', result.similarity * 0.90),
+        'anomaly_score': result.anomaly_score,
+        'notes': result.notes,
+        'confidence': result.confidence,
+        'model_version': result.model_version,
+        'coarse_pass': result.coarse_pass,
+        'defect_regions': result.defect_regions,
+    }
 
 async def _fallback_qc(request: QCRequest):
     """Fallback QC using simple heuristics"""
     # Simple heuristic: assume good quality if we have photos
-    photo_urls = request.evidence_photo_urls or request.photo_urls or []
+    photo_urls = request.evidence_photo_urls or getattr(request, 'photo_urls', None) or []
     num_photos = len(photo_urls)
     
     # Base score from number of photos (more photos = better)
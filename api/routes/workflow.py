@@ -7,6 +7,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
+import asyncio
 import sys
 import os
 
@@ -29,6 +30,15 @@ except ImportError as e:
     WorkflowSchedulingModel = None
     F4_MODEL_AVAILABLE = False
 
+try:
+    from f4_compatibility import DeviceTypeIndex
+except ImportError as e:
+    print(f"Warning: F4 compatibility index not available: {e}")
+    DeviceTypeIndex = None
+
+# Longest local-search budget a request may ask for (the search holds a worker thread)
+MAX_TIME_BUDGET_MS = float(os.getenv('WORKFLOW_MAX_TIME_BUDGET_MS', '5000'))
+
 router = APIRouter()
 
 class TaskData(BaseModel):
@@ -48,6 +58,7 @@ class DeviceData(BaseModel):
     device_type: str
     available_hours_per_day: Dict[str, float]  # {'2026-01-20': 8.0, ...}
     current_tasks: List[str] = []
+    maintenance_scheduled: List[List[str]] = []  # [[start, end], ...] ISO format datetime strings
     efficiency_factor: float = 1.0
 
 class WorkflowRequest(BaseModel):
@@ -57,6 +68,7 @@ class WorkflowRequest(BaseModel):
     week_start: str  # ISO format datetime string
     week_end: str  # ISO format datetime string
     manufacturer_capacity_hours_per_day: float = 16.0
+    time_budget_ms: float = 0.0  # local-search time after the greedy pass (0 = greedy only, capped server-side)
 
 @router.post("/")
 async def schedule_workflow(request: WorkflowRequest):
@@ -104,7 +116,13 @@ async def schedule_workflow(request: WorkflowRequest):
                 device_type=device_data.device_type,
                 available_hours_per_day=available_hours,
                 current_tasks=device_data.current_tasks,
-                maintenance_scheduled=[],  # TODO: Add maintenance scheduling
+                maintenance_scheduled=[
+                    (
+                        datetime.fromisoformat(start.replace('Z', '+00:00')),
+                        datetime.fromisoformat(end.replace('Z', '+00:00'))
+                    )
+                    for start, end in device_data.maintenance_scheduled
+                ],
                 efficiency_factor=device_data.efficiency_factor
             )
             devices.append(device)
@@ -115,11 +133,12 @@ async def schedule_workflow(request: WorkflowRequest):
             devices=devices,
             week_start=week_start,
             week_end=week_end,
-            manufacturer_capacity_hours_per_day=request.manufacturer_capacity_hours_per_day
+            manufacturer_capacity_hours_per_day=request.manufacturer_capacity_hours_per_day,
+            time_budget_ms=min(max(0.0, request.time_budget_ms), MAX_TIME_BUDGET_MS)
         )
         
-        # Run scheduling
-        result = model.schedule(schedule_input)
+        # Run scheduling off the event loop
+        result = await asyncio.to_thread(model.schedule, schedule_input)
         
         # Convert output to JSON-serializable format
         scheduled_tasks = []
@@ -158,16 +177,18 @@ async def _fallback_scheduling(request: WorkflowRequest):
     
     # Track device availability (simplified)
     device_available = {d.device_id: True for d in request.devices}
+    device_index = DeviceTypeIndex(request.devices) if DeviceTypeIndex is not None else None
     
     for task in tasks_sorted:
         # Find compatible device
-        compatible_device = None
-        for device in request.devices:
-            if device.device_id in device_available and device_available[device.device_id]:
-                # Check if device type matches
-                if any(dt in device.device_type for dt in task.required_device_types):
-                    compatible_device = device
-                    break
+        if device_index is not None:
+            candidates = device_index.compatible(task.required_device_types)
+        else:
+            candidates = [
+                d for d in request.devices
+                if any(dt in d.device_type for dt in task.required_device_types)
+            ]
+        compatible_device = next((d for d in candidates if device_available[d.device_id]), None)
         
         if compatible_device:
             # Simple scheduling: start now, end after estimated hours
@@ -0,0 +1,168 @@
+"""
+F3 Batched Feature Extraction
+Computes the per-image F3 features for a whole stack of resized images at once.
+
+Input is an (N, H, W, 3) uint8 tensor; every feature is a vectorized reduction over it,
+replacing per-image PIL calls (convert('L'), histogram(), FIND_EDGES, ImageStat).
+Outputs match the PIL pipeline's keys and values, plus a part silhouette descriptor and
+tile-level texture maps (summed-area tables, so every window costs O(1)).
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .f3_segmentation import foreground_mask
+    from .f3_silhouette import silhouette_descriptor
+except ImportError:
+    from f3_segmentation import foreground_mask
+    from f3_silhouette import silhouette_descriptor
+
+# Edge threshold used for edge density (on the 0-255 edge response)
+EDGE_THRESHOLD = 50
+# Local statistics windows are 1/TILE_GRID of the image side, stepped by half a window
+TILE_GRID = 8
+
+
+def to_grayscale(images: np.ndarray) -> np.ndarray:
+    """RGB -> L with PIL's ITU-R 601-2 fixed-point weights (bit-identical to convert('L'))"""
+    rgb = images.astype(np.uint32)
+    gray = (rgb[..., 0] * 19595 + rgb[..., 1] * 38470 + rgb[..., 2] * 7471 + 0x8000) >> 16
+    return gray.astype(np.uint8)
+
+
+def histograms(gray: np.ndarray) -> np.ndarray:
+    """(N, 256) normalized grayscale histograms via a single offset bincount"""
+    n = gray.shape[0]
+    offsets = (np.arange(n, dtype=np.int64) * 256)[:, None]
+    flat = gray.reshape(n, -1).astype(np.int64) + offsets
+    counts = np.bincount(flat.ravel(), minlength=n * 256).reshape(n, 256)
+    return counts / gray[0].size
+
+
+def find_edges(gray: np.ndarray) -> np.ndarray:
+    """
+    3x3 edge filter over the batch (PIL ImageFilter.FIND_EDGES kernel)
+
+    Kernel is 8 * center - sum(8 neighbours), clipped to 0-255. Border pixels keep
+    their original values, as PIL does.
+    """
+    g = gray.astype(np.int32)
+    neighbours = (
+        g[:, :-2, :-2] + g[:, :-2, 1:-1] + g[:, :-2, 2:]
+        + g[:, 1:-1, :-2] + g[:, 1:-1, 2:]
+        + g[:, 2:, :-2] + g[:, 2:, 1:-1] + g[:, 2:, 2:]
+    )
+    edges = gray.copy()
+    edges[:, 1:-1, 1:-1] = np.clip(8 * g[:, 1:-1, 1:-1] - neighbours, 0, 255)
+    return edges
+
+
+def summed_area_table(values: np.ndarray) -> np.ndarray:
+    """(H + 1, W + 1) inclusive prefix sums with a zero first row/column"""
+    sat = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    np.cumsum(values, axis=0, dtype=np.float64, out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+    return sat
+
+
+def window_sums(sat: np.ndarray, window: Tuple[int, int], stride: Tuple[int, int]) -> np.ndarray:
+    """Sum over every (window_h, window_w) window on a stride grid: four table lookups each"""
+    height, width = sat.shape[0] - 1, sat.shape[1] - 1
+    y0 = np.arange(0, height - window[0] + 1, stride[0])[:, None]
+    x0 = np.arange(0, width - window[1] + 1, stride[1])[None, :]
+    y1, x1 = y0 + window[0], x0 + window[1]
+    return sat[y1, x1] - sat[y0, x1] - sat[y1, x0] + sat[y0, x0]
+
+
+def tile_statistics(gray: np.ndarray, edges: np.ndarray, mask: np.ndarray, grid: int = TILE_GRID) -> Dict[str, np.ndarray]:
+    """
+    Local texture maps for one image
+
+    Windows are 1/grid of each side with half-window steps, so a defect straddling a tile
+    boundary is still fully inside some window.
+
+    Returns:
+        (2 * grid - 1)-square float32 maps: tile_variance (grayscale variance),
+        tile_edge_density (fraction of edge pixels) and tile_foreground (fraction of part pixels)
+    """
+    height, width = gray.shape
+    window = (height // grid, width // grid)
+    stride = (max(1, window[0] // 2), max(1, window[1] // 2))
+    area = float(window[0] * window[1])
+
+    values = gray.astype(np.float64)
+    mean = window_sums(summed_area_table(values), window, stride) / area
+    mean_sq = window_sums(summed_area_table(values * values), window, stride) / area
+    return {
+        'tile_variance': np.maximum(mean_sq - mean * mean, 0.0).astype(np.float32),
+        'tile_edge_density': (window_sums(summed_area_table(edges > EDGE_THRESHOLD), window, stride) / area).astype(np.float32),
+        'tile_foreground': (window_sums(summed_area_table(mask), window, stride) / area).astype(np.float32),
+    }
+
+
+def extract_batch_features(
+    images: np.ndarray,
+    source_sizes: Optional[Sequence[Tuple[int, int]]] = None,
+) -> List[Dict[str, np.ndarray]]:
+    """
+    Extract F3 image features for a batch
+
+    Args:
+        images: (N, H, W, 3) uint8 array of resized RGB images
+        source_sizes: Optional original (width, height) per image, used to undo the
+            resize squash in the silhouette descriptor
+
+    Returns:
+        N feature dicts (histogram, edge_density, texture_variance, color_mean,
+        color_std, brightness, contrast, width, height, silhouette and the
+        tile_statistics maps)
+    """
+    n, height, width = images.shape[:3]
+    gray = to_grayscale(images)
+
+    # 1. Histogram (grayscale)
+    hists = histograms(gray)
+
+    # 2. Edge detection
+    edges = find_edges(gray)
+    edge_density = np.mean(edges > EDGE_THRESHOLD, axis=(1, 2)) / 255.0  # Percentage of edge pixels
+
+    # 3. Texture variance (over all channels)
+    texture_variance = np.var(images, axis=(1, 2, 3), dtype=np.float64)
+
+    # 4. Color statistics
+    color_mean = np.mean(images, axis=(1, 2), dtype=np.float64)
+    color_std = np.std(images, axis=(1, 2), dtype=np.float64)
+
+    # 5. Brightness and contrast (grayscale mean / population std)
+    gray_mean = np.mean(gray, axis=(1, 2), dtype=np.float64)
+    gray_std = np.std(gray, axis=(1, 2), dtype=np.float64)
+
+    # 6. Part silhouette descriptor (compared against the design's silhouette atlas)
+    # 7. Local texture maps for defect localization
+    silhouettes, tiles = [], []
+    for i in range(n):
+        source_w, source_h = source_sizes[i] if source_sizes else (width, height)
+        pixel_aspect = (source_w / width) / (source_h / height)
+        mask = foreground_mask(images[i])
+        silhouettes.append(silhouette_descriptor(mask, pixel_aspect=pixel_aspect))
+        tiles.append(tile_statistics(gray[i], edges[i], mask))
+
+    return [
+        {
+            'histogram': hists[i],
+            'edge_density': float(edge_density[i]),
+            'texture_variance': float(texture_variance[i]),
+            'color_mean': color_mean[i],
+            'color_std': color_std[i],
+            'brightness': float(gray_mean[i] / 255.0),
+            'contrast': float(gray_std[i] / 255.0),
+            'width': width,
+            'height': height,
+            'silhouette': silhouettes[i],
+            **tiles[i],
+        }
+        for i in range(n)
+    ]
@@ -0,0 +1,214 @@
+"""
+F3 Feature Cache
+Content-addressed (SHA-256) cache for expensive F3 analysis results.
+
+Two tiers:
+- Memory: small LRU of recently used entries (per process)
+- Disk: one pickle per entry under the cache directory, evicted least-recently-used
+  once the directory grows past its size budget
+
+Keys are derived from the asset bytes plus a feature version, so a re-upload
+of the same design or photo hits the cache no matter what URL it came from, and
+changing a feature extractor invalidates old entries by bumping its version.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+try:
+    from .f3_io import EvidenceSource, is_path, open_source
+except ImportError:
+    from f3_io import EvidenceSource, is_path, open_source
+
+DEFAULT_CACHE_DIR = os.getenv(
+    'MAMA_F3_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'mama', 'f3')
+)
+DEFAULT_MAX_DISK_BYTES = int(os.getenv('MAMA_F3_CACHE_MAX_MB', '256')) * 1024 * 1024
+DEFAULT_MAX_MEMORY_ENTRIES = 512
+
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def content_key(source: EvidenceSource, salt: str = '') -> str:
+    """SHA-256 hex digest of the source bytes (streamed for paths), prefixed by salt"""
+    digest = hashlib.sha256(salt.encode('utf-8'))
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    else:
+        fh = open_source(source)
+        try:
+            for chunk in iter(lambda: fh.read(_HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+        finally:
+            if is_path(source):
+                fh.close()
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    Two-tier content-addressed cache
+
+    Entries are grouped by namespace (e.g. 'stl', 'image') and treated as read-only
+    by callers. Disk usage is bounded by max_disk_bytes; when exceeded, the least
+    recently used files are removed until usage drops below 90% of the budget.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+        max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+    ):
+        self.cache_dir = cache_dir or None
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_entries = max_memory_entries
+        self._memory: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None  # computed lazily
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except OSError as e:
+                print(f"Warning: F3 cache directory unavailable ({e}); using memory-only cache")
+                self.cache_dir = None
+
+    def _entry_path(self, namespace: str, key: str, ext: str = '.pkl') -> str:
+        return os.path.join(self.cache_dir, namespace, key[:2], key + ext)
+
+    def _remember(self, mem_key: str, value: Any):
+        self._memory[mem_key] = value
+        self._memory.move_to_end(mem_key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return the cached value or None"""
+        mem_key = f"{namespace}/{key}"
+        with self._lock:
+            if mem_key in self._memory:
+                self._memory.move_to_end(mem_key)
+                self.hits += 1
+                return self._memory[mem_key]
+
+        if self.cache_dir:
+            path = self._entry_path(namespace, key)
+            try:
+                with open(path, 'rb') as fh:
+                    value = pickle.load(fh)
+                os.utime(path)  # mark as recently used for LRU eviction
+                with self._lock:
+                    self._remember(mem_key, value)
+                    self.hits += 1
+                return value
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Warning: Dropping unreadable F3 cache entry {path}: {e}")
+                self._remove(path)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, namespace: str, key: str, value: Any):
+        """Store a value in both tiers"""
+        with self._lock:
+            self._remember(f"{namespace}/{key}", value)
+
+        if not self.cache_dir:
+            return
+        try:
+            path = self._entry_path(namespace, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)  # atomic: concurrent readers never see partial files
+            self._account(os.path.getsize(path))
+        except OSError as e:
+            print(f"Warning: Could not write F3 cache entry: {e}")
+
+    def path_for(self, namespace: str, key: str, ext: str) -> Optional[str]:
+        """
+        Path for a caller-managed file entry (e.g. .npz arrays) stored under the cache
+
+        Returns None when the cache is memory-only.
+        """
+        if not self.cache_dir:
+            return None
+        path = self._entry_path(namespace, key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def track(self, path: str):
+        """Count a file written via path_for() against the disk budget"""
+        try:
+            self._account(os.path.getsize(path))
+        except OSError:
+            pass
+
+    def _account(self, added_bytes: int):
+        """Track disk usage and evict when over budget"""
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._disk_bytes += added_bytes
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+
+            # Evict least recently used files until below 90% of the budget
+            target = int(self.max_disk_bytes * 0.9)
+            entries = sorted(self._scan(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                self._remove(path)
+                total -= size
+            self._disk_bytes = total
+
+    def _scan(self):
+        """Yield (path, size, mtime) for every file in the disk tier"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def clear_memory(self):
+        """Drop the in-memory tier (disk entries are kept)"""
+        with self._lock:
+            self._memory.clear()
+
+
+_default_cache: Optional[FeatureCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> FeatureCache:
+    """Process-wide cache shared by all model instances"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = FeatureCache()
+        return _default_cache
@@ -0,0 +1,124 @@
+"""
+F3 Evidence I/O Helpers
+Lets the quality check read evidence straight from memory (bytes, memoryview, BytesIO)
+or from paths, plus a managed scratch area for the rare consumer that needs a real file.
+"""
+
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from typing import BinaryIO, Optional, Union
+
+# A piece of evidence: a filesystem path or an in-memory buffer
+EvidenceSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+DEFAULT_SCRATCH_QUOTA_BYTES = int(os.getenv('MAMA_F3_SCRATCH_QUOTA_MB', '512')) * 1024 * 1024
+
+
+def is_path(source: EvidenceSource) -> bool:
+    """True if the source refers to a file on disk"""
+    return isinstance(source, (str, os.PathLike))
+
+
+def source_available(source: Optional[EvidenceSource]) -> bool:
+    """True if the source exists (paths) or holds data (buffers)"""
+    if source is None:
+        return False
+    if is_path(source):
+        return os.path.exists(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source) > 0
+    return hasattr(source, 'read')
+
+
+def open_source(source: EvidenceSource) -> BinaryIO:
+    """
+    Return a readable binary stream positioned at the start of the source
+
+    Buffers are wrapped without touching disk. Caller-provided streams are rewound
+    and returned as-is (the caller keeps ownership).
+    """
+    if is_path(source):
+        return open(source, 'rb')
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+
+def read_source_bytes(source: EvidenceSource) -> bytes:
+    """Read the full contents of a source"""
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if is_path(source):
+        with open(source, 'rb') as fh:
+            return fh.read()
+    return open_source(source).read()
+
+
+def to_transferable(source: EvidenceSource) -> Union[str, bytes]:
+    """Picklable form of a source (path string or bytes) for handing to worker processes"""
+    if is_path(source):
+        return os.fspath(source)
+    return read_source_bytes(source)
+
+
+def describe_source(source: EvidenceSource) -> str:
+    """Human-readable label for notes and logs"""
+    if is_path(source):
+        return str(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return f"<in-memory {len(source)} bytes>"
+    return f"<stream {getattr(source, 'name', type(source).__name__)}>"
+
+
+class ScratchArea:
+    """
+    Managed scratch directory for evidence that must be spilled to disk
+
+    - Enforces a total size quota (ValueError when exceeded)
+    - Everything is removed on close(), including on error paths when used as a context manager
+
+    Usage:
+        with ScratchArea() as scratch:
+            path = scratch.write(video_bytes, suffix='.mp4')
+            ...
+    """
+
+    def __init__(self, quota_bytes: int = DEFAULT_SCRATCH_QUOTA_BYTES, root: Optional[str] = None):
+        self.quota_bytes = quota_bytes
+        self.used_bytes = 0
+        self.path = tempfile.mkdtemp(prefix='mama-f3-', dir=root)
+
+    def write(self, source: EvidenceSource, suffix: str = '') -> str:
+        """Copy a source into the scratch area and return its path"""
+        data = memoryview(read_source_bytes(source))
+        if self.used_bytes + len(data) > self.quota_bytes:
+            raise ValueError(
+                f"Scratch quota exceeded: {self.used_bytes + len(data)} > {self.quota_bytes} bytes"
+            )
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.path)
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        self.used_bytes += len(data)
+        return path
+
+    def close(self):
+        """Remove the scratch directory and everything in it"""
+        if getattr(self, 'path', None):
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+            self.used_bytes = 0
+
+    def __enter__(self) -> 'ScratchArea':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
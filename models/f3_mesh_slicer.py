@@ -0,0 +1,276 @@
+"""
+F3 Mesh Slicer
+Planar cross-sections of a welded STL mesh, for checking critical dimensions.
+
+- Index: per axis, a static centered interval tree over each triangle's [min, max]
+  extent along that axis, built once per mesh (lazily per axis). A plane query visits
+  O(log n) nodes and returns the k crossing triangles via binary searches.
+- Section: the crossing triangles are cut in one vectorized pass. Segments are
+  oriented by the face winding, and segment endpoints are identified by the mesh edge
+  they lie on, so loops are recovered with pointer doubling (no Python-level chaining).
+  Outer boundaries come out counter-clockwise (positive area) and holes clockwise.
+- Measurements: in-plane extents of the section and equivalent diameters of its holes.
+
+Dimension names (critical_dimensions keys):
+- 'length' / 'width' / 'height' (or 'x' / 'y' / 'z'): overall extent along x / y / z
+- '<extent>@<axis>=<value>': extent of the cross-section at a plane, e.g. 'width@z=5'
+- 'hole@<axis>=<value>': diameter of the largest hole in that cross-section
+Plane values are in model units, or relative to the part's extent with '%' ('z=50%').
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from .f3_mesh_topology import IndexedMesh
+except ImportError:
+    from f3_mesh_topology import IndexedMesh
+
+AXIS_NAMES = {'x': 0, 'y': 1, 'z': 2, 'length': 0, 'width': 1, 'height': 2}
+HOLE_NAMES = ('hole', 'hole_diameter')
+_IN_PLANE = {0: (1, 2), 1: (2, 0), 2: (0, 1)}  # (u, v) so that u x v points along the plane normal
+_LEAF_SIZE = 256  # intervals per tree leaf (scanned linearly)
+_MAX_SLICERS = 8  # indexed meshes kept in memory
+_DIMENSION_PATTERN = re.compile(
+    r'^\s*(?P<measure>[a-z_]+)\s*(?:@\s*(?P<axis>[xyz])\s*=\s*(?P<value>[-+]?[\d.]+(?:e[-+]?\d+)?)\s*(?P<percent>%)?)?\s*$'
+)
+
+
+class _IntervalTree:
+    """Static centered interval tree answering 'which intervals contain v'"""
+
+    def __init__(self, lo: np.ndarray, hi: np.ndarray):
+        self.lo = lo
+        self.hi = hi
+        # Flattened nodes: center, children, and the node's intervals sorted by lo and by -hi
+        self.center: List[float] = []
+        self.left: List[int] = []
+        self.right: List[int] = []
+        self.by_lo: List[np.ndarray] = []
+        self.lo_sorted: List[np.ndarray] = []
+        self.by_hi: List[np.ndarray] = []
+        self.neg_hi_sorted: List[np.ndarray] = []
+        self.leaf: List[bool] = []
+        if len(lo):
+            self._build(np.arange(len(lo)))
+
+    def _add_node(self) -> int:
+        for column in (self.center, self.left, self.right, self.by_lo, self.lo_sorted,
+                       self.by_hi, self.neg_hi_sorted, self.leaf):
+            column.append(None)
+        return len(self.center) - 1
+
+    def _build(self, root_ids: np.ndarray):
+        stack = [(self._add_node(), root_ids)]
+        while stack:
+            node, ids = stack.pop()
+            lo, hi = self.lo[ids], self.hi[ids]
+            self.left[node] = self.right[node] = -1
+            if len(ids) <= _LEAF_SIZE:
+                self.leaf[node] = True
+                self.by_lo[node], self.lo_sorted[node] = ids, lo
+                self.by_hi[node], self.neg_hi_sorted[node] = ids, -hi
+                self.center[node] = 0.0
+                continue
+            center = float(np.median((lo + hi) * 0.5))
+            here = (lo <= center) & (hi >= center)
+            order = np.argsort(lo[here], kind='stable')
+            self.by_lo[node], self.lo_sorted[node] = ids[here][order], lo[here][order]
+            order = np.argsort(-hi[here], kind='stable')
+            self.by_hi[node], self.neg_hi_sorted[node] = ids[here][order], -hi[here][order]
+            self.center[node] = center
+            self.leaf[node] = False
+            left_ids, right_ids = ids[hi < center], ids[lo > center]
+            if len(left_ids):
+                self.left[node] = self._add_node()
+                stack.append((self.left[node], left_ids))
+            if len(right_ids):
+                self.right[node] = self._add_node()
+                stack.append((self.right[node], right_ids))
+
+    def query(self, value: float) -> np.ndarray:
+        """Indices of all intervals with lo <= value <= hi"""
+        hits = []
+        node = 0 if self.center else -1
+        while node != -1:
+            if self.leaf[node]:
+                ids = self.by_lo[node]
+                hits.append(ids[(self.lo_sorted[node] <= value) & (-self.neg_hi_sorted[node] >= value)])
+                break
+            if value < self.center[node]:
+                # Every interval here reaches the center, so it contains value iff lo <= value
+                hits.append(self.by_lo[node][:np.searchsorted(self.lo_sorted[node], value, side='right')])
+                node = self.left[node]
+            elif value > self.center[node]:
+                hits.append(self.by_hi[node][:np.searchsorted(self.neg_hi_sorted[node], -value, side='right')])
+                node = self.right[node]
+            else:
+                hits.append(self.by_lo[node])
+                break
+        return np.concatenate(hits) if hits else np.zeros(0, dtype=np.int64)
+
+
+class MeshSlicer:
+    """Cross-sections of one mesh along the coordinate axes"""
+
+    def __init__(self, mesh: IndexedMesh):
+        self.vertices = np.asarray(mesh.vertices, dtype=np.float64)
+        self.faces = np.asarray(mesh.faces, dtype=np.int64)
+        if len(self.vertices):
+            self.bounds_min = self.vertices.min(axis=0)
+            self.bounds_max = self.vertices.max(axis=0)
+        else:
+            self.bounds_min = self.bounds_max = np.zeros(3)
+        self._trees: Dict[int, _IntervalTree] = {}
+        self._lock = threading.Lock()
+
+    def _tree(self, axis: int) -> _IntervalTree:
+        with self._lock:
+            if axis not in self._trees:
+                coords = self.vertices[self.faces, axis] if len(self.faces) else np.zeros((0, 3))
+                self._trees[axis] = _IntervalTree(coords.min(axis=1), coords.max(axis=1))
+            return self._trees[axis]
+
+    def section(self, axis: int, value: float) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Cut the mesh with the plane coordinate[axis] == value
+
+        Planes on the part's bounding faces are nudged inside, where the cut is defined.
+
+        Returns:
+            Dict with 'segments' (k, 2, 3) oriented segment endpoints and 'loops' (k,)
+            loop label per segment, or None when the plane misses the part
+        """
+        lower, upper = float(self.bounds_min[axis]), float(self.bounds_max[axis])
+        value = float(value)
+        if not lower <= value <= upper:
+            return None
+        nudge = max(upper - lower, 1e-12) * 1e-6
+        if value == lower:
+            value = lower + nudge
+        elif value == upper:
+            value = upper - nudge
+
+        ids = self._tree(axis).query(value)
+        if len(ids) == 0:
+            return None
+        faces = self.faces[ids]
+        corners = self.vertices[faces]  # (k, 3, 3)
+        above = corners[:, :, axis] > value
+        after = np.roll(above, -1, axis=1)  # edge i runs from corner i to corner i+1
+        up = ~above & after
+        down = above & ~after
+        crossing = up.any(axis=1)  # crossing triangles have exactly one up and one down edge
+        if not crossing.any():
+            return None
+        faces, corners, up, down = faces[crossing], corners[crossing], up[crossing], down[crossing]
+
+        rows = np.arange(len(faces))
+        # Following the winding, the cut runs from the downward edge to the upward edge
+        points, keys = [], []
+        for edge in (np.argmax(down, axis=1), np.argmax(up, axis=1)):
+            nxt = (edge + 1) % 3
+            p0, p1 = corners[rows, edge], corners[rows, nxt]
+            t = (value - p0[:, axis]) / (p1[:, axis] - p0[:, axis])
+            points.append(p0 + t[:, None] * (p1 - p0))
+            a, b = faces[rows, edge], faces[rows, nxt]
+            keys.append(np.minimum(a, b) * len(self.vertices) + np.maximum(a, b))
+
+        # Endpoints on the same mesh edge are the same point: chain segments into loops
+        nodes, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        start, end = inverse[:len(faces)], inverse[len(faces):]
+        successor = np.arange(len(nodes))
+        successor[start] = end
+        label = np.arange(len(nodes))
+        for _ in range(int(np.ceil(np.log2(max(len(nodes), 2)))) + 1):
+            label = np.minimum(label, label[successor])
+            successor = successor[successor]
+        return {'segments': np.stack(points, axis=1), 'loops': label[start]}
+
+    def measure(self, axis: int, value: float) -> Optional[Dict]:
+        """
+        Measurements of the cross-section at coordinate[axis] == value
+
+        Returns:
+            Dict with 'extent' (per in-plane axis index), 'area' (net section area) and
+            'holes' (equivalent diameters, largest first), or None when the plane misses
+        """
+        section = self.section(axis, value)
+        if section is None:
+            return None
+        segments, loops = section['segments'], section['loops']
+        u, v = _IN_PLANE[axis]
+        # Shoelace terms per segment, summed per loop: outer loops > 0, holes < 0
+        terms = 0.5 * (segments[:, 0, u] * segments[:, 1, v] - segments[:, 1, u] * segments[:, 0, v])
+        labels, loop_index = np.unique(loops, return_inverse=True)
+        areas = np.bincount(loop_index, weights=terms, minlength=len(labels))
+        holes = np.sort(2.0 * np.sqrt(-areas[areas < 0] / np.pi))[::-1]
+        points = segments.reshape(-1, 3)
+        return {
+            'extent': {a: float(points[:, a].max() - points[:, a].min()) for a in (u, v)},
+            'area': float(areas.sum()),
+            'holes': [float(d) for d in holes],
+        }
+
+    def measure_dimension(self, name: str) -> Optional[float]:
+        """
+        Measure one named critical dimension (see module docstring for the names)
+
+        Returns:
+            Measured value in model units, or None when the plane misses the part or the
+            section has no hole
+
+        Raises:
+            ValueError: for a name that does not describe a measurement
+        """
+        match = _DIMENSION_PATTERN.match(name.lower())
+        if not match or (match.group('measure') not in AXIS_NAMES and match.group('measure') not in HOLE_NAMES):
+            raise ValueError(f"Unrecognized dimension '{name}'")
+        measure = match.group('measure')
+        if match.group('axis') is None:
+            if measure in HOLE_NAMES:
+                raise ValueError(f"Dimension '{name}' needs a plane, e.g. '{measure}@z=5'")
+            axis = AXIS_NAMES[measure]
+            return float(self.bounds_max[axis] - self.bounds_min[axis])
+
+        plane_axis = AXIS_NAMES[match.group('axis')]
+        value = float(match.group('value'))
+        if match.group('percent'):
+            value = self.bounds_min[plane_axis] + value / 100.0 * (self.bounds_max[plane_axis] - self.bounds_min[plane_axis])
+        if measure in HOLE_NAMES:
+            result = self.measure(plane_axis, value)
+            return result['holes'][0] if result and result['holes'] else None
+        axis = AXIS_NAMES[measure]
+        if axis == plane_axis:
+            raise ValueError(f"Dimension '{name}' measures along the plane's normal")
+        result = self.measure(plane_axis, value)
+        return result['extent'][axis] if result else None
+
+
+_slicers: 'OrderedDict[str, MeshSlicer]' = OrderedDict()
+_slicers_lock = threading.Lock()
+
+
+def get_slicer(design_hash: str, load_mesh: Callable[[], IndexedMesh]) -> MeshSlicer:
+    """
+    Slicer for a design, kept in a small per-process LRU so its index is built once
+
+    Args:
+        design_hash: Content hash of the STL
+        load_mesh: Loads the welded mesh on a miss
+    """
+    with _slicers_lock:
+        slicer = _slicers.get(design_hash)
+        if slicer is not None:
+            _slicers.move_to_end(design_hash)
+            return slicer
+    slicer = MeshSlicer(load_mesh())
+    with _slicers_lock:
+        _slicers[design_hash] = slicer
+        while len(_slicers) > _MAX_SLICERS:
+            _slicers.popitem(last=False)
+    return slicer
@@ -0,0 +1,263 @@
+"""
+F3 Indexed Mesh and Topology Metrics
+Welds STL triangle soup into an indexed mesh and measures its topology.
+
+- Welding: vertices are quantized to a tolerance (relative to the bounding box) and
+  packed into one int64 key each. Facets are welded chunk by chunk against a sorted
+  table of the keys seen so far, so memory stays near the output mesh (float32
+  vertices, int32 faces) plus one chunk, never a float64/int64 copy of the whole soup
+- Edges: each face contributes three undirected edges; the per-edge face counts
+  come from one in-place sort of packed half-edge keys
+- Metrics: boundary edges (1 face), non-manifold edges (> 2 faces), inconsistently
+  oriented edges, degenerate triangles, watertightness and Euler characteristic
+
+Welded meshes are stored as compact float32/int32 .npz files so later analyses
+(silhouettes, slicing) can skip re-welding.
+"""
+
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    from .f3_io import EvidenceSource
+    from .f3_stl_reader import FACET_DTYPE, iter_facet_chunks
+except ImportError:
+    from f3_io import EvidenceSource
+    from f3_stl_reader import FACET_DTYPE, iter_facet_chunks
+
+WELD_TOLERANCE = 1e-6  # relative to the bounding-box diagonal
+WELD_CHUNK_FACETS = 65536  # facets welded per step (bounds the per-chunk temporaries)
+_KEY_BITS = 21  # bits per quantized coordinate in a packed vertex key
+
+
+@dataclass
+class IndexedMesh:
+    """Welded triangle mesh"""
+    vertices: np.ndarray  # (V, 3) float32
+    faces: np.ndarray  # (F, 3) int32 indices into vertices
+
+    def triangles(self) -> np.ndarray:
+        """(F, 3, 3) vertex coordinates per face"""
+        return self.vertices[self.faces]
+
+    def save(self, path: str):
+        """Write as compressed .npz (unique temp file + atomic replace, safe with concurrent writers)"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp.npz')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                np.savez_compressed(fh, vertices=self.vertices, faces=self.faces)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'IndexedMesh':
+        with np.load(path) as data:
+            return cls(vertices=data['vertices'], faces=data['faces'])
+
+
+def _triangle_chunks(stl_source: EvidenceSource) -> Iterator[np.ndarray]:
+    """(n, 3, 3) float32 vertex coordinates per chunk of facets"""
+    for chunk in iter_facet_chunks(stl_source):
+        vectors = chunk['vertices'] if chunk.dtype == FACET_DTYPE else chunk
+        yield np.asarray(vectors, dtype=np.float32)
+
+
+class _Welder:
+    """Incremental vertex welding over chunks of triangles (see weld_stl)"""
+
+    def __init__(self, lower: np.ndarray, upper: np.ndarray, num_faces: int, tolerance: float):
+        self.lower = lower.astype(np.float64)
+        extent = upper.astype(np.float64) - self.lower
+        self.step = max(float(np.linalg.norm(extent)) * tolerance, 1e-12)
+        # Keys pack three quantized coordinates of _KEY_BITS bits; coarsen the step if needed
+        self.step = max(self.step, float(extent.max()) / (2 ** _KEY_BITS - 2))
+        self.keys = np.zeros(0, dtype=np.int64)  # sorted keys of the vertices so far
+        self.ids = np.zeros(0, dtype=np.int32)  # vertex index per key
+        self.vertices: List[np.ndarray] = []
+        self.num_vertices = 0
+        self.faces = np.empty((num_faces, 3), dtype=np.int32)
+        self.num_faces = 0
+
+    def add(self, triangles: np.ndarray):
+        points = triangles.reshape(-1, 3)
+        quantized = np.rint((points - self.lower) / self.step).astype(np.int64)
+        keys = (quantized[:, 0] << (2 * _KEY_BITS)) | (quantized[:, 1] << _KEY_BITS) | quantized[:, 2]
+        chunk_keys, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        position = np.searchsorted(self.keys, chunk_keys)
+        found = position < len(self.keys)
+        found[found] = self.keys[position[found]] == chunk_keys[found]
+        ids = np.empty(len(chunk_keys), dtype=np.int32)
+        ids[found] = self.ids[position[found]]
+        new = ~found
+        num_new = int(np.count_nonzero(new))
+        ids[new] = np.arange(self.num_vertices, self.num_vertices + num_new, dtype=np.int32)
+        if num_new:
+            self.vertices.append(np.asarray(points[first_index[new]], dtype=np.float32))
+            self.keys = np.insert(self.keys, position[new], chunk_keys[new])
+            self.ids = np.insert(self.ids, position[new], ids[new])
+            self.num_vertices += num_new
+
+        count = len(triangles)
+        self.faces[self.num_faces:self.num_faces + count] = ids[inverse.reshape(-1)].reshape(-1, 3)
+        self.num_faces += count
+
+    def mesh(self) -> IndexedMesh:
+        vertices = np.concatenate(self.vertices) if self.vertices else np.zeros((0, 3), np.float32)
+        return IndexedMesh(vertices=vertices, faces=self.faces[:self.num_faces])
+
+
+def weld_stl(stl_source: EvidenceSource, tolerance: float = WELD_TOLERANCE) -> IndexedMesh:
+    """
+    Welded mesh of an STL, streamed twice (bounding box, then welding) so the facets
+    are never all in memory at once
+
+    Args:
+        stl_source: STL path or buffer
+        tolerance: Merge distance as a fraction of the bounding-box diagonal
+    """
+    lower, upper, num_faces = None, None, 0
+    for triangles in _triangle_chunks(stl_source):
+        if len(triangles) == 0:
+            continue
+        points = triangles.reshape(-1, 3)
+        chunk_lower, chunk_upper = points.min(axis=0), points.max(axis=0)
+        lower = chunk_lower if lower is None else np.minimum(lower, chunk_lower)
+        upper = chunk_upper if upper is None else np.maximum(upper, chunk_upper)
+        num_faces += len(triangles)
+    if num_faces == 0:
+        return IndexedMesh(np.zeros((0, 3), np.float32), np.zeros((0, 3), np.int32))
+
+    welder = _Welder(lower, upper, num_faces, tolerance)
+    for triangles in _triangle_chunks(stl_source):
+        welder.add(triangles[:num_faces - welder.num_faces])
+    return welder.mesh()
+
+
+def edge_counts(faces: np.ndarray, num_vertices: int):
+    """
+    Faces per undirected edge, without materializing the adjacency
+
+    Each half-edge becomes one int64 (edge key * 2 + direction bit), sorted in place;
+    runs of equal edge keys are the edges.
+
+    Returns:
+        (counts, forward_count): faces using each edge, and how many of them traverse
+        it low -> high
+    """
+    if len(faces) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    half_edges = np.empty(3 * len(faces), dtype=np.int64)
+    for k in range(3):
+        a = faces[:, k].astype(np.int64)
+        b = faces[:, (k + 1) % 3].astype(np.int64)
+        half_edges[k::3] = (np.minimum(a, b) * num_vertices + np.maximum(a, b)) * 2 + (a < b)
+    half_edges.sort()
+    edges = half_edges >> 1
+    starts = np.concatenate([[0], np.flatnonzero(edges[1:] != edges[:-1]) + 1])
+    del edges
+    counts = np.diff(np.append(starts, len(half_edges)))
+    forward_count = np.add.reduceat((half_edges & 1).astype(np.int8), starts, dtype=np.int64)
+    return counts, forward_count
+
+
+def _triangle_areas2(mesh: IndexedMesh) -> np.ndarray:
+    """Twice the area of every face, computed in chunks of float64"""
+    areas = np.empty(len(mesh.faces), dtype=np.float64)
+    for start in range(0, len(mesh.faces), WELD_CHUNK_FACETS):
+        tri = mesh.vertices[mesh.faces[start:start + WELD_CHUNK_FACETS]].astype(np.float64)
+        areas[start:start + len(tri)] = np.linalg.norm(np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0]), axis=1)
+    return areas
+
+
+def topology_metrics(mesh: IndexedMesh) -> Dict:
+    """
+    Topology report for a welded mesh
+
+    Returns:
+        Dict with num_vertices, num_edges, boundary_edges, non_manifold_edges,
+        inconsistent_edges, degenerate_triangles, watertight, euler_characteristic
+    """
+    faces = mesh.faces
+    if len(faces) == 0:
+        return {
+            'num_vertices': 0, 'num_edges': 0, 'boundary_edges': 0, 'non_manifold_edges': 0,
+            'inconsistent_edges': 0, 'degenerate_triangles': 0, 'watertight': False,
+            'euler_characteristic': 0,
+        }
+
+    # Degenerate: collapsed by welding (repeated index) or zero area
+    collapsed = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 0] == faces[:, 2])
+    area2 = _triangle_areas2(mesh)
+    degenerate = collapsed | (area2 <= 1e-12 * max(float(area2.max()), 1e-12))
+
+    num_vertices = int(faces.max()) + 1
+    counts, forward_count = edge_counts(faces[~collapsed] if collapsed.any() else faces, num_vertices)
+    boundary = int(np.count_nonzero(counts == 1))
+    non_manifold = int(np.count_nonzero(counts > 2))
+    # A consistently wound manifold edge is traversed once in each direction
+    inconsistent = int(np.count_nonzero((counts == 2) & (forward_count != 1)))
+
+    used = np.zeros(num_vertices, dtype=bool)
+    used[faces.ravel()] = True
+    used_vertices = int(np.count_nonzero(used))
+    return {
+        'num_vertices': used_vertices,
+        'num_edges': int(len(counts)),
+        'boundary_edges': boundary,
+        'non_manifold_edges': non_manifold,
+        'inconsistent_edges': inconsistent,
+        'degenerate_triangles': int(np.count_nonzero(degenerate)),
+        'watertight': boundary == 0 and non_manifold == 0,
+        'euler_characteristic': used_vertices - int(len(counts)) + int(np.count_nonzero(~collapsed)),
+    }
+
+
+def topology_quality(metrics: Dict, num_faces: int) -> float:
+    """
+    0-1 mesh quality from topology defects
+
+    Clean watertight meshes score 1.0; open meshes are capped at 0.9 and every defect
+    class costs in proportion to how much of the mesh it affects.
+    """
+    edges = max(metrics['num_edges'], 1)
+    penalty = (
+        2.0 * metrics['boundary_edges'] / edges
+        + 4.0 * metrics['non_manifold_edges'] / edges
+        + 2.0 * metrics['inconsistent_edges'] / edges
+        + 2.0 * metrics['degenerate_triangles'] / max(num_faces, 1)
+    )
+    quality = max(0.0, 1.0 - penalty)
+    if not metrics['watertight']:
+        quality = min(quality, 0.9)
+    return float(quality)
+
+
+def load_indexed_mesh(stl_source: EvidenceSource, cache_path: Optional[str] = None) -> IndexedMesh:
+    """
+    Welded mesh for an STL, reusing the .npz at cache_path when present
+
+    Args:
+        stl_source: STL path or buffer
+        cache_path: Optional .npz location (written after welding)
+    """
+    if cache_path and os.path.exists(cache_path):
+        try:
+            return IndexedMesh.load(cache_path)
+        except Exception as e:
+            print(f"Warning: Re-welding mesh, cached copy unreadable: {e}")
+
+    mesh = weld_stl(stl_source)
+    if cache_path:
+        try:
+            mesh.save(cache_path)
+        except OSError as e:
+            print(f"Warning: Could not cache welded mesh: {e}")
+    return mesh
@@ -0,0 +1,102 @@
+"""
+F3 Parallel Execution
+CPU-sized worker pool for per-image analysis with bounded queueing (backpressure).
+
+The pool is shared by every VisionQualityCheckModel in the process. Submissions
+block once max_pending tasks are in flight, so a burst of large QC requests cannot
+queue unbounded work (and memory) behind the workers.
+
+The default process pool starts its workers with the 'spawn' method, which re-imports
+the main module in every worker. Scripts that run checks with the model must keep
+their top-level code under an `if __name__ == '__main__':` guard (or set
+MAMA_F3_POOL=thread); otherwise each worker re-runs the script and the pool breaks.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+DEFAULT_POOL_KIND = os.getenv('MAMA_F3_POOL', 'process')  # 'process' or 'thread'
+DEFAULT_POOL_WORKERS = int(os.getenv('MAMA_F3_POOL_WORKERS', '0')) or (os.cpu_count() or 1)
+
+
+class BoundedExecutor:
+    """
+    Process or thread pool with a cap on in-flight tasks
+
+    Args:
+        max_workers: Worker count (defaults to CPU count)
+        kind: 'process' (true parallelism for CPU-bound analysis) or 'thread'
+        max_pending: Max submitted-but-unfinished tasks; submit() blocks beyond this
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, kind: str = 'process', max_pending: Optional[int] = None):
+        self.max_workers = max_workers or DEFAULT_POOL_WORKERS
+        self.kind = kind
+        self.max_pending = max_pending or self.max_workers * 2
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == 'process':
+                    # spawn: safe to start from a threaded server process
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='f3-analysis'
+                    )
+            return self._executor
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        """Submit a task, blocking while max_pending tasks are already in flight"""
+        self._slots.acquire()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+_image_pool: Optional[BoundedExecutor] = None
+_image_pool_workers: Optional[int] = None
+_image_pool_lock = threading.Lock()
+
+
+def configure_image_pool(max_workers: int) -> bool:
+    """
+    Set the worker count of the process-wide pool
+
+    Returns:
+        False if the pool was already started (its size is then left unchanged)
+    """
+    global _image_pool_workers
+    with _image_pool_lock:
+        if _image_pool is not None:
+            return False
+        _image_pool_workers = max_workers
+        return True
+
+
+def get_image_pool() -> BoundedExecutor:
+    """Process-wide pool used for image analysis"""
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is None:
+            _image_pool = BoundedExecutor(max_workers=_image_pool_workers, kind=DEFAULT_POOL_KIND)
+        return _image_pool
@@ -0,0 +1,77 @@
+"""
+F3 Perceptual Hashing
+64-bit DCT perceptual hashes (pHash) for spotting near-duplicate evidence photos.
+
+The hash keeps the signs of the lowest 8x8 DCT frequencies (minus DC) of a 32x32
+grayscale thumbnail relative to their median. Burst shots and re-encoded uploads of
+the same photo land within a few bits of each other; different views do not.
+"""
+
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+HASH_SIZE = 8
+THUMBNAIL_SIZE = 32
+# Photos whose hashes differ in at most this many of the 64 bits are treated as duplicates
+DUPLICATE_DISTANCE = int(os.getenv('MAMA_F3_PHASH_DISTANCE', '6'))
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis (rows are frequencies)"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    basis = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    basis[0] /= np.sqrt(2.0)
+    return basis
+
+
+_DCT = _dct_matrix(THUMBNAIL_SIZE)[:HASH_SIZE]  # only the low frequencies are needed
+
+
+def perceptual_hash(thumbnail: np.ndarray) -> int:
+    """
+    pHash of a (32, 32) grayscale thumbnail
+
+    Returns:
+        64-bit hash as a Python int
+    """
+    low = _DCT @ thumbnail.astype(np.float64) @ _DCT.T  # (8, 8) lowest frequencies
+    coefficients = low.ravel()[1:]  # DC only reflects overall brightness
+    bits = np.concatenate([[False], coefficients > np.median(coefficients)])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+
+def group_near_duplicates(
+    hashes: Sequence[Optional[int]],
+    max_distance: int = DUPLICATE_DISTANCE,
+) -> List[int]:
+    """
+    Assign every item to a representative (the first similar item seen)
+
+    Args:
+        hashes: Hash per item; None for items that must never be collapsed
+        max_distance: Max Hamming distance for two items to count as duplicates
+
+    Returns:
+        Representative index per item (an item that is not a duplicate maps to itself)
+    """
+    representatives: List[int] = []
+    groups: List[int] = []
+    for i, h in enumerate(hashes):
+        group = i
+        if h is not None:
+            for r in representatives:
+                if hamming_distance(h, hashes[r]) <= max_distance:
+                    group = r
+                    break
+            else:
+                representatives.append(i)
+        groups.append(group)
+    return groups
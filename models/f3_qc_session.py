@@ -0,0 +1,135 @@
+"""
+F3 QC Sessions
+Per-job state that lets a quality check be re-evaluated when photos are added.
+
+A session keeps, for each analysis resolution, the features of the photos analyzed so
+far (near-duplicates already collapsed) and their pairwise similarity matrix, plus the
+STL features and design silhouettes. Adding photos analyzes only the new ones and
+extends the matrix by their rows and columns.
+
+Photo sources are held only until their full-resolution features exist (a check
+decided on thumbnails may still need them if later photos make it borderline). Until
+then in-memory photos are spilled to a per-session ScratchArea, so a session holds
+paths rather than photo bytes for its lifetime; the files go with the session.
+Sessions are evicted least-recently-used past max_sessions and after ttl seconds.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    from .f3_io import EvidenceSource, ScratchArea, is_path
+except ImportError:
+    from f3_io import EvidenceSource, ScratchArea, is_path
+
+DEFAULT_MAX_SESSIONS = int(os.getenv('MAMA_F3_SESSION_MAX', '64'))
+DEFAULT_SESSION_TTL = float(os.getenv('MAMA_F3_SESSION_TTL', '3600'))  # seconds since last use
+
+
+@dataclass
+class EvidenceState:
+    """Analyzed evidence at one resolution"""
+    features: List[Dict] = field(default_factory=list)  # unique photos (near-duplicates collapsed)
+    indices: List[int] = field(default_factory=list)  # photo number (session order) per feature dict
+    similarity: Optional[np.ndarray] = None  # (n, n) pairwise similarity of features
+    design_scores: List[Optional[float]] = field(default_factory=list)  # silhouette match per feature dict
+    vectors: List[Optional[np.ndarray]] = field(default_factory=list)  # reference-index vector (None if undecodable)
+    analyzed: int = 0  # session photos covered, duplicates included
+
+
+@dataclass
+class QCSession:
+    """Incremental QC state for one job"""
+    input_data: Any  # QualityCheckInput without evidence (tier, critical dimensions, ...)
+    stl_features: Optional[Dict]
+    design_references: np.ndarray
+    notes: List[str]  # notes from the STL / input stage, repeated on every result
+    dimension_score: Optional[float] = None  # 0-1 agreement of critical_dimensions with the design (None if unchecked)
+    sources: List[Optional[EvidenceSource]] = field(default_factory=list)  # None once no longer needed
+    frames: Set[int] = field(default_factory=set)  # indices of sources sampled from videos
+    scratch: Optional[ScratchArea] = None  # spilled in-memory sources (see spill_sources)
+    states: Dict[Tuple[int, int], EvidenceState] = field(default_factory=dict)
+    recorded: Set[Tuple[Tuple[int, int], int]] = field(default_factory=set)  # (size, photo number) added to the reference index
+    last_used: float = field(default_factory=time.time)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)  # one evaluation at a time
+
+    def state(self, size: Tuple[int, int]) -> EvidenceState:
+        return self.states.setdefault(tuple(size), EvidenceState())
+
+    def spill_sources(self):
+        """Write in-memory photo sources to the session's scratch area and keep their paths"""
+        for i, source in enumerate(self.sources):
+            if source is None or is_path(source):
+                continue
+            try:
+                if self.scratch is None:
+                    self.scratch = ScratchArea()
+                self.sources[i] = self.scratch.write(source)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not spill QC evidence to disk ({e}); keeping it in memory")
+                return
+
+    def release_sources(self, count: int):
+        """Drop the first count sources, and the scratch area once nothing refers to it"""
+        self.sources[:count] = [None] * count
+        if self.scratch is not None and all(source is None for source in self.sources):
+            self.scratch.close()
+            self.scratch = None
+
+
+class SessionStore:
+    """Thread-safe LRU + TTL map of job_id -> QCSession"""
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, ttl: float = DEFAULT_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: 'OrderedDict[str, QCSession]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._sessions:
+            job_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[job_id]
+
+    def get(self, job_id: str) -> Optional[QCSession]:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(job_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(job_id)
+            return session
+
+    def put(self, job_id: str, session: QCSession):
+        now = time.time()
+        with self._lock:
+            session.last_used = now
+            self._sessions[job_id] = session
+            self._sessions.move_to_end(job_id)
+            self._expire(now)
+
+    def discard(self, job_id: str):
+        with self._lock:
+            self._sessions.pop(job_id, None)
+
+
+_default_store: Optional[SessionStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_session_store() -> SessionStore:
+    """Process-wide session store shared by all model instances"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SessionStore()
+        return _default_store
@@ -0,0 +1,284 @@
+"""
+F3 Reference Feature Index
+History of evidence from parts that passed QC, grouped by design (STL content hash).
+
+Each passed photo is reduced to a compact float32 vector (coarse histogram, colour and
+edge/texture statistics). New evidence for the same design is scored by its k-nearest-
+neighbour distance to that history, relative to how far apart past passes typically
+are from each other. Search is vectorized brute force (one matrix product), which
+stays in the low milliseconds at 100k stored vectors per design.
+
+Photos are recorded once: each vector carries the photo's content key (a 16-byte
+digest), and vectors whose key is already in the history are skipped, so re-checking
+the same evidence does not pile up identical rows (which would shrink the typical
+distance towards zero and make every new photo look anomalous).
+
+Storage: one append-only file of raw float32 rows per design plus a parallel file of
+content keys, so recording a pass is two small writes; files are compacted to the
+newest max_vectors rows when they grow past 125% of the cap.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_REFERENCE_DIR = os.getenv(
+    'MAMA_F3_REFERENCE_DIR',
+    os.path.join(os.path.expanduser('~'), '.local', 'share', 'mama', 'f3', 'references'),
+)
+DEFAULT_MAX_VECTORS = int(os.getenv('MAMA_F3_REFERENCE_MAX_VECTORS', '100000'))  # per design
+DEFAULT_K = 5
+MIN_REFERENCE_VECTORS = 20  # below this a design's history is too thin to judge against
+
+HISTOGRAM_BINS = 32
+VECTOR_DIM = HISTOGRAM_BINS + 3 + 3 + 4
+KEY_BYTES = 16  # content-key digest bytes stored per vector (zeros: unknown)
+MIN_SCALE = 0.05  # floor on the typical distance: what a 2% exposure change or slight reframing moves a vector
+_SCALE_SAMPLE = 256  # stored vectors used to estimate the typical neighbour distance
+_SCALE_REUSE_GROWTH = 0.05  # keep the estimate until the history grows by this fraction
+_MAX_DESIGNS_IN_MEMORY = 64
+_DISTANCE_BLOCK_ELEMENTS = 1 << 22
+
+
+def feature_vector(features: Dict) -> np.ndarray:
+    """
+    Compact, roughly resolution-independent vector for one image's F3 features
+
+    Layout: sqrt of a 32-bin histogram (Hellinger embedding), RGB mean and std (0-1),
+    edge density scaled by image width (edge pixels grow with the side, not the area),
+    texture std, brightness and contrast.
+    """
+    hist = np.asarray(features['histogram'], dtype=np.float64)
+    coarse = hist.reshape(HISTOGRAM_BINS, -1).sum(axis=1)
+    coarse = np.sqrt(coarse / (coarse.sum() + 1e-12))
+    edge = features['edge_density'] * 255.0 * features.get('width', 512) / 512.0
+    return np.concatenate([
+        coarse,
+        np.asarray(features['color_mean'], dtype=np.float64) / 255.0,
+        np.asarray(features['color_std'], dtype=np.float64) / 255.0,
+        [edge, np.sqrt(features['texture_variance']) / 128.0, features['brightness'], features['contrast']],
+    ]).astype(np.float32)
+
+
+class _DesignHistory:
+    """Loaded vectors of one design plus search helpers"""
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        keys: np.ndarray,
+        file_size: int,
+        previous: Optional['_DesignHistory'] = None,
+    ):
+        self.vectors = vectors
+        self.keys = keys  # (N, KEY_BYTES) uint8 content key per vector
+        self.key_set = {row.tobytes() for row in keys}
+        self.file_size = file_size
+        self.sq_norms = np.einsum('ij,ij->i', vectors, vectors, dtype=np.float64)
+        self._scale: Optional[float] = None
+        self._scale_rows = 0
+        if previous is not None and previous._scale is not None:
+            # A few more passes barely move the typical distance: skip re-estimating it
+            if len(vectors) <= previous._scale_rows * (1 + _SCALE_REUSE_GROWTH):
+                self._scale, self._scale_rows = previous._scale, previous._scale_rows
+
+    def knn_distances(self, queries: np.ndarray, k: int, exclude_self: bool = False) -> np.ndarray:
+        """(q, k) Euclidean distances to the k nearest stored vectors (ascending)"""
+        kk = min(k + int(exclude_self), len(self.vectors))
+        # Query rows per block, so the (rows, N) distance block stays around 32 MB
+        block = max(1, _DISTANCE_BLOCK_ELEMENTS // max(len(self.vectors), 1))
+        nearest = []
+        for start in range(0, len(queries), block):
+            q = queries[start:start + block].astype(np.float32)
+            cross = (q @ self.vectors.T).astype(np.float64)
+            d2 = np.einsum('ij,ij->i', q, q, dtype=np.float64)[:, None] + self.sq_norms[None, :] - 2.0 * cross
+            np.maximum(d2, 0.0, out=d2)
+            nearest.append(np.partition(d2, kk - 1, axis=1)[:, :kk])
+        nearest = np.sort(np.concatenate(nearest), axis=1)
+        if exclude_self:
+            nearest = nearest[:, 1:]
+        return np.sqrt(nearest)
+
+    def scale(self, k: int) -> float:
+        """Median k-NN distance among stored vectors (what a normal pass looks like), at least MIN_SCALE"""
+        if self._scale is None:
+            step = max(1, len(self.vectors) // _SCALE_SAMPLE)
+            sample = self.vectors[::step][:_SCALE_SAMPLE]
+            median = float(np.median(self.knn_distances(sample, k, exclude_self=True).mean(axis=1)))
+            self._scale = max(median, MIN_SCALE)
+            self._scale_rows = len(self.vectors)
+        return self._scale
+
+
+class ReferenceIndex:
+    """
+    Per-design kNN index of passed-evidence feature vectors
+
+    Args:
+        root: Storage directory (None keeps history in memory only)
+        max_vectors: Newest vectors kept per design
+        k: Neighbours averaged per query
+    """
+
+    def __init__(self, root: Optional[str] = DEFAULT_REFERENCE_DIR, max_vectors: int = DEFAULT_MAX_VECTORS, k: int = DEFAULT_K):
+        self.root = root or None
+        self.max_vectors = max_vectors
+        self.k = k
+        self._designs: 'OrderedDict[str, _DesignHistory]' = OrderedDict()
+        self._lock = threading.Lock()
+        if self.root:
+            try:
+                os.makedirs(self.root, exist_ok=True)
+            except OSError as e:
+                print(f"Warning: F3 reference directory unavailable ({e}); keeping history in memory")
+                self.root = None
+
+    def _path(self, design_hash: str) -> str:
+        return os.path.join(self.root, design_hash[:2], design_hash + '.f32')
+
+    def _keys_path(self, design_hash: str) -> str:
+        return os.path.join(self.root, design_hash[:2], design_hash + '.keys')
+
+    def _read_keys(self, design_hash: str, rows: int) -> np.ndarray:
+        """Stored content keys aligned to the first rows vectors (zero rows where missing)"""
+        keys = np.zeros((rows, KEY_BYTES), dtype=np.uint8)
+        try:
+            raw = np.fromfile(self._keys_path(design_hash), dtype=np.uint8)
+        except OSError:
+            return keys
+        stored = min(rows, len(raw) // KEY_BYTES)
+        keys[:stored] = raw[:stored * KEY_BYTES].reshape(stored, KEY_BYTES)
+        return keys
+
+    def _history(self, design_hash: str) -> Optional[_DesignHistory]:
+        """Loaded history, re-read when another process appended to the file"""
+        history = self._designs.get(design_hash)
+        if self.root:
+            try:
+                file_size = os.path.getsize(self._path(design_hash))
+            except OSError:
+                return history
+            if history is None or history.file_size != file_size:
+                raw = np.fromfile(self._path(design_hash), dtype=np.float32)
+                rows = len(raw) // VECTOR_DIM  # ignore a torn trailing row
+                history = _DesignHistory(
+                    raw[:rows * VECTOR_DIM].reshape(rows, VECTOR_DIM), self._read_keys(design_hash, rows),
+                    file_size, history,
+                )
+        if history is not None:
+            self._designs[design_hash] = history
+            self._designs.move_to_end(design_hash)
+            while len(self._designs) > _MAX_DESIGNS_IN_MEMORY:
+                self._designs.popitem(last=False)
+        return history
+
+    def size(self, design_hash: str) -> int:
+        """Number of stored vectors for a design"""
+        with self._lock:
+            history = self._history(design_hash)
+            return 0 if history is None else len(history.vectors)
+
+    def add(self, design_hash: str, vectors: List[np.ndarray], keys: Optional[List[Optional[str]]] = None):
+        """
+        Record feature vectors of a passed part
+
+        Args:
+            design_hash: History to add to
+            vectors: One vector per photo
+            keys: Content key (hex digest) per photo; photos whose key is already recorded
+                for this design are skipped. None entries are always added.
+        """
+        if not vectors:
+            return
+        digests = [
+            bytes.fromhex(key[:2 * KEY_BYTES]) if key else bytes(KEY_BYTES)
+            for key in (keys if keys is not None else [None] * len(vectors))
+        ]
+        with self._lock:
+            history = self._history(design_hash)
+            seen = set(history.key_set) if history is not None else set()
+            seen.discard(bytes(KEY_BYTES))
+            keep = []
+            for i, digest in enumerate(digests):
+                if digest in seen:
+                    continue
+                if any(digest):
+                    seen.add(digest)
+                keep.append(i)
+            if not keep:
+                return
+            new = np.stack([vectors[i] for i in keep]).astype(np.float32)
+            new_keys = np.frombuffer(b''.join(digests[i] for i in keep), dtype=np.uint8).reshape(-1, KEY_BYTES)
+
+            if history is None:
+                combined, combined_keys = new, new_keys
+            else:
+                combined = np.concatenate([history.vectors, new])
+                combined_keys = np.concatenate([history.keys, new_keys])
+            compact = len(combined) > self.max_vectors * 1.25
+            if compact:
+                combined, combined_keys = combined[-self.max_vectors:], combined_keys[-self.max_vectors:]
+
+            file_size = 0
+            if self.root:
+                path, keys_path = self._path(design_hash), self._keys_path(design_hash)
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if compact:
+                        for target, data in ((keys_path, combined_keys), (path, combined)):
+                            data.tofile(target + '.tmp')
+                            os.replace(target + '.tmp', target)
+                    else:
+                        # Keys first (a torn write leaves extra keys, ignored on load); rewrite the
+                        # keys file when it is out of step with the vectors (older or torn files)
+                        old_keys = history.keys if history is not None else new_keys[:0]
+                        keys_size = os.path.getsize(keys_path) if os.path.exists(keys_path) else 0
+                        if keys_size != old_keys.nbytes:
+                            old_keys.tofile(keys_path)
+                        with open(keys_path, 'ab') as fh:
+                            fh.write(new_keys.tobytes())
+                        with open(path, 'ab') as fh:
+                            fh.write(new.tobytes())
+                    file_size = os.path.getsize(path)
+                except OSError as e:
+                    print(f"Warning: Could not store F3 reference vectors: {e}")
+            self._designs[design_hash] = _DesignHistory(
+                np.ascontiguousarray(combined), np.ascontiguousarray(combined_keys), file_size, history
+            )
+
+    def score(self, design_hash: str, vectors: List[np.ndarray]) -> Optional[float]:
+        """
+        How closely new evidence matches the design's passed history
+
+        Each query's mean k-NN distance is divided by the typical distance between past
+        passes: at or below 1 scores 1.0, and the score falls off as 1 / ratio beyond that.
+
+        Returns:
+            Mean 0-1 score over the queries, or None without enough history
+        """
+        if not vectors:
+            return None
+        with self._lock:
+            history = self._history(design_hash)
+            if history is None or len(history.vectors) < MIN_REFERENCE_VECTORS:
+                return None
+            distances = history.knn_distances(np.stack(vectors), self.k).mean(axis=1)
+            scale = history.scale(self.k)
+        ratio = distances / scale
+        return float(np.mean(1.0 / np.maximum(ratio, 1.0)))
+
+
+_default_index: Optional[ReferenceIndex] = None
+_default_index_lock = threading.Lock()
+
+
+def get_default_reference_index() -> ReferenceIndex:
+    """Process-wide reference index shared by all model instances"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = ReferenceIndex()
+        return _default_index
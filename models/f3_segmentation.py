@@ -0,0 +1,145 @@
+"""
+F3 Foreground Segmentation
+Separates the part from its background in evidence photos, vectorized in NumPy.
+
+- Background model: the frame border's median colour and spread; pixels well outside
+  it are foreground (photos are framed with the part away from the edges)
+- Cleanup: binary opening then closing with a square structuring element, each a
+  pair of box filters on summed-area tables (O(1) per pixel for any radius), which
+  drops sensor speckle and bridges specular gaps on the part (silhouettes)
+- Cropping: the bounding box of the unopened mask (only isolated pixels dropped, so
+  thin features such as pins and brackets stay in), padded by a margin, is what the
+  image pipeline analyzes, so workbench and backdrop no longer dominate the features.
+  If foreground still reaches the padded box's edge, the whole frame is kept.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+SEGMENT_MAX_SIDE = 192  # segmentation runs on a thumbnail of this size (longest side)
+CROP_MARGIN = 0.08  # padding around the part, as a fraction of its bounding box
+MIN_FOREGROUND = 0.01  # below this fraction of pixels the mask is noise: do not crop
+MAX_CROP_AREA = 0.9  # crops keeping more of the frame than this are not worth it
+_MIN_THRESHOLD = 30.0  # min RGB distance from the border colour for foreground
+
+
+def border_distance(image: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Distance of every pixel from the border colour model
+
+    Returns:
+        ((H, W) RGB distance from the border's median colour, foreground threshold)
+    """
+    pixels = image.astype(np.float32)
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    reference = np.median(border, axis=0)
+    border_dist = np.linalg.norm(border - reference, axis=1)
+    threshold = max(_MIN_THRESHOLD, float(border_dist.mean() + 3.0 * border_dist.std()))
+    return np.linalg.norm(pixels - reference, axis=2), threshold
+
+
+def _box_count(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Number of set pixels in the (2r+1)-square window around each pixel (zero padded)"""
+    padded = np.pad(mask, radius).astype(np.int32)
+    sat = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.int32)
+    np.cumsum(padded, axis=0, out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+    k = 2 * radius + 1
+    return sat[k:, k:] - sat[:-k, k:] - sat[k:, :-k] + sat[:-k, :-k]
+
+
+def erode(mask: np.ndarray, radius: int = 1) -> np.ndarray:
+    """Binary erosion with a (2r+1)-square element"""
+    return _box_count(mask, radius) == (2 * radius + 1) ** 2
+
+
+def dilate(mask: np.ndarray, radius: int = 1) -> np.ndarray:
+    """Binary dilation with a (2r+1)-square element"""
+    return _box_count(mask, radius) > 0
+
+
+def clean_mask(mask: np.ndarray, radius: int = 1) -> np.ndarray:
+    """Morphological opening (drop specks) followed by closing (fill small gaps)"""
+    opened = dilate(erode(mask, radius), radius)
+    return erode(dilate(opened, radius), radius)
+
+
+def despeckle(mask: np.ndarray) -> np.ndarray:
+    """Drop isolated pixels (no set 8-neighbour), keeping features one pixel wide"""
+    return mask & (_box_count(mask, 1) >= 2)
+
+
+def foreground_mask(image: np.ndarray, cleanup: bool = True) -> np.ndarray:
+    """
+    Part mask for an (H, W, 3) photo: pixels that differ from the border colour
+
+    Border pixels model the background; anything well outside their spread is foreground.
+
+    Args:
+        image: (H, W, 3) uint8 RGB
+        cleanup: Apply clean_mask (3x3 opening and closing)
+    """
+    distance, threshold = border_distance(image)
+    mask = distance > threshold
+    return clean_mask(mask) if cleanup else mask
+
+
+def part_bounding_box(mask: np.ndarray, margin: float = CROP_MARGIN) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Padded bounding box of the foreground
+
+    Returns:
+        (left, top, right, bottom) in mask pixels (right/bottom exclusive), or None when
+        the mask is too sparse to trust or the box would keep most of the frame
+    """
+    height, width = mask.shape
+    if np.count_nonzero(mask) < MIN_FOREGROUND * mask.size:
+        return None
+    rows = np.nonzero(mask.any(axis=1))[0]
+    cols = np.nonzero(mask.any(axis=0))[0]
+    pad_y = int(np.ceil((rows[-1] + 1 - rows[0]) * margin))
+    pad_x = int(np.ceil((cols[-1] + 1 - cols[0]) * margin))
+    top, bottom = max(0, rows[0] - pad_y), min(height, rows[-1] + 1 + pad_y)
+    left, right = max(0, cols[0] - pad_x), min(width, cols[-1] + 1 + pad_x)
+    if (bottom - top) * (right - left) > MAX_CROP_AREA * mask.size:
+        return None
+    return left, top, right, bottom
+
+
+def touches_box_edge(mask: np.ndarray, box: Tuple[int, int, int, int]) -> bool:
+    """True if the mask has pixels on an edge of the box that lies inside the frame"""
+    left, top, right, bottom = box
+    height, width = mask.shape
+    return bool(
+        (top > 0 and mask[top, left:right].any())
+        or (bottom < height and mask[bottom - 1, left:right].any())
+        or (left > 0 and mask[top:bottom, left].any())
+        or (right < width and mask[top:bottom, right - 1].any())
+    )
+
+
+def crop_box(thumbnail: np.ndarray, full_size: Tuple[int, int]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Where to crop a full-size image, from the segmentation of its thumbnail
+
+    Args:
+        thumbnail: (h, w, 3) uint8 downscaled copy of the image
+        full_size: (width, height) of the image to crop
+
+    Returns:
+        (left, top, right, bottom) in full-size pixels, or None to keep the whole frame
+    """
+    distance, threshold = border_distance(thumbnail)
+    mask = distance > threshold
+    # Opening would erase features about a pixel wide, so the box comes from the raw mask
+    box = part_bounding_box(despeckle(mask))
+    if box is None or touches_box_edge(mask, box):
+        return None
+    scale_x = full_size[0] / thumbnail.shape[1]
+    scale_y = full_size[1] / thumbnail.shape[0]
+    left, top, right, bottom = box
+    return (
+        int(np.floor(left * scale_x)), int(np.floor(top * scale_y)),
+        min(full_size[0], int(np.ceil(right * scale_x))), min(full_size[1], int(np.ceil(bottom * scale_y))),
+    )
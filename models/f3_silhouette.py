@@ -0,0 +1,256 @@
+"""
+F3 Silhouette Atlas
+Software-renders an STL from a fixed set of canonical views so evidence photos can be
+compared against the design itself, not only against each other.
+
+- Rasterizer: vectorized CPU z-buffer. Triangles are bucketed by projected size
+  (power-of-two pixel boxes) and every bucket is rasterized with one broadcast
+  barycentric test; depth and face shading are resolved with np.minimum.at.
+- Atlas: per view, a silhouette mask and a headlight-shaded depth-tested render.
+  It is computed once per design and cached as .npz next to the mesh features.
+- Matching: masks are reduced to scale/position-normalized descriptors and compared
+  with soft IoU over the 8 in-plane rotations/flips, best view wins.
+"""
+
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    from .f3_mesh_topology import IndexedMesh
+except ImportError:
+    from f3_mesh_topology import IndexedMesh
+
+ATLAS_RESOLUTION = 128
+DESCRIPTOR_SIZE = 32
+_FRAGMENT_BUDGET = 2_000_000  # max candidate pixels evaluated per rasterization step
+
+
+def _view_rotation(direction, up=(0.0, 0.0, 1.0)) -> np.ndarray:
+    """Rows: screen right, screen up, depth axis (camera looks along -direction)"""
+    forward = -np.asarray(direction, dtype=np.float64)
+    forward /= np.linalg.norm(forward)
+    up = np.asarray(up, dtype=np.float64)
+    if abs(np.dot(up, forward)) > 0.99:
+        up = np.array([0.0, 1.0, 0.0])
+    right = np.cross(forward, up)
+    right /= np.linalg.norm(right)
+    true_up = np.cross(right, forward)
+    return np.stack([right, true_up, forward])
+
+
+# Canonical views: the six axis views plus four upper isometric views
+CANONICAL_VIEWS: Dict[str, np.ndarray] = {
+    'front': _view_rotation((0, -1, 0)),
+    'back': _view_rotation((0, 1, 0)),
+    'left': _view_rotation((-1, 0, 0)),
+    'right': _view_rotation((1, 0, 0)),
+    'top': _view_rotation((0, 0, 1)),
+    'bottom': _view_rotation((0, 0, -1)),
+    'iso_front_left': _view_rotation((-1, -1, 1)),
+    'iso_front_right': _view_rotation((1, -1, 1)),
+    'iso_back_left': _view_rotation((-1, 1, 1)),
+    'iso_back_right': _view_rotation((1, 1, 1)),
+}
+
+
+@dataclass
+class SilhouetteAtlas:
+    """Rendered canonical views of one design"""
+    view_names: List[str]
+    silhouettes: np.ndarray  # (V, R, R) bool
+    shading: np.ndarray  # (V, R, R) uint8, 0 = background
+    descriptors: np.ndarray  # (V, D, D) float32
+
+    def save(self, path: str):
+        """Write as compressed .npz (unique temp file + atomic replace, safe with concurrent writers)"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp.npz')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                np.savez_compressed(
+                    fh,
+                    view_names=np.array(self.view_names),
+                    silhouettes=self.silhouettes,
+                    shading=self.shading,
+                    descriptors=self.descriptors,
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'SilhouetteAtlas':
+        with np.load(path) as data:
+            return cls(
+                view_names=[str(v) for v in data['view_names']],
+                silhouettes=data['silhouettes'],
+                shading=data['shading'],
+                descriptors=data['descriptors'],
+            )
+
+
+def render_view(mesh: IndexedMesh, rotation: np.ndarray, resolution: int = ATLAS_RESOLUTION):
+    """
+    Orthographic z-buffer render of a mesh
+
+    Returns:
+        (depth, shade): depth is (R, R) float32 with inf for background; shade is (R, R)
+        float32 in 0-1 (|cos| between face normal and view axis)
+    """
+    depth = np.full(resolution * resolution, np.inf, dtype=np.float32)
+    shade = np.zeros(resolution * resolution, dtype=np.float32)
+    if len(mesh.faces) == 0:
+        return depth.reshape(resolution, resolution), shade.reshape(resolution, resolution)
+
+    projected = mesh.vertices.astype(np.float64) @ rotation.T
+    lo = projected[:, :2].min(axis=0)
+    extent = float((projected[:, :2].max(axis=0) - lo).max()) or 1.0
+    margin = 2
+    scale = (resolution - 1 - 2 * margin) / extent
+    screen = np.empty_like(projected)
+    screen[:, :2] = (projected[:, :2] - lo) * scale + margin
+    screen[:, 1] = resolution - 1 - screen[:, 1]  # image rows grow downward
+    screen[:, 2] = projected[:, 2]
+
+    tri = screen[mesh.faces]  # (F, 3, 3)
+    normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    face_shade = np.abs(normals[:, 2]) / (np.linalg.norm(normals, axis=1) + 1e-12)
+
+    x0 = np.floor(tri[:, :, 0].min(axis=1)).astype(np.int64)
+    y0 = np.floor(tri[:, :, 1].min(axis=1)).astype(np.int64)
+    span = np.maximum(
+        np.ceil(tri[:, :, 0].max(axis=1)).astype(np.int64) - x0,
+        np.ceil(tri[:, :, 1].max(axis=1)).astype(np.int64) - y0,
+    ) + 1
+    # Power-of-two bucket per triangle so each bucket shares one candidate grid
+    bucket = np.ceil(np.log2(np.maximum(span, 1))).astype(np.int64)
+
+    for b in np.unique(bucket):
+        size = 1 << int(b)
+        ids = np.nonzero(bucket == b)[0]
+        offsets = np.arange(size)
+        per_step = max(1, _FRAGMENT_BUDGET // (size * size))
+        for start in range(0, len(ids), per_step):
+            sel = ids[start:start + per_step]
+            t = tri[sel]
+            # Candidate pixel centers (n, size, size)
+            px = x0[sel, None, None] + offsets[None, None, :] + 0.5
+            py = y0[sel, None, None] + offsets[None, :, None] + 0.5
+
+            ax, ay = t[:, 0, 0, None, None], t[:, 0, 1, None, None]
+            bx, by = t[:, 1, 0, None, None], t[:, 1, 1, None, None]
+            cx, cy = t[:, 2, 0, None, None], t[:, 2, 1, None, None]
+            area = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+            w0 = (bx - px) * (cy - py) - (by - py) * (cx - px)
+            w1 = (cx - px) * (ay - py) - (cy - py) * (ax - px)
+            w2 = area - w0 - w1
+            with np.errstate(divide='ignore', invalid='ignore'):
+                l0, l1, l2 = w0 / area, w1 / area, w2 / area
+                z = l0 * t[:, 0, 2, None, None] + l1 * t[:, 1, 2, None, None] + l2 * t[:, 2, 2, None, None]
+            inside = (l0 >= -1e-9) & (l1 >= -1e-9) & (l2 >= -1e-9) & (np.abs(area) > 1e-12)
+            inside &= (px >= 0) & (px < resolution) & (py >= 0) & (py < resolution)
+            if not inside.any():
+                continue
+
+            pixel = (py.astype(np.int64) * resolution + px.astype(np.int64))[inside]
+            frag_depth = z[inside].astype(np.float32)
+            frag_shade = np.broadcast_to(face_shade[sel, None, None], inside.shape)[inside]
+
+            np.minimum.at(depth, pixel, frag_depth)
+            visible = frag_depth <= depth[pixel]
+            shade[pixel[visible]] = frag_shade[visible]
+
+    return depth.reshape(resolution, resolution), shade.reshape(resolution, resolution)
+
+
+def silhouette_descriptor(mask: np.ndarray, size: int = DESCRIPTOR_SIZE, pixel_aspect: float = 1.0) -> np.ndarray:
+    """
+    Scale- and position-normalized shape descriptor
+
+    The mask is cropped to its bounding box, centered in a square and area-averaged
+    down to (size, size) coverage values in 0-1.
+
+    Args:
+        mask: (H, W) bool mask
+        size: Descriptor side
+        pixel_aspect: Width/height of one mask pixel in the original image (photos are
+            analyzed after a non-uniform resize to 512x512; this undoes the squash)
+    """
+    rows = np.nonzero(mask.any(axis=1))[0]
+    cols = np.nonzero(mask.any(axis=0))[0]
+    if len(rows) == 0:
+        return np.zeros((size, size), dtype=np.float32)
+    crop = mask[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    h, w = crop.shape
+    if abs(pixel_aspect - 1.0) > 1e-3:
+        # Nearest-neighbour resample so the crop has the original proportions
+        if pixel_aspect > 1.0:
+            new_w = max(1, int(round(w * pixel_aspect)))
+            crop = crop[:, np.arange(new_w) * w // new_w]
+        else:
+            new_h = max(1, int(round(h / pixel_aspect)))
+            crop = crop[np.arange(new_h) * h // new_h]
+        h, w = crop.shape
+    side = max(h, w)
+    square = np.zeros((side, side), dtype=np.float32)
+    top, left = (side - h) // 2, (side - w) // 2
+    square[top:top + h, left:left + w] = crop
+
+    bins = np.arange(side) * size // side
+    cell = (bins[:, None] * size + bins[None, :]).ravel()
+    total = np.bincount(cell, weights=square.ravel(), minlength=size * size)
+    count = np.bincount(cell, minlength=size * size)
+    return (total / np.maximum(count, 1)).reshape(size, size).astype(np.float32)
+
+
+def build_atlas(mesh: IndexedMesh, resolution: int = ATLAS_RESOLUTION) -> SilhouetteAtlas:
+    """Render all canonical views of a design"""
+    names = list(CANONICAL_VIEWS)
+    silhouettes, shading, descriptors = [], [], []
+    for name in names:
+        depth, shade = render_view(mesh, CANONICAL_VIEWS[name], resolution)
+        mask = np.isfinite(depth)
+        silhouettes.append(mask)
+        shading.append(np.where(mask, 1 + shade * 254, 0).astype(np.uint8))
+        descriptors.append(silhouette_descriptor(mask))
+    return SilhouetteAtlas(
+        view_names=names,
+        silhouettes=np.stack(silhouettes),
+        shading=np.stack(shading),
+        descriptors=np.stack(descriptors),
+    )
+
+
+def _dihedral_variants(descriptor: np.ndarray) -> np.ndarray:
+    """The 8 rotations/flips of a square descriptor, stacked (8, D, D)"""
+    variants = []
+    for flipped in (descriptor, descriptor[:, ::-1]):
+        for k in range(4):
+            variants.append(np.rot90(flipped, k))
+    return np.stack(variants)
+
+
+def match_silhouette(descriptor: np.ndarray, references: np.ndarray) -> Optional[float]:
+    """
+    Best soft-IoU between an evidence descriptor and reference descriptors
+
+    Args:
+        descriptor: (D, D) evidence descriptor
+        references: (R, D, D) atlas/design descriptors
+
+    Returns:
+        0-1 similarity, or None if either side has no foreground
+    """
+    if len(references) == 0 or descriptor.sum() == 0:
+        return None
+    variants = _dihedral_variants(descriptor)[:, None]  # (8, 1, D, D)
+    refs = references[None]  # (1, R, D, D)
+    intersection = np.minimum(variants, refs).sum(axis=(2, 3))
+    union = np.maximum(variants, refs).sum(axis=(2, 3))
+    iou = intersection / np.maximum(union, 1e-8)
+    return float(iou.max())
@@ -0,0 +1,228 @@
+"""
+F3 Streaming STL Reader
+Computes STL geometric features in bounded memory, regardless of mesh size.
+
+- Binary STL: the facet table is memory-mapped (paths) or viewed in place (buffers)
+  and processed in fixed-size chunks; only one chunk is ever converted to float64
+- ASCII STL: parsed line by line, flushing a chunk every chunk_facets triangles
+
+Signed volume, surface area, bounding box and normal statistics are accumulated
+incrementally, so peak memory is O(chunk_facets) instead of O(mesh).
+"""
+
+import os
+import struct
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+try:
+    from .f3_io import EvidenceSource, is_path, open_source
+except ImportError:
+    from f3_io import EvidenceSource, is_path, open_source
+
+# Binary STL facet record: normal, 3 vertices, attribute byte count (50 bytes)
+FACET_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+HEADER_BYTES = 84
+DEFAULT_CHUNK_FACETS = 65536  # ~3 MB of facet records per chunk
+
+
+class StlAccumulator:
+    """Incremental geometric statistics over facet chunks"""
+
+    def __init__(self):
+        self.num_facets = 0
+        self.signed_volume = 0.0
+        self.surface_area = 0.0
+        self.min_bounds = np.full(3, np.inf)
+        self.max_bounds = np.full(3, -np.inf)
+        self.degenerate_facets = 0
+        self.flipped_normals = 0
+        self.weighted_normal_sum = np.zeros(3)  # area-weighted unit normals
+        self.reference_normal: Optional[np.ndarray] = None
+        self.normal_alignment_sum = 0.0  # sum of |n . n_ref| over non-degenerate facets
+
+    def update(self, vectors: np.ndarray, stored_normals: Optional[np.ndarray] = None):
+        """
+        Add a chunk of facets
+
+        Args:
+            vectors: (k, 3, 3) triangle vertices
+            stored_normals: Optional (k, 3) normals from the file (used for flip detection)
+        """
+        if len(vectors) == 0:
+            return
+        v = vectors.astype(np.float64, copy=False)
+        v0, v1, v2 = v[:, 0], v[:, 1], v[:, 2]
+
+        # Signed volume (divergence theorem: sum of signed tetrahedra to the origin)
+        self.signed_volume += float(np.einsum('ij,ij->', v0, np.cross(v1, v2))) / 6.0
+
+        # Areas and unit normals from geometry
+        cross = np.cross(v1 - v0, v2 - v0)
+        double_area = np.linalg.norm(cross, axis=1)
+        self.surface_area += float(double_area.sum()) / 2.0
+        valid = double_area > 1e-12
+        self.degenerate_facets += int(np.count_nonzero(~valid))
+        unit = cross[valid] / double_area[valid, None]
+
+        # Bounding box
+        flat = v.reshape(-1, 3)
+        self.min_bounds = np.minimum(self.min_bounds, flat.min(axis=0))
+        self.max_bounds = np.maximum(self.max_bounds, flat.max(axis=0))
+
+        # Normal statistics
+        if len(unit):
+            if self.reference_normal is None:
+                self.reference_normal = unit[0]
+            self.normal_alignment_sum += float(np.abs(unit @ self.reference_normal).sum())
+            self.weighted_normal_sum += (unit * (double_area[valid, None] / 2.0)).sum(axis=0)
+        if stored_normals is not None:
+            stored = stored_normals[valid].astype(np.float64, copy=False)
+            has_normal = np.any(stored != 0, axis=1)
+            self.flipped_normals += int(np.count_nonzero(
+                np.einsum('ij,ij->i', stored[has_normal], unit[has_normal]) < 0
+            ))
+
+        self.num_facets += len(v)
+
+    def result(self) -> Dict:
+        """Feature dict (same keys as the F3 STL analysis, plus normal statistics)"""
+        if self.num_facets == 0:
+            raise ValueError("STL contains no facets")
+        extent = self.max_bounds - self.min_bounds
+        valid_facets = self.num_facets - self.degenerate_facets
+        normal_consistency = self.normal_alignment_sum / valid_facets if valid_facets else 0.5
+        return {
+            'volume': abs(self.signed_volume),
+            'surface_area': self.surface_area,
+            'bounding_box': {'x': float(extent[0]), 'y': float(extent[1]), 'z': float(extent[2])},
+            'bounds_min': self.min_bounds.tolist(),
+            'bounds_max': self.max_bounds.tolist(),
+            'mesh_quality': float(min(1.0, normal_consistency)),
+            'num_facets': self.num_facets,
+            'degenerate_facets': self.degenerate_facets,
+            'flipped_normals': self.flipped_normals,
+            # Near zero for closed meshes; large values indicate open or inconsistently wound surfaces
+            'normal_imbalance': float(np.linalg.norm(self.weighted_normal_sum) / (self.surface_area + 1e-12)),
+        }
+
+
+def _binary_facet_count(header: bytes, total_size: Optional[int]) -> Optional[int]:
+    """
+    Facet count if the data is binary STL, else None
+
+    The size must match the declared count exactly, or exceed it (trailing padding some
+    exporters append) when the header does not start like ASCII STL ('solid').
+    Readers take only the declared facets.
+    """
+    if len(header) < HEADER_BYTES:
+        return None
+    count = struct.unpack('<I', header[80:84])[0]
+    if total_size is None:
+        return count
+    expected = HEADER_BYTES + count * FACET_DTYPE.itemsize
+    if total_size == expected:
+        return count
+    if total_size > expected and not header.lstrip().startswith(b'solid'):
+        return count
+    return None
+
+
+def _iter_ascii_chunks(fh, chunk_facets: int) -> Iterator[np.ndarray]:
+    """Stream 'vertex x y z' lines from an ASCII STL into (k, 3, 3) chunks"""
+    coords = []
+    for line in fh:
+        line = line.strip()
+        if line.startswith(b'vertex'):
+            coords.append(line.split()[1:4])
+            if len(coords) == chunk_facets * 3:
+                yield np.array(coords, dtype=np.float64).reshape(-1, 3, 3)
+                coords = []
+    usable = len(coords) - len(coords) % 3
+    if usable:
+        yield np.array(coords[:usable], dtype=np.float64).reshape(-1, 3, 3)
+
+
+def iter_facet_chunks(
+    stl_source: EvidenceSource,
+    chunk_facets: int = DEFAULT_CHUNK_FACETS,
+) -> Iterator[np.ndarray]:
+    """
+    Yield facet records in chunks
+
+    Binary files yield structured FACET_DTYPE arrays; ASCII files yield (k, 3, 3)
+    float64 vertex arrays.
+    """
+    if isinstance(stl_source, (bytes, bytearray, memoryview)):
+        buffer = memoryview(stl_source).cast('B')
+        count = _binary_facet_count(bytes(buffer[:HEADER_BYTES]), len(buffer))
+        if count is not None:
+            # View the facet table in place (no copy)
+            facets = np.frombuffer(buffer, dtype=FACET_DTYPE, count=count, offset=HEADER_BYTES)
+            for start in range(0, count, chunk_facets):
+                yield facets[start:start + chunk_facets]
+            return
+        yield from _iter_ascii_chunks(open_source(stl_source), chunk_facets)
+        return
+
+    if is_path(stl_source):
+        total_size = os.path.getsize(stl_source)
+        with open(stl_source, 'rb') as fh:
+            header = fh.read(HEADER_BYTES)
+        count = _binary_facet_count(header, total_size)
+        if count is not None:
+            if count == 0:
+                return
+            # Memory-map one chunk-sized window of the facet table at a time; each window
+            # is unmapped before the next, so resident pages stay bounded too
+            for start in range(0, count, chunk_facets):
+                n = min(chunk_facets, count - start)
+                window = np.memmap(
+                    stl_source, dtype=FACET_DTYPE, mode='r',
+                    offset=HEADER_BYTES + start * FACET_DTYPE.itemsize, shape=(n,),
+                )
+                yield window
+                del window  # last reference: unmaps the window
+            return
+        with open(stl_source, 'rb') as fh:
+            yield from _iter_ascii_chunks(fh, chunk_facets)
+        return
+
+    # Generic stream: size from seek, then chunked reads
+    fh = open_source(stl_source)
+    fh.seek(0, os.SEEK_END)
+    total_size = fh.tell()
+    fh.seek(0)
+    header = fh.read(HEADER_BYTES)
+    count = _binary_facet_count(header, total_size)
+    if count is not None:
+        remaining = count
+        while remaining > 0:
+            n = min(chunk_facets, remaining)
+            yield np.frombuffer(fh.read(n * FACET_DTYPE.itemsize), dtype=FACET_DTYPE, count=n)
+            remaining -= n
+        return
+    fh.seek(0)
+    yield from _iter_ascii_chunks(fh, chunk_facets)
+
+
+def stream_stl_features(stl_source: EvidenceSource, chunk_facets: int = DEFAULT_CHUNK_FACETS) -> Dict:
+    """
+    Compute STL geometric features in bounded memory
+
+    Returns:
+        Dict with volume, surface_area, bounding_box, mesh_quality, num_facets and
+        normal statistics (degenerate_facets, flipped_normals, normal_imbalance)
+    """
+    acc = StlAccumulator()
+    for chunk in iter_facet_chunks(stl_source, chunk_facets):
+        if chunk.dtype == FACET_DTYPE:
+            acc.update(chunk['vertices'], chunk['normal'])
+        else:
+            acc.update(chunk)
+    return acc.result()
@@ -0,0 +1,212 @@
+"""
+F3 Video Frame Sampling
+Turns evidence videos (e.g. turntable clips) into a handful of still frames for the
+image pipeline, decoding incrementally so a clip is never held in memory.
+
+Decoders, tried in order:
+- PIL: animated GIF / PNG (APNG) / WebP, frame by frame via ImageSequence
+- OpenCV (optional, cv2): any container/codec its FFmpeg build supports
+- imageio (optional): streaming reader (imiter)
+OpenCV and imageio need a real file, so in-memory videos are spilled to a ScratchArea.
+
+Only the kept frames are stored (downscaled, JPEG-encoded):
+- 'uniform': evenly spaced frames. Works without knowing the frame count: frames on a
+  stride are kept, and when 2 * max_frames are held every other one is dropped and the
+  stride doubles.
+- 'scene': the frames that differ most from the previous admitted frame (view changes),
+  held in a max_frames min-heap.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+from io import BytesIO
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .f3_io import EvidenceSource, ScratchArea, is_path, open_source
+except ImportError:
+    from f3_io import EvidenceSource, ScratchArea, is_path, open_source
+
+try:
+    from PIL import Image, ImageSequence
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+try:
+    import imageio.v3 as iio
+    IMAGEIO_AVAILABLE = True
+except ImportError:
+    IMAGEIO_AVAILABLE = False
+
+DEFAULT_VIDEO_FRAMES = int(os.getenv('MAMA_F3_VIDEO_FRAMES', '8'))  # frames kept per video
+DEFAULT_SAMPLING = os.getenv('MAMA_F3_VIDEO_SAMPLING', 'uniform')  # 'uniform' or 'scene'
+MAX_DECODED_FRAMES = int(os.getenv('MAMA_F3_VIDEO_MAX_DECODED', '18000'))  # ~10 min at 30 fps
+FRAME_MAX_SIDE = 1024  # kept frames are downscaled to fit (analysis runs at 512x512)
+FRAME_JPEG_QUALITY = 90
+_SIGNATURE_SIZE = 32  # grayscale thumbnail side used to compare frames in 'scene' mode
+
+
+def _pil_frames(source: EvidenceSource) -> Iterator[Image.Image]:
+    """Frames of an image file (animated or not) decoded one at a time"""
+    fp = source if is_path(source) else open_source(source)
+    with Image.open(fp) as img:
+        for frame in ImageSequence.Iterator(img):
+            yield frame.convert('RGB')  # copy: the sequence reuses one frame buffer
+
+
+def _cv2_frames(path: str) -> Iterator[Image.Image]:
+    """Frames decoded by OpenCV"""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("OpenCV could not open the video")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield Image.fromarray(frame[:, :, ::-1])  # BGR -> RGB
+    finally:
+        capture.release()
+
+
+def _imageio_frames(path: str) -> Iterator[Image.Image]:
+    """Frames decoded by imageio's streaming reader"""
+    for frame in iio.imiter(path):
+        if frame.ndim == 2:
+            frame = np.stack([frame] * 3, axis=-1)
+        yield Image.fromarray(np.ascontiguousarray(frame[:, :, :3]))
+
+
+def _is_pil_readable(source: EvidenceSource) -> bool:
+    """True if PIL recognizes the container (header only, no decoding)"""
+    try:
+        fp = source if is_path(source) else open_source(source)
+        with Image.open(fp):
+            return True
+    except Exception:
+        return False
+
+
+def iter_video_frames(source: EvidenceSource, scratch: ScratchArea, suffix: str = '.mp4') -> Iterator[Image.Image]:
+    """
+    Decode a video incrementally with the first decoder that can read it
+
+    Args:
+        source: Video path or in-memory buffer
+        scratch: Where in-memory videos are spilled for file-based decoders
+        suffix: File extension used for the spilled copy (format hint)
+
+    Raises:
+        ValueError: if no available decoder can read the video
+    """
+    if PIL_AVAILABLE and _is_pil_readable(source):
+        return _pil_frames(source)
+    if not (CV2_AVAILABLE or IMAGEIO_AVAILABLE):
+        raise ValueError("No video decoder available (install opencv-python or imageio)")
+    path = os.fspath(source) if is_path(source) else scratch.write(source, suffix=suffix)
+    if CV2_AVAILABLE:
+        capture = cv2.VideoCapture(path)
+        readable = capture.isOpened()
+        capture.release()
+        if readable:
+            return _cv2_frames(path)
+    if IMAGEIO_AVAILABLE:
+        return _imageio_frames(path)
+    raise ValueError("Video format not supported by the available decoders")
+
+
+def _encode_frame(frame: Image.Image) -> bytes:
+    """Downscaled JPEG bytes of a frame (what the image pipeline receives)"""
+    frame = frame.copy()
+    frame.thumbnail((FRAME_MAX_SIDE, FRAME_MAX_SIDE), Image.Resampling.BILINEAR)
+    buffer = BytesIO()
+    frame.save(buffer, format='JPEG', quality=FRAME_JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+def _sample_uniform(frames: Iterator[Image.Image], max_frames: int) -> List[bytes]:
+    """Evenly spaced frames with at most 2 * max_frames held at a time"""
+    stride = 1
+    kept: List[Tuple[int, bytes]] = []
+    for index, frame in enumerate(frames):
+        if index % stride:
+            continue
+        kept.append((index, _encode_frame(frame)))
+        if len(kept) >= 2 * max_frames:
+            kept = kept[::2]  # indices stay multiples of the doubled stride
+            stride *= 2
+    if len(kept) <= max_frames:
+        return [data for _, data in kept]
+    positions = np.unique(np.round(np.linspace(0, len(kept) - 1, max_frames)).astype(int))
+    return [kept[p][1] for p in positions]
+
+
+def _sample_scene_changes(frames: Iterator[Image.Image], max_frames: int) -> List[bytes]:
+    """The max_frames frames that differ most from the previously admitted frame"""
+    heap: List[Tuple[float, int, bytes]] = []  # (change score, index, frame), smallest score on top
+    reference: Optional[np.ndarray] = None
+    for index, frame in enumerate(frames):
+        signature = np.asarray(
+            frame.convert('L').resize((_SIGNATURE_SIZE, _SIGNATURE_SIZE), Image.Resampling.BOX),
+            dtype=np.float32,
+        )
+        change = np.inf if reference is None else float(np.mean(np.abs(signature - reference)))
+        if len(heap) < max_frames:
+            heapq.heappush(heap, (change, index, _encode_frame(frame)))
+        elif change > heap[0][0]:
+            heapq.heapreplace(heap, (change, index, _encode_frame(frame)))
+        else:
+            continue
+        reference = signature
+    return [data for _, _, data in sorted(heap, key=lambda item: item[1])]
+
+
+def sample_video_frames(
+    source: EvidenceSource,
+    max_frames: int = DEFAULT_VIDEO_FRAMES,
+    mode: str = DEFAULT_SAMPLING,
+    scratch: Optional[ScratchArea] = None,
+) -> List[bytes]:
+    """
+    Sample still frames from an evidence video
+
+    Args:
+        source: Video path or in-memory buffer
+        max_frames: Max frames returned
+        mode: 'uniform' (evenly spaced) or 'scene' (largest view changes)
+        scratch: Scratch area for spilling in-memory videos (a temporary one by default)
+
+    Returns:
+        JPEG-encoded frames in playback order (usable as evidence image sources)
+
+    Raises:
+        ValueError: for an unknown mode or a video no available decoder can read
+    """
+    if mode not in ('uniform', 'scene'):
+        raise ValueError(f"Unknown video sampling mode: {mode}")
+    if not PIL_AVAILABLE:
+        raise ValueError("PIL/Pillow is required for video frame sampling")
+
+    own_scratch = scratch is None
+    scratch = scratch or ScratchArea()
+    try:
+        suffix = os.path.splitext(os.fspath(source))[1] if is_path(source) else '.mp4'
+        frames = itertools.islice(iter_video_frames(source, scratch, suffix), MAX_DECODED_FRAMES)
+        if mode == 'scene':
+            return _sample_scene_changes(frames, max_frames)
+        return _sample_uniform(frames, max_frames)
+    finally:
+        if own_scratch:
+            scratch.close()
@@ -3,44 +3,105 @@ F3: Vision Quality Check Model
 Uses computer vision to verify produced parts match the original design.
 Compares photos/videos of manufactured parts against the original STL/design files.
 
-IMPLEMENTATION: Real image processing using PIL + numpy-stl (no PyTorch/CLIP dependency)
+IMPLEMENTATION: Real image processing using PIL + a streaming NumPy STL reader (no PyTorch/CLIP dependency)
 """
 
 import numpy as np
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
-from pathlib import Path
+from typing import Collection, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field, replace
 import os
+import threading
+
+try:
+    from .f3_io import EvidenceSource, describe_source, is_path, open_source, source_available, to_transferable
+    from .f3_feature_cache import FeatureCache, content_key, get_default_cache
+    from .f3_parallel import BoundedExecutor, get_image_pool
+    from .f3_batch_features import TILE_GRID, extract_batch_features
+    from .f3_phash import THUMBNAIL_SIZE, group_near_duplicates, perceptual_hash
+    from .f3_segmentation import SEGMENT_MAX_SIDE, crop_box
+    from .f3_reference_index import ReferenceIndex, feature_vector, get_default_reference_index
+    from .f3_qc_session import EvidenceState, QCSession, SessionStore, get_default_session_store
+    from .f3_video import sample_video_frames
+    from .f3_stl_reader import stream_stl_features
+    from .f3_mesh_topology import IndexedMesh, load_indexed_mesh, topology_metrics, topology_quality
+    from .f3_mesh_slicer import get_slicer
+    from .f3_silhouette import DESCRIPTOR_SIZE, SilhouetteAtlas, build_atlas, match_silhouette
+except ImportError:
+    from f3_io import EvidenceSource, describe_source, is_path, open_source, source_available, to_transferable
+    from f3_feature_cache import FeatureCache, content_key, get_default_cache
+    from f3_parallel import BoundedExecutor, get_image_pool
+    from f3_batch_features import TILE_GRID, extract_batch_features
+    from f3_phash import THUMBNAIL_SIZE, group_near_duplicates, perceptual_hash
+    from f3_segmentation import SEGMENT_MAX_SIDE, crop_box
+    from f3_reference_index import ReferenceIndex, feature_vector, get_default_reference_index
+    from f3_qc_session import EvidenceState, QCSession, SessionStore, get_default_session_store
+    from f3_video import sample_video_frames
+    from f3_stl_reader import stream_stl_features
+    from f3_mesh_topology import IndexedMesh, load_indexed_mesh, topology_metrics, topology_quality
+    from f3_mesh_slicer import get_slicer
+    from f3_silhouette import DESCRIPTOR_SIZE, SilhouetteAtlas, build_atlas, match_silhouette
 
 # Image processing
 try:
-    from PIL import Image, ImageStat, ImageFilter
+    from PIL import Image
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
     print("Warning: PIL/Pillow not available. Image processing will be limited.")
 
-# STL processing
-try:
-    from stl import mesh
-    STL_AVAILABLE = True
-except ImportError:
-    STL_AVAILABLE = False
-    print("Warning: numpy-stl not available. STL analysis will be limited.")
+# Bump when the STL feature extraction changes so cached entries are recomputed
+STL_FEATURES_VERSION = 'stl-v3'
+MESH_VERSION = 'mesh-v1'
+ATLAS_VERSION = 'atlas-v1'
+MAX_TOPOLOGY_FACETS = int(os.getenv('MAMA_F3_MAX_TOPOLOGY_FACETS', '500000'))  # the welded mesh and edge table stay in memory
+IMAGE_FEATURES_VERSION = 'image-v6'
+
+# Image decoding
+ANALYSIS_SIZE = (512, 512)
+FEATURE_BATCH_SIZE = 16  # images per batched feature pass (bounds the stacked tensor to ~12 MB)
+MAX_IMAGE_PIXELS = int(os.getenv('MAMA_F3_MAX_IMAGE_PIXELS', str(100_000_000)))  # guard against decompression bombs
+
+# Coarse-to-fine: score thumbnails first, run the full-size pass only for borderline parts
+COARSE_SIZE = (128, 128)
+COARSE_MARGIN = float(os.getenv('MAMA_F3_COARSE_MARGIN', '0.05'))  # min distance from a tier threshold to exit early
+
+# Localized defects: tiles whose local variance or edge density is this many robust standard
+# deviations above the part's other tiles
+DEFECT_Z_THRESHOLD = float(os.getenv('MAMA_F3_DEFECT_Z', '6.0'))
+DEFECT_MAX_REGIONS = 5
+_MIN_INTERIOR_TILES = 8  # fewer tiles fully on the part: too small in frame to localize
+_TILE_FOREGROUND = 0.95  # tiles at least this much part (outline tiles always look edgy)
+_TILE_VARIANCE_FLOOR = 4.0  # grayscale variance of sensor noise on a smooth face
+_TILE_EDGE_FLOOR = 0.005  # fraction of edge pixels on a smooth face
+
+# Design silhouette match (best canonical view). Off-canonical photos of a good part score low
+# (renders of the design from random views: 10th percentile 0.27, median 0.39, and unrelated
+# shapes score about as high), so the match only penalizes evidence below this floor
+DESIGN_MATCH_FLOOR = float(os.getenv('MAMA_F3_DESIGN_MATCH_FLOOR', '0.25'))
+
+# Relative deviation of a critical dimension from its expected value that still scores 1.0
+DIMENSION_TOLERANCE = {'low': 0.02, 'medium': 0.01, 'high': 0.005}
+
+# Tier thresholds on qc_score
+STATUS_THRESHOLDS = {
+    'low': {'pass': 0.65, 'fail': 0.40},
+    'medium': {'pass': 0.75, 'fail': 0.50},
+    'high': {'pass': 0.85, 'fail': 0.60},
+}
 
 
 @dataclass
 class QualityCheckInput:
     """Input for quality check"""
     # Required fields (no defaults - must come first)
-    evidence_image_paths: List[str]  # Photos of the manufactured part
+    evidence_image_paths: List[EvidenceSource]  # Photos of the manufactured part (paths or in-memory buffers)
     job_id: str
     tolerance_tier: str  # 'low', 'medium', 'high' - affects pass threshold
     
     # Optional fields (with defaults - must come after required fields)
-    stl_file_path: Optional[str] = None  # Path to original STL file
-    design_image_paths: Optional[List[str]] = None  # Reference images of the design
-    evidence_video_paths: Optional[List[str]] = None  # Optional videos
+    stl_file_path: Optional[EvidenceSource] = None  # Original STL file (path or in-memory buffer)
+    design_image_paths: Optional[List[EvidenceSource]] = None  # Reference images of the design (optional; STL views are rendered automatically)
+    evidence_video_paths: Optional[List[EvidenceSource]] = None  # Optional videos (sampled into frames, see f3_video)
     critical_dimensions: Optional[Dict[str, float]] = None  # {dimension_name: expected_value}
 
 
@@ -56,6 +117,157 @@ class QualityCheckOutput:
     notes: List[str]  # Issues found or quality observations
     confidence: float  # 0-1, model confidence in assessment
     model_version: str = "v1.0"
+    coarse_pass: bool = False  # True if decided from thumbnails alone (clear pass/fail)
+    defect_regions: List[Dict] = field(default_factory=list)  # worst tiles: image index + relative x, y, width, height
+
+
+# Escalation metrics for the coarse-to-fine pipeline (per process)
+_coarse_stats = {'checks': 0, 'escalations': 0}
+_coarse_stats_lock = threading.Lock()
+
+
+def _record_coarse_outcome(escalated: bool):
+    with _coarse_stats_lock:
+        _coarse_stats['checks'] += 1
+        if escalated:
+            _coarse_stats['escalations'] += 1
+
+
+def coarse_pass_metrics() -> Dict[str, float]:
+    """
+    Coarse-to-fine counters for this process
+    
+    Returns:
+        Dict with checks, escalations (full-resolution passes) and escalation_rate
+    """
+    with _coarse_stats_lock:
+        checks, escalations = _coarse_stats['checks'], _coarse_stats['escalations']
+    return {
+        'checks': checks,
+        'escalations': escalations,
+        'early_exits': checks - escalations,
+        'escalation_rate': escalations / checks if checks else 0.0,
+    }
+
+
+def _segmentation_thumbnail(img: 'Image.Image') -> np.ndarray:
+    """(h, w, 3) uint8 copy of an image with longest side SEGMENT_MAX_SIDE"""
+    scale = SEGMENT_MAX_SIDE / max(img.size)
+    thumbnail_size = (max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale)))
+    return np.asarray(img.convert('RGB').resize(thumbnail_size, Image.Resampling.BOX))
+
+
+def _part_box_from_draft(image_source: EvidenceSource, full_size: Tuple[int, int]) -> Optional[Tuple[int, int, int, int]]:
+    """crop_box of a JPEG, segmented on a separate decode at the smallest draft scale"""
+    fp = image_source if is_path(image_source) else open_source(image_source)
+    with Image.open(fp) as img:
+        img.draft('RGB', (SEGMENT_MAX_SIDE, SEGMENT_MAX_SIDE))
+        return crop_box(_segmentation_thumbnail(img), full_size)
+
+
+def decode_image(
+    image_source: EvidenceSource,
+    size: Tuple[int, int] = ANALYSIS_SIZE,
+    fast_decode: bool = True,
+    max_pixels: int = MAX_IMAGE_PIXELS,
+    crop_to_part: bool = True,
+) -> 'Image.Image':
+    """
+    Decode an image and resize it to the analysis size (RGB)
+    
+    With crop_to_part, the part is segmented on a small thumbnail (f3_segmentation) and
+    only its padded bounding box is resized to the analysis size; info['source_size']
+    is then the crop's size in original pixels.
+    
+    With fast_decode, JPEGs are decoded at reduced scale (1/2, 1/4, 1/8) via Image.draft
+    and other formats are box-reduced by an integer factor before the LANCZOS resize,
+    so a 48 MP phone photo never materializes at full resolution. The scale is chosen
+    for the crop, which is therefore always decoded at or above the analysis size
+    (JPEGs are segmented on a separate 1/8-scale decode first).
+    
+    Raises:
+        ValueError: if the image exceeds max_pixels (checked from the header, before decoding)
+    """
+    fp = image_source if is_path(image_source) else open_source(image_source)
+    with Image.open(fp) as img:
+        width, height = img.size
+        if width * height > max_pixels:
+            raise ValueError(f"Image is {width}x{height} ({width * height} px), above the {max_pixels} px limit")
+        
+        # JPEG: find the part before decoding, so the draft scale can follow the crop
+        jpeg_draft = fast_decode and img.format == 'JPEG'
+        box = _part_box_from_draft(image_source, (width, height)) if crop_to_part and jpeg_draft else None
+        
+        if jpeg_draft:
+            # Decoder-level downscaling to the smallest scale keeping the crop >= size
+            region = box or (0, 0, width, height)
+            img.draft('RGB', (
+                min(width, int(np.ceil(size[0] * width / (region[2] - region[0])))),
+                min(height, int(np.ceil(size[1] * height / (region[3] - region[1])))),
+            ))
+        
+        # Convert to RGB if needed
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        # Other formats are decoded in full anyway: segment the decoded image
+        if crop_to_part and not jpeg_draft:
+            box = crop_box(_segmentation_thumbnail(img), (width, height))
+        
+        # Keep only the part's region, so the background neither dominates the features
+        # nor costs resize/analysis work
+        source_size = (width, height)
+        region = (0, 0, img.size[0], img.size[1])
+        if box is not None:
+            source_size = (box[2] - box[0], box[3] - box[1])
+            scale_x, scale_y = img.size[0] / width, img.size[1] / height
+            region = (
+                int(np.floor(box[0] * scale_x)), int(np.floor(box[1] * scale_y)),
+                min(img.size[0], int(np.ceil(box[2] * scale_x))), min(img.size[1], int(np.ceil(box[3] * scale_y))),
+            )
+        
+        # Any format: cheap integer reduction of the region, keeping both sides >= size
+        factor = min((region[2] - region[0]) // size[0], (region[3] - region[1]) // size[1]) if fast_decode else 1
+        if factor >= 2:
+            img = img.reduce(factor, box=region)
+        elif box is not None:
+            img = img.crop(region)
+        
+        # Resize to standard size for consistent analysis
+        resized = img.resize(size, Image.Resampling.LANCZOS)
+        resized.info['source_size'] = source_size
+        return resized
+
+
+def decode_image_array(
+    image_source: EvidenceSource,
+    fast_decode: bool = True,
+    size: Tuple[int, int] = ANALYSIS_SIZE,
+) -> Tuple[np.ndarray, Tuple[int, int], int]:
+    """
+    Decode and resize one image to an (H, W, 3) uint8 array
+    
+    Module-level so it can run in pool worker processes. Raises on decode errors.
+    
+    Returns:
+        (array, (original_width, original_height), perceptual_hash)
+    """
+    img = decode_image(image_source, size=size, fast_decode=fast_decode)
+    # Perceptual hash from a tiny thumbnail of the already-decoded image (near-duplicate detection)
+    thumbnail = img.convert('L').resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.BOX)
+    return np.asarray(img), img.info['source_size'], perceptual_hash(np.asarray(thumbnail))
+
+
+def extract_image_features(image_source: EvidenceSource, fast_decode: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Decode one image and extract features (histogram, edges, texture, color stats)
+    
+    Raises on decode errors.
+    """
+    array, source_size, phash = decode_image_array(image_source, fast_decode)
+    features = extract_batch_features(array[None], [source_size])[0]
+    features['phash'] = phash
+    return features
 
 
 class VisionQualityCheckModel:
@@ -63,68 +275,79 @@ class VisionQualityCheckModel:
     F3: Vision Quality Check Model
     
     Real Implementation using:
-    - numpy-stl for STL geometric analysis
+    - Streaming NumPy STL reader for geometric analysis (f3_stl_reader)
     - PIL/Pillow for image processing
     - Basic computer vision techniques (histogram, edges, texture)
     
     Pipeline:
-    1. STL Analysis: Extract geometric features (volume, surface area, bounding box, mesh quality)
-    2. Image Analysis: Extract features from photos (histogram, edges, texture, color)
-    3. Feature Comparison: Compare STL-derived features to image-derived features
-    4. Anomaly Detection: Detect defects using edge detection and texture analysis
-    5. Quality Scoring: Combine all factors into final QC score
+    1. STL Analysis: Extract geometric features (volume, surface area, bounding box) and
+       topology-based mesh quality (watertightness, non-manifold edges, degenerate triangles)
+    2. Image Analysis: Extract features from photos and sampled video frames (histogram,
+       edges, texture, color), collapsing near-duplicate photos by perceptual hash
+    3. Dimension Check: Measure critical_dimensions on cross-sections of the STL (f3_mesh_slicer)
+    4. Feature Comparison: Compare evidence silhouettes to a cached atlas of rendered STL views
+       and evidence features to the kNN history of previously passed parts (f3_reference_index)
+    5. Anomaly Detection: Detect defects using edge detection and texture analysis
+    6. Quality Scoring: Combine all factors into final QC score
+    
+    Steps 2 and 4-6 run on thumbnails first; only borderline scores repeat them at full size.
+    Each check keeps a session per job_id (f3_qc_session), so add_evidence re-scores a
+    part by analyzing only the newly added photos.
     """
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        feature_cache: Optional[FeatureCache] = None,
+        image_pool: Optional[BoundedExecutor] = None,
+        fast_decode: bool = True,
+        coarse_to_fine: bool = True,
+        reference_index: Optional[ReferenceIndex] = None,
+        session_store: Optional[SessionStore] = None,
+    ):
         self.is_trained = False
+        # Content-addressed cache shared across requests (STL and per-image features)
+        self.feature_cache = feature_cache or get_default_cache()
+        # CPU-sized worker pool for multi-photo analysis (shared across requests)
+        self.image_pool = image_pool or get_image_pool()
+        # Decode photos at reduced resolution (see decode_image)
+        self.fast_decode = fast_decode
+        self._image_salt = f"{IMAGE_FEATURES_VERSION}-{'fast' if fast_decode else 'full'}"
+        # Decide clear passes/fails from COARSE_SIZE thumbnails before the full-size pass
+        self.coarse_to_fine = coarse_to_fine
+        # Feature history of previously passed parts, per design (kNN comparison)
+        self.reference_index = reference_index or get_default_reference_index()
+        # Per-job analysis state, so photos added after a 'review' are scored incrementally
+        self.sessions = session_store or get_default_session_store()
     
-    def _analyze_stl(self, stl_path: str) -> Dict[str, float]:
+    def _analyze_stl(self, stl_source: EvidenceSource) -> Dict[str, float]:
         """
-        Analyze STL file and extract geometric features
+        Analyze STL file (path or in-memory buffer) and extract geometric features
         
         Returns:
             Dictionary of geometric features
         """
-        if not STL_AVAILABLE:
-            return {
-                'volume': 0.0,
-                'surface_area': 0.0,
-                'bounding_box': {'x': 0.0, 'y': 0.0, 'z': 0.0},
-                'mesh_quality': 0.5,
-            }
-        
         try:
-            # Load STL mesh
-            stl_mesh = mesh.Mesh.from_file(stl_path)
-            
-            # Calculate volume (signed volume method)
-            volume, cog, inertia = stl_mesh.get_mass_properties()
+            # Repeat checks of the same design skip mesh parsing entirely
+            design_hash = content_key(stl_source)
+            cache_key = f"{design_hash}-{STL_FEATURES_VERSION}"
+            cached = self.feature_cache.get('stl', cache_key)
+            if cached is not None:
+                return cached
             
-            # Calculate surface area
-            surface_area = np.sum(np.linalg.norm(stl_mesh.normals, axis=1) * stl_mesh.areas) / 2.0
-            
-            # Bounding box
-            min_bounds = stl_mesh.min_
-            max_bounds = stl_mesh.max_
-            bounding_box = {
-                'x': float(max_bounds[0] - min_bounds[0]),
-                'y': float(max_bounds[1] - min_bounds[1]),
-                'z': float(max_bounds[2] - min_bounds[2]),
-            }
+            # Stream the facets (memory-mapped binary / line-by-line ASCII) so peak
+            # memory stays bounded regardless of mesh size
+            features = stream_stl_features(stl_source)
+            features['design_hash'] = design_hash
             
-            # Mesh quality (check for degenerate triangles, normals consistency)
-            # Simple heuristic: check if normals are consistent
-            normals = stl_mesh.normals
-            normal_consistency = np.mean(np.abs(np.sum(normals * normals[0], axis=1))) if len(normals) > 0 else 0.5
-            mesh_quality = float(min(1.0, normal_consistency))
-            
-            return {
-                'volume': float(abs(volume)),
-                'surface_area': float(surface_area),
-                'bounding_box': bounding_box,
-                'mesh_quality': mesh_quality,
-                'num_facets': len(stl_mesh.vectors),
-            }
+            # Topology of the welded mesh replaces the normal-consistency heuristic,
+            # for meshes small enough to index in memory
+            if features['num_facets'] <= MAX_TOPOLOGY_FACETS:
+                topology = topology_metrics(self._indexed_mesh(stl_source, design_hash))
+                features.update(topology)
+                features['mesh_quality'] = topology_quality(topology, features['num_facets'])
+            self.feature_cache.put('stl', cache_key, features)
+            return features
         except Exception as e:
             print(f"Error analyzing STL: {e}")
             return {
@@ -134,76 +357,209 @@ class VisionQualityCheckModel:
                 'mesh_quality': 0.5,
             }
     
-    def _analyze_image(self, image_path: str) -> Dict[str, np.ndarray]:
+    def _indexed_mesh(self, stl_source: EvidenceSource, design_hash: str) -> IndexedMesh:
+        """Welded mesh for a design, cached as .npz next to its features"""
+        cache_path = self.feature_cache.path_for('mesh', f"{design_hash}-{MESH_VERSION}", '.npz')
+        cached = cache_path is not None and os.path.exists(cache_path)
+        indexed = load_indexed_mesh(stl_source, cache_path)
+        if cache_path and not cached:
+            self.feature_cache.track(cache_path)
+        elif cached:
+            os.utime(cache_path)  # mark as recently used for LRU eviction
+        return indexed
+    
+    def _design_atlas(self, stl_source: EvidenceSource, design_hash: str) -> SilhouetteAtlas:
+        """Canonical-view silhouette atlas for a design, rendered once and cached as .npz"""
+        cache_path = self.feature_cache.path_for('atlas', f"{design_hash}-{ATLAS_VERSION}", '.npz')
+        if cache_path and os.path.exists(cache_path):
+            try:
+                atlas = SilhouetteAtlas.load(cache_path)
+                os.utime(cache_path)  # mark as recently used for LRU eviction
+                return atlas
+            except Exception as e:
+                print(f"Warning: Re-rendering atlas, cached copy unreadable: {e}")
+        
+        atlas = build_atlas(self._indexed_mesh(stl_source, design_hash))
+        if cache_path:
+            try:
+                atlas.save(cache_path)
+                self.feature_cache.track(cache_path)
+            except OSError as e:
+                print(f"Warning: Could not cache silhouette atlas: {e}")
+        return atlas
+    
+    def _design_references(self, input_data: 'QualityCheckInput', stl_features: Optional[Dict]) -> np.ndarray:
+        """
+        Silhouette descriptors the evidence is compared against
+        
+        Combines the STL's rendered atlas with any supplied design reference images.
+        
+        Returns:
+            (R, D, D) descriptors (R may be 0)
+        """
+        references = []
+        if stl_features and 'design_hash' in stl_features and stl_features['num_facets'] <= MAX_TOPOLOGY_FACETS:
+            try:
+                atlas = self._design_atlas(input_data.stl_file_path, stl_features['design_hash'])
+                references.extend(atlas.descriptors)
+            except Exception as e:
+                print(f"Warning: Could not render design atlas: {e}")
+        
+        design_sources = [src for src in (input_data.design_image_paths or []) if source_available(src)]
+        for feat in self._analyze_images(design_sources):
+            if 'silhouette' in feat:
+                references.append(feat['silhouette'])
+        
+        if not references:
+            return np.zeros((0, DESCRIPTOR_SIZE, DESCRIPTOR_SIZE), dtype=np.float32)
+        return np.stack(references)
+    
+    def _design_scores(self, image_features_list: List[Dict], references: np.ndarray) -> List[Optional[float]]:
+        """
+        Best-view silhouette match of each image against the design references
+        
+        Returns:
+            0-1 score per image (None where there is nothing to compare)
+        """
+        if len(references) == 0:
+            return [None] * len(image_features_list)
+        return [
+            match_silhouette(feat['silhouette'], references) if 'silhouette' in feat else None
+            for feat in image_features_list
+        ]
+    
+    def _compare_to_design(self, image_features_list: List[Dict], references: np.ndarray) -> Optional[float]:
+        """
+        Average best-view silhouette match of the evidence against the design references
+        
+        Returns:
+            0-1 score, or None when there is nothing to compare
+        """
+        scores = [score for score in self._design_scores(image_features_list, references) if score is not None]
+        return float(np.mean(scores)) if scores else None
+    
+    @staticmethod
+    def _apply_design_match(similarity: float, design_match: Optional[float]) -> float:
         """
-        Analyze image and extract features
+        Lower a similarity score for evidence that does not look like the design
+        
+        Matches at or above DESIGN_MATCH_FLOOR leave it unchanged; below, it falls
+        linearly to half at a match of 0.
+        
+        Args:
+            similarity: Similarity from the evidence itself (consistency between photos)
+            design_match: Mean best-view silhouette match, or None without design references
+        """
+        if design_match is None or DESIGN_MATCH_FLOOR <= 0:
+            return similarity
+        shortfall = max(0.0, DESIGN_MATCH_FLOOR - design_match) / DESIGN_MATCH_FLOOR
+        return similarity * (1.0 - 0.5 * shortfall)
+    
+    @staticmethod
+    def _fallback_image_features() -> Dict[str, np.ndarray]:
+        """Mock features used when an image cannot be decoded"""
+        return {
+            'histogram': np.random.rand(256),
+            'edge_density': 0.5,
+            'texture_variance': 0.5,
+            'color_mean': np.array([128, 128, 128]),
+            'color_std': np.array([50, 50, 50]),
+            'brightness': 0.5,
+            'contrast': 0.2,
+        }
+    
+    def _analyze_image(self, image_source: EvidenceSource) -> Dict[str, np.ndarray]:
+        """
+        Analyze image (path or in-memory buffer) and extract features
         
         Returns:
             Dictionary of image features (histogram, edges, texture, color stats)
         """
+        return self._analyze_images([image_source])[0]
+    
+    def _analyze_images(
+        self,
+        image_sources: List[EvidenceSource],
+        size: Tuple[int, int] = ANALYSIS_SIZE,
+        keep_distinct: Collection[int] = (),
+    ) -> List[Dict[str, np.ndarray]]:
+        """
+        Analyze several images, fanning cache misses out across the shared worker pool
+        
+        Args:
+            image_sources: Image paths or buffers
+            size: Analysis resolution (ANALYSIS_SIZE, or COARSE_SIZE for the coarse pass)
+            keep_distinct: Indices of images that never borrow a near-duplicate's features
+        
+        Returns:
+            Feature dicts in the same order as image_sources
+        """
         if not PIL_AVAILABLE:
             # Return mock features
-            return {
-                'histogram': np.random.rand(256),
-                'edge_density': 0.5,
-                'texture_variance': 0.5,
-                'color_mean': np.array([128, 128, 128]),
-                'color_std': np.array([50, 50, 50]),
-            }
+            return [self._fallback_image_features() for _ in image_sources]
         
-        try:
-            img = Image.open(image_path)
-            
-            # Convert to RGB if needed
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize to standard size for consistent analysis
-            img_resized = img.resize((512, 512), Image.Resampling.LANCZOS)
-            img_array = np.array(img_resized)
-            
-            # 1. Histogram (grayscale)
-            img_gray = img_resized.convert('L')
-            histogram = np.array(img_gray.histogram()) / (img_gray.size[0] * img_gray.size[1])  # Normalize
-            
-            # 2. Edge detection (Sobel-like using PIL filter)
-            edges = img_gray.filter(ImageFilter.FIND_EDGES)
-            edge_array = np.array(edges)
-            edge_density = float(np.mean(edge_array > 50) / 255.0)  # Percentage of edge pixels
-            
-            # 3. Texture variance (local variance in grayscale)
-            # Use a simple approach: variance of pixel values in small neighborhoods
-            texture_variance = float(np.var(img_array))
-            
-            # 4. Color statistics
-            color_mean = np.mean(img_array, axis=(0, 1))
-            color_std = np.std(img_array, axis=(0, 1))
-            
-            # 5. Brightness and contrast
-            stat = ImageStat.Stat(img_gray)
-            brightness = stat.mean[0] / 255.0
-            contrast = stat.stddev[0] / 255.0
-            
-            return {
-                'histogram': histogram,
-                'edge_density': edge_density,
-                'texture_variance': texture_variance,
-                'color_mean': color_mean,
-                'color_std': color_std,
-                'brightness': brightness,
-                'contrast': contrast,
-                'width': img_array.shape[1],
-                'height': img_array.shape[0],
-            }
-        except Exception as e:
-            print(f"Error analyzing image {image_path}: {e}")
-            return {
-                'histogram': np.random.rand(256),
-                'edge_density': 0.5,
-                'texture_variance': 0.5,
-                'color_mean': np.array([128, 128, 128]),
-                'color_std': np.array([50, 50, 50]),
+        results: List[Optional[Dict]] = [None] * len(image_sources)
+        salt = self._image_salt if size == ANALYSIS_SIZE else f"{self._image_salt}-{size[0]}x{size[1]}"
+        cache_keys: Dict[int, str] = {}
+        for i, image_source in enumerate(image_sources):
+            try:
+                # Re-submitted photos (e.g. after a 'review' result) reuse their cached features
+                cache_keys[i] = content_key(image_source, salt=salt)
+                results[i] = self.feature_cache.get('image', cache_keys[i])
+            except Exception as e:
+                print(f"Error analyzing image {describe_source(image_source)}: {e}")
+                results[i] = self._fallback_image_features()
+        
+        misses = [i for i, feat in enumerate(results) if feat is None]
+        
+        # Decode misses (in parallel across the pool when there are several)...
+        if len(misses) > 1 and self.image_pool is not None:
+            # Bounded submission: blocks while the pool's queue is full
+            futures = {
+                i: self.image_pool.submit(
+                    decode_image_array, to_transferable(image_sources[i]), self.fast_decode, size
+                )
+                for i in misses
             }
+        else:
+            futures = {}
+        
+        decoded: Dict[int, Tuple[np.ndarray, Tuple[int, int], int]] = {}
+        for i in misses:
+            try:
+                if i in futures:
+                    decoded[i] = futures[i].result()
+                else:
+                    decoded[i] = decode_image_array(image_sources[i], self.fast_decode, size)
+            except Exception as e:
+                print(f"Error analyzing image {describe_source(image_sources[i])}: {e}")
+                results[i] = self._fallback_image_features()
+        
+        # Near-duplicates (burst shots, re-uploads) borrow the features of the first similar
+        # photo instead of being extracted again
+        hashes = [
+            None if i in keep_distinct else decoded[i][2] if i in decoded else (results[i] or {}).get('phash')
+            for i in range(len(image_sources))
+        ]
+        groups = group_near_duplicates(hashes)
+        duplicates = [i for i in decoded if groups[i] != i]
+        for i in duplicates:
+            del decoded[i]
+        
+        # ...then extract features for the rest with batched array ops
+        pending = list(decoded)
+        for start in range(0, len(pending), FEATURE_BATCH_SIZE):
+            chunk = pending[start:start + FEATURE_BATCH_SIZE]
+            arrays, source_sizes, phashes = zip(*[decoded.pop(i) for i in chunk])
+            for i, features, phash in zip(chunk, extract_batch_features(np.stack(arrays), source_sizes), phashes):
+                features['phash'] = phash
+                features['content_key'] = cache_keys[i]  # identifies the photo in reference histories
+                self.feature_cache.put('image', cache_keys[i], features)
+                results[i] = features
+        for i in duplicates:
+            results[i] = results[groups[i]]
+        
+        return results
     
     def _compare_histograms(self, hist1: np.ndarray, hist2: np.ndarray) -> float:
         """Compare two histograms using correlation coefficient"""
@@ -218,52 +574,150 @@ class VisionQualityCheckModel:
         similarity = (correlation + 1.0) / 2.0
         return float(max(0.0, min(1.0, similarity)))
     
-    def _compute_image_similarity(self, image_features_list: List[Dict]) -> float:
+    def _similarity_matrix(self, image_features_list: List[Dict]) -> np.ndarray:
+        """
+        Pairwise similarity between all images, computed in one vectorized pass
+        
+        Per pair: 50% histogram correlation, 30% color-mean distance, 20% edge-density
+        difference (same weighting as a pairwise comparison with _compare_histograms).
+        
+        Returns:
+            Symmetric (n, n) matrix of 0-1 similarities
+        """
+        return self._similarity_block(image_features_list, image_features_list)
+    
+    @staticmethod
+    def _similarity_block(rows: List[Dict], cols: List[Dict]) -> np.ndarray:
+        """
+        Similarity of every image in rows to every image in cols (see _similarity_matrix)
+        
+        Returns:
+            (len(rows), len(cols)) matrix of 0-1 similarities
+        """
+        def normalized_histograms(features):
+            # Row-normalize and center, so correlation is one matrix product
+            hists = np.stack([np.asarray(f['histogram'], dtype=np.float64) for f in features])
+            hists = hists / (hists.sum(axis=1, keepdims=True) + 1e-8)
+            centered = hists - hists.mean(axis=1, keepdims=True)
+            return centered, np.linalg.norm(centered, axis=1)
+        
+        # Histogram correlation
+        rows_centered, rows_norm = normalized_histograms(rows)
+        cols_centered, cols_norm = normalized_histograms(cols)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = (rows_centered @ cols_centered.T) / np.outer(rows_norm, cols_norm)
+        hist_sim = np.clip((correlation + 1.0) / 2.0, 0.0, 1.0)
+        hist_sim[np.isnan(hist_sim)] = 1.0  # flat histograms: treat as matching
+        
+        # Color means (Euclidean distance in RGB space)
+        rows_color = np.stack([np.asarray(f['color_mean'], dtype=np.float64) for f in rows])
+        cols_color = np.stack([np.asarray(f['color_mean'], dtype=np.float64) for f in cols])
+        color_diff = np.linalg.norm(rows_color[:, None, :] - cols_color[None, :, :], axis=2)
+        color_sim = 1.0 / (1.0 + color_diff / 255.0)  # Normalize to 0-1
+        
+        # Edge density
+        rows_edge = np.array([f['edge_density'] for f in rows], dtype=np.float64)
+        cols_edge = np.array([f['edge_density'] for f in cols], dtype=np.float64)
+        edge_sim = 1.0 - np.abs(rows_edge[:, None] - cols_edge[None, :])
+        
+        return hist_sim * 0.5 + color_sim * 0.3 + edge_sim * 0.2
+    
+    def _compute_image_similarity(
+        self,
+        image_features_list: List[Dict],
+        similarity_matrix: Optional[np.ndarray] = None,
+    ) -> float:
         """
         Compute similarity between multiple images (consistency check)
         
+        Args:
+            image_features_list: Per-image features
+            similarity_matrix: Precomputed _similarity_matrix (reused within one check)
+        
         Returns:
             Average similarity score 0-1
         """
-        if len(image_features_list) < 2:
+        n = len(image_features_list)
+        if n < 2:
             return 1.0  # Single image, assume consistent
         
-        similarities = []
-        for i in range(len(image_features_list)):
-            for j in range(i + 1, len(image_features_list)):
-                feat1 = image_features_list[i]
-                feat2 = image_features_list[j]
-                
-                # Compare histograms
-                hist_sim = self._compare_histograms(feat1['histogram'], feat2['histogram'])
-                
-                # Compare color means (Euclidean distance in RGB space)
-                color_diff = np.linalg.norm(feat1['color_mean'] - feat2['color_mean'])
-                color_sim = 1.0 / (1.0 + color_diff / 255.0)  # Normalize to 0-1
-                
-                # Compare edge density
-                edge_sim = 1.0 - abs(feat1['edge_density'] - feat2['edge_density'])
-                
-                # Average similarity
-                avg_sim = (hist_sim * 0.5 + color_sim * 0.3 + edge_sim * 0.2)
-                similarities.append(avg_sim)
-        
-        return float(np.mean(similarities)) if similarities else 1.0
-    
-    def _detect_anomalies(self, image_features_list: List[Dict]) -> Tuple[float, List[str]]:
+        if similarity_matrix is None:
+            similarity_matrix = self._similarity_matrix(image_features_list)
+        upper = np.triu_indices(n, k=1)
+        return float(np.mean(similarity_matrix[upper]))
+    
+    @staticmethod
+    def _tile_defects(feat: Dict) -> List[Dict]:
+        """
+        Localized defects in one image from its tile maps
+        
+        Only tiles lying fully on the part are compared (outline tiles are always edgy).
+        Each tile's local variance and edge density is scored as a robust z-score
+        (median / MAD) against the part's other tiles; a crack in a large smooth face
+        stands out even though it barely moves the global statistics.
+        
+        Returns:
+            Regions above DEFECT_Z_THRESHOLD, worst first, overlapping windows suppressed:
+            dicts with relative x, y, width, height and z_score
+        """
+        if 'tile_variance' not in feat:
+            return []
+        interior = feat['tile_foreground'] >= _TILE_FOREGROUND
+        if np.count_nonzero(interior) < _MIN_INTERIOR_TILES:
+            return []
+        
+        z = np.full(interior.shape, -np.inf)
+        for key, floor in (('tile_variance', _TILE_VARIANCE_FLOOR), ('tile_edge_density', _TILE_EDGE_FLOOR)):
+            values = feat[key].astype(np.float64)
+            median = np.median(values[interior])
+            mad = np.median(np.abs(values[interior] - median))
+            z = np.maximum(z, np.where(interior, (values - median) / (1.4826 * mad + floor), -np.inf))
+        
+        regions = []
+        step = 1.0 / (2 * TILE_GRID)  # windows are 1/TILE_GRID wide, stepped by half a window
+        for flat in np.argsort(z, axis=None)[::-1]:
+            row, col = np.unravel_index(flat, z.shape)
+            if z[row, col] <= DEFECT_Z_THRESHOLD or len(regions) == DEFECT_MAX_REGIONS:
+                break
+            if any(abs(row - r['_row']) < 2 and abs(col - r['_col']) < 2 for r in regions):
+                continue  # overlaps a worse window
+            regions.append({
+                '_row': row, '_col': col,
+                'x': float(col * step), 'y': float(row * step),
+                'width': 1.0 / TILE_GRID, 'height': 1.0 / TILE_GRID,
+                'z_score': float(z[row, col]),
+            })
+        for region in regions:
+            del region['_row'], region['_col']
+        return regions
+    
+    def _detect_anomalies(
+        self,
+        image_features_list: List[Dict],
+        similarity_matrix: Optional[np.ndarray] = None,
+        image_indices: Optional[List[int]] = None,
+    ) -> Tuple[float, List[str], List[Dict]]:
         """
         Detect defects/anomalies in images
         
+        Args:
+            image_features_list: Per-image features
+            similarity_matrix: Precomputed _similarity_matrix (reused within one check)
+            image_indices: Photo index per feature dict (for notes/regions; defaults to position)
+        
         Returns:
-            (anomaly_score, notes) where anomaly_score is 0-1 (higher = fewer defects)
+            (anomaly_score, notes, defect_regions) where anomaly_score is 0-1 (higher = fewer
+            defects) and defect_regions are the worst localized defects across all images
         """
         if not image_features_list:
-            return 1.0, []
+            return 1.0, [], []
         
         notes = []
         anomaly_scores = []
+        defect_regions = []
+        image_indices = image_indices or list(range(len(image_features_list)))
         
-        for i, feat in enumerate(image_features_list):
+        for i, feat in zip(image_indices, image_features_list):
             score = 1.0
             
             # Check for excessive edge density (might indicate cracks or defects)
@@ -285,18 +739,80 @@ class VisionQualityCheckModel:
                 score *= 0.9
                 notes.append(f"Image {i+1}: Low contrast (may indicate poor image quality)")
             
+            # Localized defects (tile-level texture outliers on the part)
+            regions = self._tile_defects(feat)
+            if regions:
+                score *= 0.85
+                worst = regions[0]
+                notes.append(
+                    f"Image {i+1}: Localized surface anomaly near "
+                    f"({worst['x'] + worst['width'] / 2:.0%}, {worst['y'] + worst['height'] / 2:.0%}) of the frame"
+                )
+                defect_regions.extend({'image': i, **region} for region in regions)
+            
             anomaly_scores.append(score)
         
         # Average anomaly score across all images
         avg_score = float(np.mean(anomaly_scores))
         
         # Check consistency (if images are very different, might indicate defects)
-        consistency = self._compute_image_similarity(image_features_list)
+        consistency = self._compute_image_similarity(image_features_list, similarity_matrix)
         if consistency < 0.6:
             avg_score *= 0.85
             notes.append("Low consistency across images (may indicate defects or quality issues)")
         
-        return avg_score, notes
+        defect_regions.sort(key=lambda region: region['z_score'], reverse=True)
+        return avg_score, notes, defect_regions[:DEFECT_MAX_REGIONS]
+    
+    def _check_critical_dimensions(
+        self,
+        input_data: QualityCheckInput,
+        stl_features: Optional[Dict],
+    ) -> Tuple[Optional[float], List[str]]:
+        """
+        Measure the requested critical dimensions on the design mesh
+        
+        Each dimension (see f3_mesh_slicer for the names, e.g. 'width' or 'hole@z=5') is
+        measured on the STL, whose slicing index is built once per design. A deviation
+        within the tier's DIMENSION_TOLERANCE scores 1.0; beyond it the score falls off as
+        tolerance / deviation.
+        
+        Returns:
+            (mean 0-1 score or None when nothing could be measured, notes)
+        """
+        dimensions = input_data.critical_dimensions
+        if not dimensions:
+            return None, []
+        if not stl_features or 'design_hash' not in stl_features or stl_features['num_facets'] > MAX_TOPOLOGY_FACETS:
+            return None, ["Critical dimensions not checked (no STL mesh to measure)"]
+        
+        design_hash = stl_features['design_hash']
+        try:
+            slicer = get_slicer(design_hash, lambda: self._indexed_mesh(input_data.stl_file_path, design_hash))
+        except Exception as e:
+            return None, [f"Warning: Could not index STL for dimension checks: {e}"]
+        
+        tolerance = DIMENSION_TOLERANCE.get(input_data.tolerance_tier, DIMENSION_TOLERANCE['medium'])
+        notes = []
+        scores = []
+        for name, expected in dimensions.items():
+            try:
+                measured = slicer.measure_dimension(name)
+            except ValueError as e:
+                notes.append(f"Warning: {e}")
+                continue
+            if measured is None:
+                notes.append(f"Warning: Dimension '{name}' could not be measured (plane misses the part or has no hole)")
+                continue
+            deviation = abs(measured - expected) / max(abs(expected), 1e-9)
+            scores.append(min(1.0, tolerance / max(deviation, 1e-12)))
+            if deviation > tolerance:
+                notes.append(f"Dimension '{name}': design measures {measured:.3f}, expected {expected:.3f} ({deviation:.1%} off)")
+        if not scores:
+            return None, notes
+        score = float(np.mean(scores))
+        notes.append(f"Critical dimensions: {len(scores)} measured, {score:.0%} agreement with the design")
+        return score, notes
     
     def _estimate_dimensions_from_images(self, image_features_list: List[Dict], stl_features: Optional[Dict] = None) -> float:
         """
@@ -347,6 +863,14 @@ class VisionQualityCheckModel:
         """
         Perform quality check on manufactured part
         
+        With coarse_to_fine, all photos are first scored on COARSE_SIZE thumbnails; when
+        that score is at least COARSE_MARGIN away from the tier's pass/fail thresholds the
+        result is returned directly (coarse_pass=True). Borderline parts escalate to the
+        full ANALYSIS_SIZE pass.
+        
+        The analysis is kept as a session under input_data.job_id (replacing any earlier
+        one) so add_evidence can extend it.
+        
         Args:
             input_data: Quality check inputs (STL, evidence images, etc.)
         
@@ -357,48 +881,285 @@ class VisionQualityCheckModel:
         
         # Step 1: Analyze STL file (if provided)
         stl_features = None
-        if input_data.stl_file_path and Path(input_data.stl_file_path).exists():
+        if source_available(input_data.stl_file_path):
             stl_features = self._analyze_stl(input_data.stl_file_path)
             notes.append(f"STL analyzed: Volume={stl_features['volume']:.2f}, Surface area={stl_features['surface_area']:.2f}")
         else:
             notes.append("STL file not available - using image-only analysis")
         
-        # Step 2: Analyze all evidence images
-        if not input_data.evidence_image_paths:
-            raise ValueError("At least one evidence image is required")
+        # Step 2: Analyze all evidence images (and frames sampled from evidence videos)
+        if not input_data.evidence_image_paths and not input_data.evidence_video_paths:
+            raise ValueError("At least one evidence image or video is required")
+        
+        # Design silhouettes do not depend on the evidence resolution: build them once
+        design_references = self._design_references(input_data, stl_features)
+        
+        session = QCSession(
+            # Evidence lives in session.sources; drop the rest so the session holds no file buffers
+            input_data=replace(
+                input_data,
+                evidence_image_paths=[], evidence_video_paths=None, stl_file_path=None, design_image_paths=None,
+            ),
+            stl_features=stl_features,
+            design_references=design_references,
+            notes=notes,
+        )
+        session.dimension_score, dimension_notes = self._check_critical_dimensions(input_data, stl_features)
+        session.notes.extend(dimension_notes)
+        self._add_sources(session, input_data.evidence_image_paths or [])
+        for video_source in input_data.evidence_video_paths or []:
+            self._add_sources(session, self._sample_video(video_source, session.notes), video_frames=True)
+        result = self._evaluate(session)
+        self.sessions.put(input_data.job_id, session)
+        return result
+    
+    def add_evidence(self, job_id: str, image_sources: List[EvidenceSource]) -> QualityCheckOutput:
+        """
+        Re-evaluate a checked part with additional evidence photos
+        
+        Only the new photos are analyzed; their rows and columns are appended to the
+        session's similarity matrix and the scores are recomputed from the stored state.
+        The result matches running check_quality on all photos at once.
+        
+        Args:
+            job_id: Job of an earlier check_quality call (in this process)
+            image_sources: New photos (paths or in-memory buffers)
+        
+        Returns:
+            QualityCheckOutput over all photos of the job
+        
+        Raises:
+            KeyError: if there is no session for job_id (never checked, or evicted)
+        """
+        session = self.sessions.get(job_id)
+        if session is None:
+            raise KeyError(f"No QC session for job {job_id}")
+        with session.lock:
+            self._add_sources(session, image_sources)
+        return self._evaluate(session)
+    
+    def prefetch_evidence(
+        self,
+        image_sources: Optional[List[EvidenceSource]] = None,
+        stl_source: Optional[EvidenceSource] = None,
+    ):
+        """
+        Warm the feature cache for evidence that arrives ahead of the check
+        
+        Lets a caller analyze each file as soon as it is received (e.g. during a streaming
+        upload); the subsequent check_quality then reads the features from the cache.
+        Images are analyzed at the first-pass resolution.
+        
+        Args:
+            image_sources: Evidence photos (paths or in-memory buffers)
+            stl_source: Design STL (features and silhouette atlas)
+        """
+        if source_available(stl_source):
+            stl_features = self._analyze_stl(stl_source)
+            if 'design_hash' in stl_features and stl_features['num_facets'] <= MAX_TOPOLOGY_FACETS:
+                try:
+                    self._design_atlas(stl_source, stl_features['design_hash'])
+                except Exception as e:
+                    print(f"Warning: Could not render design atlas: {e}")
+        sources = [src for src in (image_sources or []) if source_available(src)]
+        if sources:
+            self._analyze_images(sources, COARSE_SIZE if self.coarse_to_fine else ANALYSIS_SIZE)
+    
+    @staticmethod
+    def _sample_video(video_source: EvidenceSource, notes: List[str]) -> List[bytes]:
+        """
+        Frames sampled from one evidence video (decoded incrementally, see f3_video)
+        
+        Returns:
+            JPEG-encoded frames; empty (with a warning note) if the video cannot be read
+        """
+        if not source_available(video_source):
+            notes.append(f"Warning: Video {describe_source(video_source)} not found")
+            return []
+        try:
+            frames = sample_video_frames(video_source)
+        except Exception as e:
+            notes.append(f"Warning: Could not read video {describe_source(video_source)}: {e}")
+            return []
+        notes.append(f"Sampled {len(frames)} frames from video {describe_source(video_source)}")
+        return frames
+    
+    @staticmethod
+    def _add_sources(session: QCSession, image_sources: List[EvidenceSource], video_frames: bool = False):
+        """Queue evidence photos (or sampled video frames) for analysis, noting the ones that cannot be read"""
+        for img_source in image_sources:
+            if source_available(img_source):
+                if video_frames:
+                    session.frames.add(len(session.sources))
+                session.sources.append(img_source)
+            else:
+                session.notes.append(f"Warning: Image {describe_source(img_source)} not found")
+    
+    def _evaluate(self, session: QCSession) -> QualityCheckOutput:
+        """
+        Score a session's evidence (coarse pass first when enabled, see check_quality)
+        
+        Returns:
+            QualityCheckOutput including the session's STL/input notes
+        """
+        with session.lock:
+            if self.coarse_to_fine:
+                coarse = self._score_evidence(session, COARSE_SIZE)
+                tier_thresholds = STATUS_THRESHOLDS.get(session.input_data.tolerance_tier, STATUS_THRESHOLDS['medium'])
+                margin = min(abs(coarse.qc_score - tier_thresholds['pass']), abs(coarse.qc_score - tier_thresholds['fail']))
+                escalate = margin < COARSE_MARGIN
+                _record_coarse_outcome(escalate)
+                if not escalate:
+                    coarse.notes = session.notes + coarse.notes + [
+                        f"Decided from {COARSE_SIZE[0]}x{COARSE_SIZE[1]} thumbnails (score {margin:.2f} from the nearest threshold)"
+                    ]
+                    coarse.coarse_pass = True
+                    self._record_pass(coarse, session, COARSE_SIZE)
+                    # Later photos may still escalate to full resolution: keep the photos on disk
+                    session.spill_sources()
+                    return coarse
+            
+            result = self._score_evidence(session, ANALYSIS_SIZE)
+            result.notes = session.notes + result.notes
+            self._record_pass(result, session, ANALYSIS_SIZE)
+            
+            # Every photo so far has full-size features (and thumbnails, which come first):
+            # the sources are no longer needed
+            session.release_sources(session.state(ANALYSIS_SIZE).analyzed)
+            return result
+    
+    @staticmethod
+    def _reference_key(design_hash: str, size: Tuple[int, int]) -> str:
+        """Reference-index key: histories are kept per design, image feature version and analysis size"""
+        return f"{design_hash}-{IMAGE_FEATURES_VERSION}-{size[0]}x{size[1]}"
+    
+    def _record_pass(self, result: QualityCheckOutput, session: QCSession, size: Tuple[int, int]):
+        """Add a passed part's evidence to its design's reference history at one analysis size"""
+        stl_features = session.stl_features
+        if result.status != 'pass' or not stl_features or 'design_hash' not in stl_features:
+            return
+        state = session.state(size)
+        new = [
+            (index, vector, features.get('content_key'))
+            for index, vector, features in zip(state.indices, state.vectors, state.features)
+            if vector is not None and (tuple(size), index) not in session.recorded
+        ]
+        if not new:
+            return
+        try:
+            # The index also skips photos recorded by earlier checks (same content key)
+            self.reference_index.add(
+                self._reference_key(stl_features['design_hash'], size),
+                [vector for _, vector, _ in new],
+                keys=[key for _, _, key in new],
+            )
+            session.recorded.update((tuple(size), index) for index, _, _ in new)
+        except Exception as e:
+            print(f"Warning: Could not record QC reference features: {e}")
+    
+    def _extend_state(self, session: QCSession, size: Tuple[int, int]) -> EvidenceState:
+        """
+        Bring a session's evidence at one resolution up to date with its photos
+        
+        Analyzes only the photos added since the last evaluation at this size, drops those
+        that near-duplicate a kept photo, and appends the new photos' rows and columns to
+        the similarity matrix.
+        
+        Returns:
+            The updated EvidenceState
+        """
+        state = session.state(size)
+        pending = session.sources[state.analyzed:]
+        if not pending:
+            return state
+        
+        # Images are analyzed in parallel across the worker pool
+        frames = {j for j in range(len(pending)) if state.analyzed + j in session.frames}
+        features = self._analyze_images(pending, size, keep_distinct=frames)
         
-        evidence_features = []
-        for img_path in input_data.evidence_image_paths:
-            if Path(img_path).exists():
-                feat = self._analyze_image(img_path)
-                evidence_features.append(feat)
+        # Near-duplicate shots would inflate consistency and the photo-count confidence bonus.
+        # Kept photos are the only representatives, so grouping them with the new photos
+        # gives the same result as grouping every photo from scratch. Video frames are
+        # already sampled to differ (and turntable views of a symmetric part can hash alike),
+        # so they are never collapsed.
+        offset = len(state.features)
+        hashes = [None if index in session.frames else f.get('phash') for index, f in zip(state.indices, state.features)]
+        hashes += [None if j in frames else f.get('phash') for j, f in enumerate(features)]
+        groups = group_near_duplicates(hashes)
+        kept = [j for j in range(len(features)) if groups[offset + j] == offset + j]
+        new_features = [features[j] for j in kept]
+        
+        if new_features:
+            new_block = self._similarity_block(new_features, new_features)
+            if state.similarity is None:
+                state.similarity = new_block
             else:
-                notes.append(f"Warning: Image {img_path} not found")
+                cross = self._similarity_block(state.features, new_features)
+                state.similarity = np.block([[state.similarity, cross], [cross.T, new_block]])
+            state.features.extend(new_features)
+            state.indices.extend(state.analyzed + j for j in kept)
+            state.design_scores.extend(self._design_scores(new_features, session.design_references))
+            state.vectors.extend(feature_vector(f) if 'phash' in f else None for f in new_features)  # skip undecodable photos
+        state.analyzed += len(pending)
+        return state
+    
+    def _score_evidence(self, session: QCSession, size: Tuple[int, int]) -> QualityCheckOutput:
+        """
+        Score the part from the session's evidence at one resolution (steps 2-9)
+        
+        Returns:
+            QualityCheckOutput; notes cover the image analysis and scoring only
+        """
+        notes = []
+        
+        state = self._extend_state(session, size)
+        evidence_features = state.features
+        stl_features = session.stl_features
         
         if not evidence_features:
             raise ValueError("No valid evidence images found")
         
+        collapsed = state.analyzed - len(evidence_features)
         notes.append(f"Analyzed {len(evidence_features)} evidence images")
+        if collapsed:
+            notes.append(f"Ignored {collapsed} near-duplicate photo(s)")
+        
+        # Pairwise similarity matrix is kept in the session and shared by steps 3, 4 and 7
+        similarity_matrix = state.similarity if len(evidence_features) >= 2 else None
+        consistency = self._compute_image_similarity(evidence_features, similarity_matrix)
+        
+        # Step 3: Compute similarity (compare evidence silhouettes to the design's rendered views)
+        design_scores = [score for score in state.design_scores if score is not None]
+        design_match = float(np.mean(design_scores)) if design_scores else None
+        similarity = self._apply_design_match(consistency, design_match)
+        if design_match is not None:
+            notes.append(f"Design silhouette match: {design_match:.2%}")
+        
+        # Compare against evidence of previously passed parts of the same design (kNN)
+        vectors = [vector for vector in state.vectors if vector is not None]
+        design_hash = stl_features.get('design_hash') if stl_features else None
+        history_match = self.reference_index.score(self._reference_key(design_hash, size), vectors) if design_hash else None
+        if history_match is not None:
+            similarity = 0.6 * similarity + 0.4 * history_match
+            notes.append(f"Match to previously passed parts of this design: {history_match:.2%}")
         
-        # Step 3: Compute similarity (if STL available, compare to STL-derived expectations)
         if stl_features:
-            # For now, use image consistency as similarity proxy
-            # In production, would generate STL renderings and compare
-            similarity = self._compute_image_similarity(evidence_features)
             # Adjust based on STL mesh quality
             similarity *= (0.7 + 0.3 * stl_features['mesh_quality'])
-        else:
-            # No STL - use consistency between images as similarity measure
-            similarity = self._compute_image_similarity(evidence_features)
         
         similarity = max(0.0, min(1.0, similarity))
         
         # Step 4: Anomaly detection
-        anomaly_score, anomaly_notes = self._detect_anomalies(evidence_features)
+        anomaly_score, anomaly_notes, defect_regions = self._detect_anomalies(
+            evidence_features, similarity_matrix, state.indices
+        )
         notes.extend(anomaly_notes)
         
         # Step 5: Dimensional accuracy (if STL available)
         dimensional_accuracy = self._estimate_dimensions_from_images(evidence_features, stl_features)
+        if session.dimension_score is not None:
+            # Critical dimensions measured on the STL cross-sections (step 3)
+            dimensional_accuracy = 0.5 * dimensional_accuracy + 0.5 * session.dimension_score
         
         # Step 6: Surface quality (based on texture and edge analysis)
         # Higher texture variance and moderate edge density = better surface finish
@@ -413,8 +1174,7 @@ class VisionQualityCheckModel:
         
         surface_quality = (texture_score * 0.6 + edge_score * 0.4)
         
-        # Step 7: Consistency across images
-        consistency = self._compute_image_similarity(evidence_features)
+        # Step 7: Consistency across images (already computed from the similarity matrix)
         
         # Step 8: Calculate overall QC score
         qc_score = (
@@ -427,12 +1187,7 @@ class VisionQualityCheckModel:
         qc_score = max(0.0, min(1.0, qc_score))
         
         # Step 9: Determine status based on tolerance tier
-        thresholds = {
-            'low': {'pass': 0.65, 'fail': 0.40},
-            'medium': {'pass': 0.75, 'fail': 0.50},
-            'high': {'pass': 0.85, 'fail': 0.60},
-        }
-        tier_thresholds = thresholds.get(input_data.tolerance_tier, thresholds['medium'])
+        tier_thresholds = STATUS_THRESHOLDS.get(session.input_data.tolerance_tier, STATUS_THRESHOLDS['medium'])
         
         if qc_score >= tier_thresholds['pass']:
             status = 'pass'
@@ -465,5 +1220,6 @@ class VisionQualityCheckModel:
             anomaly_score=anomaly_score,
             notes=notes,
             confidence=min(1.0, confidence),
-            model_version="v1.0-real"
+            model_version="v1.0-real",
+            defect_regions=defect_regions,
         )
@@ -0,0 +1,72 @@
+"""
+F4 Device Compatibility Index
+Which devices can run a task, answered with dictionary lookups.
+
+A task's required type matches a device when it is a substring of the device's type
+('fdm' matches '3d_printer_fdm'). Device types are interned to integer IDs with a
+type ID -> device positions index, each distinct required type is matched against the
+distinct device types once, and the compatible device list of each distinct
+requirement set is cached. Per task this is a dictionary hit instead of a substring
+test against every device.
+"""
+
+from typing import Dict, FrozenSet, Iterable, List, Sequence, Tuple
+
+
+class DeviceTypeIndex:
+    """Compatibility lookups over a fixed list of devices (anything with a device_type)"""
+
+    def __init__(self, devices: Sequence):
+        self.devices = list(devices)
+        self.type_ids: Dict[str, int] = {}  # device type -> interned ID
+        self.device_type_ids: List[int] = []  # per device position
+        self.devices_by_type: List[List[int]] = []  # type ID -> device positions (ascending)
+        for position, device in enumerate(self.devices):
+            type_id = self.type_ids.setdefault(device.device_type, len(self.type_ids))
+            if type_id == len(self.devices_by_type):
+                self.devices_by_type.append([])
+            self.devices_by_type[type_id].append(position)
+            self.device_type_ids.append(type_id)
+        self._matching_types: Dict[str, List[int]] = {}
+        self._compatible: Dict[Tuple[str, ...], List[int]] = {}
+        self._compatible_devices: Dict[Tuple[str, ...], List] = {}
+        self._compatible_types: Dict[Tuple[str, ...], FrozenSet[int]] = {}
+
+    def matching_type_ids(self, required_type: str) -> List[int]:
+        """IDs of the device types a required type matches (substring of the device type)"""
+        type_ids = self._matching_types.get(required_type)
+        if type_ids is None:
+            type_ids = [tid for name, tid in self.type_ids.items() if required_type in name]
+            self._matching_types[required_type] = type_ids
+        return type_ids
+
+    def compatible_type_ids(self, required_types: Iterable[str]) -> FrozenSet[int]:
+        """IDs of the device types matching any of the required types (for O(1) membership tests)"""
+        key = tuple(required_types)
+        type_ids = self._compatible_types.get(key)
+        if type_ids is None:
+            type_ids = frozenset(tid for required in key for tid in self.matching_type_ids(required))
+            self._compatible_types[key] = type_ids
+        return type_ids
+
+    def compatible_positions(self, required_types: Iterable[str]) -> List[int]:
+        """Positions of the devices matching any of the required types, in device order"""
+        key = tuple(required_types)
+        positions = self._compatible.get(key)
+        if positions is None:
+            type_ids = self.compatible_type_ids(key)
+            if len(type_ids) == 1:
+                positions = self.devices_by_type[next(iter(type_ids))]
+            else:
+                positions = sorted(p for tid in type_ids for p in self.devices_by_type[tid])
+            self._compatible[key] = positions
+        return positions
+
+    def compatible(self, required_types: Iterable[str]) -> List:
+        """Devices matching any of the required types, in device order (shared list, do not modify)"""
+        key = tuple(required_types)
+        devices = self._compatible_devices.get(key)
+        if devices is None:
+            devices = [self.devices[p] for p in self.compatible_positions(key)]
+            self._compatible_devices[key] = devices
+        return devices
@@ -0,0 +1,174 @@
+"""
+F4 Device Timelines
+Free time of one device over the scheduling week, for earliest-fit task placement.
+
+- Seeding: each day opens a working window at 8am lasting available_hours_per_day
+  (8 hours for days not listed), clipped to the week; maintenance windows are cut out.
+- Layout: free intervals are bucketed by day (sorted lists of [start, end) in hours since
+  midnight of the first day), and a max segment tree over the days holds each day's
+  longest free interval.
+- Queries: the earliest interval that fits a duration is found by descending the tree to
+  the leftmost day whose longest gap is long enough (O(log days)), then scanning that
+  day's few intervals. Booking splits the interval it falls in and updates one leaf.
+A task never spans two working windows.
+"""
+
+import math
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+WORKDAY_START_HOUR = 8.0  # working windows open at 8am
+DEFAULT_DAY_HOURS = 8.0  # hours available on days missing from available_hours_per_day
+_EPS = 1e-9  # hours; gaps shorter than this are dropped
+
+
+def week_origin(week_start: datetime) -> datetime:
+    """Midnight of the week's first day (timeline offsets are hours since then)"""
+    return week_start.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def to_hours(moment: datetime, origin: datetime) -> float:
+    """Offset of a datetime from the week origin, in hours"""
+    return (moment - origin).total_seconds() / 3600.0
+
+
+class DeviceTimeline:
+    """Free intervals of one device between week_start and week_end"""
+
+    def __init__(self, device, week_start: datetime, week_end: datetime):
+        """
+        Args:
+            device: DeviceAvailability (available_hours_per_day, maintenance_scheduled)
+            week_start: Earliest time a task may start
+            week_end: Latest time a task may end
+        """
+        self.origin = week_origin(week_start)
+        lower, upper = to_hours(week_start, self.origin), to_hours(week_end, self.origin)
+        num_days = max(0, int(math.ceil(upper / 24.0)))
+        self._days: List[List[List[float]]] = []  # per day: sorted [start, end] free intervals
+        self._starts: List[List[float]] = []  # per day: interval starts (bisect keys)
+        first_day = self.origin.date()
+        for day in range(num_days):
+            hours = device.available_hours_per_day.get(
+                (first_day + timedelta(days=day)).isoformat(), DEFAULT_DAY_HOURS
+            )
+            opens = day * 24.0 + WORKDAY_START_HOUR
+            start, end = max(opens, lower), min(opens + min(max(0.0, hours), 24.0), upper)
+            self._days.append([[start, end]] if end - start > _EPS else [])
+            self._starts.append([start] if end - start > _EPS else [])
+
+        self._size = 1
+        while self._size < max(1, num_days):
+            self._size *= 2
+        self._tree = [0.0] * (2 * self._size)
+        for day in range(num_days):
+            self._tree[self._size + day] = self._longest(day)
+        for node in range(self._size - 1, 0, -1):
+            self._tree[node] = max(self._tree[2 * node], self._tree[2 * node + 1])
+
+        for maint_start, maint_end in device.maintenance_scheduled:
+            self.book(to_hours(maint_start, self.origin), to_hours(maint_end, self.origin), strict=False)
+        self.capacity_hours = self.free_hours()
+        self.booked_hours = 0.0
+
+    def _day(self, hours: float) -> int:
+        """Bucket of the working window an offset falls in (windows open at 8am)"""
+        return int((hours - WORKDAY_START_HOUR) // 24.0)
+
+    def _longest(self, day: int) -> float:
+        return max((end - start for start, end in self._days[day]), default=0.0)
+
+    def _update(self, day: int):
+        node = self._size + day
+        self._tree[node] = self._longest(day)
+        node //= 2
+        while node:
+            self._tree[node] = max(self._tree[2 * node], self._tree[2 * node + 1])
+            node //= 2
+
+    def free_hours(self) -> float:
+        return sum(end - start for intervals in self._days for start, end in intervals)
+
+    def free_intervals(self) -> List[Tuple[float, float]]:
+        """Current free intervals in time order, as (start, end) hours"""
+        return [(start, end) for intervals in self._days for start, end in intervals]
+
+    def to_datetime(self, hours: float) -> datetime:
+        return self.origin + timedelta(hours=hours)
+
+    def earliest_fit(self, duration: float, latest_end: float = math.inf) -> Optional[float]:
+        """
+        Earliest start of a free interval that can hold duration hours
+
+        Args:
+            duration: Hours the task occupies the device
+            latest_end: The task must end by this offset (e.g. its deadline)
+
+        Returns:
+            Start offset in hours, or None when no gap fits in time
+        """
+        if not self._days:
+            return None
+        # Stored gaps are longer than _EPS, so a zero-length task still needs a real gap
+        need = max(duration - _EPS, _EPS)
+        if self._tree[1] < need:
+            return None
+        node = 1
+        while node < self._size:
+            node = 2 * node if self._tree[2 * node] >= need else 2 * node + 1
+        for start, end in self._days[node - self._size]:
+            if end - start >= need:
+                # Nothing fits earlier, so if this gap ends too late every later one does too
+                return start if start + duration <= latest_end + _EPS else None
+        return None
+
+    def book(self, start: float, end: float, strict: bool = True):
+        """
+        Remove [start, end) from the free time, splitting the intervals it overlaps
+
+        Args:
+            strict: Require the span to lie inside one free interval (a task); when False
+                any overlap is cut out (maintenance)
+
+        Raises:
+            ValueError: if strict and the span is not free
+        """
+        if end - start <= _EPS:
+            return
+        if strict:
+            first = last = self._day(start)
+            if not 0 <= first < len(self._days):
+                raise ValueError(f"[{start:.3f}, {end:.3f}) is outside the week")
+        else:
+            first, last = max(0, self._day(start)), min(len(self._days) - 1, self._day(end))
+        for day in range(first, last + 1):
+            intervals, starts = self._days[day], self._starts[day]
+            index = bisect_right(starts, start + _EPS) - 1
+            if strict:
+                if index < 0 or intervals[index][1] < end - _EPS:
+                    raise ValueError(f"[{start:.3f}, {end:.3f}) is not free on this device")
+                hit = range(index, index + 1)
+            else:
+                index = max(index, 0)
+                stop = bisect_right(starts, end - _EPS)
+                hit = range(index, stop)
+            pieces = []
+            for i in hit:
+                lo, hi = intervals[i]
+                if lo < start - _EPS:
+                    pieces.append([lo, min(hi, start)])
+                if hi > end + _EPS:
+                    pieces.append([max(lo, end), hi])
+            if len(hit):
+                intervals[hit.start:hit.stop] = pieces
+                starts[hit.start:hit.stop] = [lo for lo, _ in pieces]
+                self._update(day)
+        if strict:
+            self.booked_hours += end - start
+
+
+def build_timelines(devices, week_start: datetime, week_end: datetime) -> Dict[str, DeviceTimeline]:
+    """DeviceTimeline per device_id"""
+    return {d.device_id: DeviceTimeline(d, week_start, week_end) for d in devices}
+
@@ -0,0 +1,246 @@
+"""
+F4 Local Search
+Anytime improvement of a greedy schedule within a time budget (simulated annealing).
+
+- State: every free gap of every device (a working window minus maintenance) is a bin,
+  and each task sits in one bin or is unscheduled. Tasks in a bin run back to back in
+  deadline order (EDF), which meets every deadline whenever any order does.
+- Objective: total pay of the scheduled tasks. A move changes it by the pay of the tasks
+  entering or leaving the schedule, an O(1) delta. Bins keep their load, so the capacity
+  check is O(1) too; the deadline check only replays a bin's (few) tasks when one of them
+  is due before the bin closes.
+- Moves: insert an unscheduled task into a random compatible bin, evicting one of its
+  tasks if it does not fit; relocate a scheduled task to another bin, or swap it with
+  one of that bin's tasks. Gains are always taken and losses with probability
+  exp(delta / T), with T cooled geometrically over the budget.
+The best schedule seen is returned, if it beats the starting one.
+"""
+
+import math
+import random
+import time
+from bisect import bisect_right
+from typing import List, Optional, Sequence, Tuple
+
+_EPS = 1e-9
+_CLOCK_EVERY = 256  # iterations between clock reads
+_INITIAL_TEMPERATURE = 0.3  # fraction of the mean task pay
+_FINAL_TEMPERATURE = 1e-3  # fraction of the initial temperature reached when the budget runs out
+
+Placement = Tuple[int, int, float, float]  # (task position, device position, start, end) in timeline hours
+
+
+def anneal_schedule(
+    tasks: Sequence,
+    devices: Sequence,
+    device_index,
+    deadlines: Sequence[float],
+    gaps: Sequence[Sequence[Tuple[float, float]]],
+    placements: Sequence[Placement],
+    time_budget_ms: float,
+    seed: Optional[int] = None,
+) -> Optional[List[Placement]]:
+    """
+    Improve a schedule by simulated annealing until the time budget runs out
+
+    Args:
+        tasks: Tasks (pay_amount, estimated_hours, required_device_types)
+        devices: Devices (efficiency_factor), in the order device_index was built with
+        device_index: DeviceTypeIndex over devices
+        deadlines: Deadline per task, in timeline hours
+        gaps: Per device, its free (start, end) intervals before any task was booked
+        placements: Starting schedule; each start must lie in one of the device's gaps
+        time_budget_ms: Wall-clock budget for the search
+        seed: Random seed
+
+    Returns:
+        Placements of the best schedule found, or None if it does not pay more than the
+        starting one
+    """
+    begin = time.perf_counter()
+    budget = time_budget_ms / 1000.0
+    rng = random.Random(seed)
+    pay = [float(t.pay_amount) for t in tasks]
+    hours = [float(t.estimated_hours) for t in tasks]
+    compatible = [device_index.compatible_positions(t.required_device_types) for t in tasks]
+    compatible_types = [device_index.compatible_type_ids(t.required_device_types) for t in tasks]
+    device_type = device_index.device_type_ids
+    efficiency = [d.efficiency_factor for d in devices]
+
+    # Bins: one per free gap, grouped per device in time order
+    bin_start: List[float] = []
+    bin_end: List[float] = []
+    bin_device: List[int] = []
+    device_bins: List[List[int]] = []
+    device_bin_starts: List[List[float]] = []
+    for position, intervals in enumerate(gaps):
+        usable = intervals if efficiency[position] > 0 else []
+        device_bins.append(list(range(len(bin_start), len(bin_start) + len(usable))))
+        device_bin_starts.append([start for start, _ in usable])
+        for start, end in usable:
+            bin_start.append(start)
+            bin_end.append(end)
+            bin_device.append(position)
+    bin_load = [0.0] * len(bin_start)
+    bin_tight = [0] * len(bin_start)  # members due before the bin closes
+    members: List[List[int]] = [[] for _ in bin_start]
+
+    def duration(task: int, b: int) -> float:
+        return hours[task] / efficiency[bin_device[b]]
+
+    where = [-1] * len(tasks)  # bin per task, -1 when unscheduled
+    pool: List[int] = []  # unscheduled tasks, with their index in pool_index
+    pool_index = [-1] * len(tasks)
+    placed: List[int] = []  # scheduled tasks, with their index in placed_index
+    placed_index = [-1] * len(tasks)
+
+    def push(items: List[int], index: List[int], task: int):
+        index[task] = len(items)
+        items.append(task)
+
+    def pop(items: List[int], index: List[int], task: int):
+        last = items.pop()
+        if last != task:
+            items[index[task]] = last
+            index[last] = index[task]
+        index[task] = -1
+
+    def assign(task: int, b: int):
+        where[task] = b
+        members[b].append(task)
+        bin_load[b] += duration(task, b)
+        bin_tight[b] += deadlines[task] < bin_end[b]
+
+    def unassign(task: int):
+        b = where[task]
+        where[task] = -1
+        members[b].remove(task)
+        bin_load[b] -= duration(task, b)
+        bin_tight[b] -= deadlines[task] < bin_end[b]
+
+    def fits(b: int, entering: int, leaving: int = -1) -> bool:
+        load = bin_load[b] + duration(entering, b)
+        tight = bin_tight[b] + (deadlines[entering] < bin_end[b])
+        if leaving >= 0:
+            load -= duration(leaving, b)
+            tight -= deadlines[leaving] < bin_end[b]
+        if bin_start[b] + load > bin_end[b] + _EPS:
+            return False
+        if not tight:
+            return True
+        jobs = [t for t in members[b] if t != leaving] + [entering]
+        jobs.sort(key=deadlines.__getitem__)
+        clock = bin_start[b]
+        for t in jobs:
+            clock += duration(t, b)
+            if clock > deadlines[t] + _EPS:
+                return False
+        return True
+
+    def random_bin(task: int) -> int:
+        """A random bin of a random compatible device that opens early enough for the task"""
+        if not compatible[task]:
+            return -1
+        position = compatible[task][rng.randrange(len(compatible[task]))]
+        if efficiency[position] <= 0:
+            return -1
+        latest_start = deadlines[task] - hours[task] / efficiency[position]
+        count = bisect_right(device_bin_starts[position], latest_start + _EPS)
+        return device_bins[position][rng.randrange(count)] if count else -1
+
+    # Starting schedule
+    for task, position, start, _ in placements:
+        count = bisect_right(device_bin_starts[position], start + _EPS)
+        if not count or where[task] != -1:
+            return None
+        assign(task, device_bins[position][count - 1])
+        push(placed, placed_index, task)
+    for task in range(len(tasks)):
+        if where[task] == -1:
+            push(pool, pool_index, task)
+    initial = current = best = sum(pay[t] for t in placed)
+    best_where: Optional[List[int]] = None  # snapshot taken when a loss leaves the best schedule
+    best_is_current = True
+
+    mean_pay = sum(pay) / len(pay) if pay else 0.0
+    initial_temperature = max(mean_pay * _INITIAL_TEMPERATURE, _EPS)
+    temperature = initial_temperature
+    iteration = 0
+    while pool:
+        if iteration % _CLOCK_EVERY == 0:
+            elapsed = time.perf_counter() - begin
+            if elapsed >= budget:
+                break
+            temperature = initial_temperature * _FINAL_TEMPERATURE ** (elapsed / budget)
+        iteration += 1
+
+        if not placed or rng.random() < 0.5:
+            # Insert an unscheduled task, evicting one task of the bin if needed
+            task = pool[rng.randrange(len(pool))]
+            b = random_bin(task)
+            if b < 0:
+                continue
+            if fits(b, task):
+                evicted = -1
+            elif members[b]:
+                evicted = members[b][rng.randrange(len(members[b]))]
+                if not fits(b, task, evicted):
+                    continue
+            else:
+                continue
+            delta = pay[task] - (pay[evicted] if evicted >= 0 else 0.0)
+            if delta < 0:
+                if rng.random() >= math.exp(delta / temperature):
+                    continue
+                if best_is_current:
+                    best_where, best_is_current = where[:], False
+            if evicted >= 0:
+                unassign(evicted)
+                pop(placed, placed_index, evicted)
+                push(pool, pool_index, evicted)
+            pop(pool, pool_index, task)
+            assign(task, b)
+            push(placed, placed_index, task)
+            current += delta
+            if current > best + _EPS:
+                best, best_is_current = current, True
+        else:
+            # Relocate a scheduled task, or swap it with a task of the target bin (pay unchanged)
+            task = placed[rng.randrange(len(placed))]
+            source = where[task]
+            b = random_bin(task)
+            if b < 0 or b == source:
+                continue
+            if fits(b, task):
+                unassign(task)
+                assign(task, b)
+            elif members[b]:
+                other = members[b][rng.randrange(len(members[b]))]
+                if device_type[bin_device[source]] not in compatible_types[other]:
+                    continue
+                if deadlines[other] < bin_start[source] + duration(other, source) - _EPS:
+                    continue
+                if not (fits(b, task, other) and fits(source, other, task)):
+                    continue
+                unassign(task)
+                unassign(other)
+                assign(task, b)
+                assign(other, source)
+
+    if best <= initial + _EPS:
+        return None
+    final = where if best_is_current else best_where
+
+    by_bin = {}
+    for task, b in enumerate(final):
+        if b >= 0:
+            by_bin.setdefault(b, []).append(task)
+    result: List[Placement] = []
+    for b, jobs in by_bin.items():
+        jobs.sort(key=deadlines.__getitem__)
+        clock = bin_start[b]
+        for task in jobs:
+            end = clock + duration(task, b)
+            result.append((task, bin_device[b], clock, end))
+            clock = end
+    return result
@@ -9,6 +9,15 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta
 import json
 
+try:
+    from .f4_compatibility import DeviceTypeIndex
+    from .f4_device_timeline import DeviceTimeline, build_timelines, to_hours, week_origin
+    from .f4_local_search import anneal_schedule
+except ImportError:
+    from f4_compatibility import DeviceTypeIndex
+    from f4_device_timeline import DeviceTimeline, build_timelines, to_hours, week_origin
+    from f4_local_search import anneal_schedule
+
 
 @dataclass
 class Task:
@@ -42,6 +51,7 @@ class ScheduleInput:
     week_start: datetime
     week_end: datetime
     manufacturer_capacity_hours_per_day: float = 16.0  # max hours/day for maker
+    time_budget_ms: float = 0.0  # local-search budget after the greedy pass (0 = greedy only)
 
 
 @dataclass
@@ -102,11 +112,10 @@ class WorkflowSchedulingModel:
          d. Assign to best slot
          e. Update device availability
     
-    3. Optimization Pass (refinement):
-       - Detect underutilized devices
-       - Try to reschedule tasks to balance load
-       - Swap tasks if it improves overall profit
-       - Check for deadline conflicts
+    3. Optimization Pass (refinement, when time_budget_ms > 0):
+       - Simulated annealing over task insertions, evictions, moves and swaps
+         between devices' free gaps (f4_local_search.py)
+       - Kept only if it schedules more total pay than the greedy pass
     
     4. Validation:
        - Verify no double-booking
@@ -148,41 +157,24 @@ class WorkflowSchedulingModel:
         self, 
         task: Task, 
         device: DeviceAvailability,
-        week_start: datetime,
-        week_end: datetime
-    ) -> Optional[Tuple[datetime, datetime]]:
+        timeline: DeviceTimeline,
+        deadline: float
+    ) -> Optional[Tuple[float, float]]:
         """
-        Find available time slot for task on device
+        Find the earliest free slot for task on device
+        
+        Args:
+            timeline: The device's free intervals (bookings so far already removed)
+            deadline: Task deadline in timeline hours
         
         Returns:
-            (start_time, end_time) or None if no slot available
+            (start, end) in timeline hours, or None if no slot meets the deadline
         """
-        current = week_start
-        
-        while current < week_end:
-            day_str = current.strftime('%Y-%m-%d')
-            available_hours = device.available_hours_per_day.get(day_str, 8.0)
-            
-            # Check if device is in maintenance
-            in_maintenance = any(
-                maint_start <= current < maint_end
-                for maint_start, maint_end in device.maintenance_scheduled
-            )
-            
-            if not in_maintenance and available_hours >= task.estimated_hours:
-                # Found a slot
-                start_time = current
-                end_time = current + timedelta(hours=task.estimated_hours / device.efficiency_factor)
-                
-                # Check if it meets deadline
-                if end_time <= task.deadline:
-                    return (start_time, end_time)
-            
-            # Move to next day
-            current += timedelta(days=1)
-            current = current.replace(hour=8, minute=0, second=0)  # Start of workday
-        
-        return None
+        if device.efficiency_factor <= 0:
+            return None
+        duration = task.estimated_hours / device.efficiency_factor
+        start = timeline.earliest_fit(duration, deadline)
+        return (start, start + duration) if start is not None else None
     
     def schedule(self, input_data: ScheduleInput) -> ScheduleOutput:
         """
@@ -194,75 +186,89 @@ class WorkflowSchedulingModel:
         Returns:
             ScheduleOutput with scheduled tasks and metrics
         """
+        tasks = input_data.tasks
+        devices = input_data.devices
+        
         # Sort tasks by priority
-        tasks_sorted = sorted(
-            input_data.tasks,
-            key=lambda t: self._calculate_priority_score(t, input_data.week_start),
+        order = sorted(
+            range(len(tasks)),
+            key=lambda i: self._calculate_priority_score(tasks[i], input_data.week_start),
             reverse=True
         )
         
-        scheduled = []
-        unscheduled = []
-        device_bookings = {d.device_id: [] for d in input_data.devices}
+        timelines = build_timelines(devices, input_data.week_start, input_data.week_end)
+        origin = week_origin(input_data.week_start)
+        device_index = DeviceTypeIndex(devices)
+        deadlines = [to_hours(task.deadline, origin) for task in tasks]
+        optimize = input_data.time_budget_ms > 0
+        gaps = [timelines[d.device_id].free_intervals() for d in devices] if optimize else None
+        placements = []  # (task position, device position, start, end) in timeline hours
         
         # Greedy assignment
-        for task in tasks_sorted:
-            # Find compatible devices
-            compatible_devices = [
-                d for d in input_data.devices
-                if any(dt in d.device_type for dt in task.required_device_types)
-            ]
-            
-            if not compatible_devices:
-                unscheduled.append(task.job_id)
-                continue
-            
-            # Try to schedule on best device
+        for i in order:
+            task = tasks[i]
+            # Try to schedule on best compatible device
             best_slot = None
             best_device = None
             
-            for device in compatible_devices:
+            for position in device_index.compatible_positions(task.required_device_types):
+                device = devices[position]
                 slot = self._find_available_slot(
-                    task, device, input_data.week_start, input_data.week_end
+                    task, device, timelines[device.device_id], deadlines[i]
                 )
                 
                 if slot:
                     if best_slot is None or slot[0] < best_slot[0]:  # Earlier start
                         best_slot = slot
-                        best_device = device
+                        best_device = position
             
-            if best_slot and best_device:
-                # Schedule the task
-                scheduled_task = ScheduledTask(
-                    job_id=task.job_id,
-                    device_id=best_device.device_id,
-                    start_time=best_slot[0],
-                    end_time=best_slot[1],
-                    estimated_completion=best_slot[1],
-                    priority=task.priority,
-                    pay_amount=task.pay_amount
-                )
-                scheduled.append(scheduled_task)
-                device_bookings[best_device.device_id].append(scheduled_task)
-            else:
-                unscheduled.append(task.job_id)
+            if best_slot:
+                # Take the slot out of the device's free time
+                timelines[devices[best_device].device_id].book(*best_slot)
+                placements.append((i, best_device, best_slot[0], best_slot[1]))
+        
+        # Optimization pass: anneal within the time budget, keep the result only if it pays more
+        if optimize and len(placements) < len(tasks):
+            improved = anneal_schedule(
+                tasks, devices, device_index, deadlines, gaps, placements, input_data.time_budget_ms
+            )
+            if improved is not None:
+                placements = improved
+        
+        rank = {i: r for r, i in enumerate(order)}
+        placements.sort(key=lambda p: rank[p[0]])
+        placed = set()
+        scheduled = []
+        booked_hours = [0.0] * len(devices)
+        for i, position, start, end in placements:
+            task = tasks[i]
+            end_time = origin + timedelta(hours=end)
+            scheduled.append(ScheduledTask(
+                job_id=task.job_id,
+                device_id=devices[position].device_id,
+                start_time=origin + timedelta(hours=start),
+                end_time=end_time,
+                estimated_completion=end_time,
+                priority=task.priority,
+                pay_amount=task.pay_amount
+            ))
+            placed.add(i)
+            booked_hours[position] += end - start
+        unscheduled = [tasks[i].job_id for i in order if i not in placed]
         
         # Calculate metrics
         total_profit = sum(st.pay_amount for st in scheduled)
         
         # Device utilization
         device_utilization = {}
-        for device in input_data.devices:
-            total_hours_scheduled = sum(
-                (st.end_time - st.start_time).total_seconds() / 3600
-                for st in device_bookings[device.device_id]
-            )
-            total_available = sum(device.available_hours_per_day.values())
+        for position, device in enumerate(devices):
+            total_hours_scheduled = booked_hours[position]
+            total_available = timelines[device.device_id].capacity_hours
             utilization = (total_hours_scheduled / total_available * 100) if total_available > 0 else 0.0
             device_utilization[device.device_id] = min(100.0, utilization)
         
         # Schedule efficiency (average utilization, adjusted for unscheduled tasks)
-        avg_utilization = np.mean(list(device_utilization.values())) / 100.0
+        avg_utilization = np.mean(list(device_utilization.values())) / 100.0 if device_utilization else 0.0
         completion_rate = len(scheduled) / len(input_data.tasks) if input_data.tasks else 1.0
         schedule_efficiency = (avg_utilization * 0.6 + completion_rate * 0.4)
         
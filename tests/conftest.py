@@ -0,0 +1,80 @@
+"""Shared pytest setup: model modules are imported the way the API routes import them"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Keep caches, reference histories and the job queue out of the user's directories
+_STATE_DIR = tempfile.mkdtemp(prefix='mama-tests-')
+os.environ.setdefault('MAMA_F3_CACHE_DIR', os.path.join(_STATE_DIR, 'cache'))
+os.environ.setdefault('MAMA_F3_REFERENCE_DIR', os.path.join(_STATE_DIR, 'references'))
+os.environ.setdefault('MAMA_F3_POOL', 'thread')
+os.environ.setdefault('QC_JOB_DB', os.path.join(_STATE_DIR, 'qc_jobs.sqlite3'))
+os.environ.setdefault('QC_JOB_WORKERS', '0')
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+for path in (os.path.join(ROOT, 'models'), os.path.join(ROOT, 'api')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class StandIn:
+    """Local HTTP server serving fixture bodies (a stand-in for evidence storage)"""
+
+    def __init__(self):
+        self.files = {}  # path -> bytes
+        self.delays = {}  # path -> seconds to wait before answering
+        self.chunked = set()  # paths answered without Content-Length
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stand_in._lock:
+                    stand_in.active += 1
+                    stand_in.max_active = max(stand_in.max_active, stand_in.active)
+                try:
+                    time.sleep(stand_in.delays.get(self.path, 0.0))
+                    body = stand_in.files.get(self.path)
+                    if body is None:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    if self.path not in stand_in.chunked:
+                        self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stand_in._lock:
+                        stand_in.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    server = StandIn()
+    yield server
+    server.close()
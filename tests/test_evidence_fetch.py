@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from evidence_fetch import FetchTooLarge, fetch_all
+
+
+def _fetch(urls, **kwargs):
+    async def run():
+        async with httpx.AsyncClient() as client:
+            return await fetch_all(urls, client=client, **kwargs)
+    return asyncio.run(run())
+
+
+def test_downloads_are_aligned_and_a_failure_is_none(stand_in):
+    stand_in.files = {'/a.jpg': b'a' * 10, '/b.stl': b'b' * 20}
+    results = _fetch([stand_in.url('/a.jpg'), stand_in.url('/missing.jpg'), stand_in.url('/b.stl')])
+    assert results == [b'a' * 10, None, b'b' * 20]
+
+
+def test_concurrency_limit(stand_in):
+    paths = [f'/p{i}.jpg' for i in range(6)]
+    for path in paths:
+        stand_in.files[path] = path.encode()
+        stand_in.delays[path] = 0.2
+    results = _fetch([stand_in.url(p) for p in paths], concurrency=2)
+    assert results == [p.encode() for p in paths]
+    assert stand_in.max_active == 2
+
+
+def test_deadline_cancels_slow_downloads(stand_in):
+    stand_in.files = {'/fast.jpg': b'fast', '/slow.jpg': b'slow'}
+    stand_in.delays = {'/slow.jpg': 3.0}
+    start = time.monotonic()
+    results = _fetch([stand_in.url('/fast.jpg'), stand_in.url('/slow.jpg')], deadline=0.5)
+    assert results == [b'fast', None]
+    assert time.monotonic() - start < 2.0
+
+
+def test_byte_limit(stand_in):
+    stand_in.files = {'/big.jpg': b'x' * 5000, '/streamed.jpg': b'y' * 5000, '/small.jpg': b'z' * 100}
+    stand_in.chunked = {'/streamed.jpg'}  # no Content-Length: caught while streaming
+    results = _fetch(
+        [stand_in.url('/big.jpg'), stand_in.url('/streamed.jpg'), stand_in.url('/small.jpg')],
+        max_bytes=1000,
+    )
+    assert results == [None, None, b'z' * 100]
+
+
+def test_total_byte_limit_fails_the_call(stand_in):
+    stand_in.files = {f'/p{i}.jpg': b'x' * 800 for i in range(3)}
+    urls = [stand_in.url(f'/p{i}.jpg') for i in range(3)]
+    assert _fetch(urls, max_total_bytes=3000) == [b'x' * 800] * 3
+    with pytest.raises(FetchTooLarge):
+        _fetch(urls, max_total_bytes=2000)
@@ -0,0 +1,132 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.requests import Request
+
+import evidence_upload
+from evidence_upload import UploadError, iter_multipart
+from routes import qc
+
+BOUNDARY = 'xYzZY-boundary'
+
+
+def _jpeg(width=64, height=48) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (120, 90, 60)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def _body(fields=(), files=()) -> bytes:
+    """multipart/form-data body from (name, value) fields and (name, filename, bytes) files"""
+    out = bytearray()
+    for name, value in fields:
+        out += f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+    for name, filename, data in files:
+        out += (
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode() + data + b'\r\n'
+    out += f'--{BOUNDARY}--\r\n'.encode()
+    return bytes(out)
+
+
+def _request(chunks, content_type=f'multipart/form-data; boundary={BOUNDARY}') -> Request:
+    """Request whose body arrives in the given chunks"""
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': True} for chunk in chunks]
+    messages.append({'type': 'http.request', 'body': b'', 'more_body': False})
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {'type': 'http', 'method': 'POST', 'headers': [(b'content-type', content_type.encode())]}
+    return Request(scope, receive)
+
+
+def _parts(chunks, **kwargs):
+    async def run():
+        return [part async for part in iter_multipart(_request(chunks), **kwargs)]
+    return asyncio.run(run())
+
+
+def _split(body: bytes, size: int):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def test_fields_and_files():
+    photo = _jpeg()
+    body = _body([('job_id', 'J1'), ('tolerance_tier', 'high')], [('evidence_photos', 'a.jpg', photo)])
+    parts = _parts([body], image_fields={'evidence_photos'})
+    assert [(p.name, p.is_file) for p in parts] == [('job_id', False), ('tolerance_tier', False), ('evidence_photos', True)]
+    assert parts[0].value == 'J1' and parts[1].value == 'high'
+    assert parts[2].filename == 'a.jpg' and bytes(parts[2].data) == photo
+    assert parts[2].image_size == (64, 48)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 38, 1000])
+def test_boundaries_split_across_chunks(chunk_size):
+    photo, stl = _jpeg(), b'solid x\n' * 50
+    body = _body([('job_id', 'J1')], [('evidence_photos', 'a.jpg', photo), ('stl_file', 'd.stl', stl)])
+    parts = _parts(_split(body, chunk_size), image_fields={'evidence_photos'})
+    assert [bytes(p.data) for p in parts] == [b'J1', photo, stl]
+    assert parts[1].image_size == (64, 48)
+
+
+def test_parts_are_yielded_as_they_complete():
+    body = _body([('job_id', 'J1')], [('evidence_photos', 'a.jpg', _jpeg())])
+    split = body.index(b'Content-Type: application/octet-stream')  # inside the photo's headers
+    request = _request([body[:split], body[split:]])
+    reads = []
+    stream = request.stream
+
+    async def counted_stream():
+        async for chunk in stream():
+            reads.append(len(chunk))
+            yield chunk
+
+    request.stream = counted_stream
+
+    async def first_part():
+        return await iter_multipart(request).__anext__()
+
+    first = asyncio.run(first_part())
+    assert first.name == 'job_id' and first.value == 'J1'
+    assert reads == [split]  # yielded before the photo's bytes were read
+
+
+def test_oversized_image_is_rejected_from_its_header():
+    body = _body(files=[('evidence_photos', 'big.jpg', _jpeg(400, 300))])
+    with pytest.raises(UploadError, match='px limit'):
+        _parts(_split(body, 64), image_fields={'evidence_photos'}, max_image_pixels=100_000)
+
+
+def test_limits(monkeypatch):
+    with pytest.raises(UploadError, match='multipart'):
+        asyncio.run(iter_multipart(_request([b'{}'], 'application/json')).__anext__())
+    with pytest.raises(UploadError, match='too large'):
+        _parts([_body([('job_id', 'J' * (evidence_upload.UPLOAD_MAX_FIELD_BYTES + 1))])])
+    monkeypatch.setattr(evidence_upload, 'UPLOAD_MAX_BYTES', 100)
+    with pytest.raises(UploadError) as error:
+        _parts(_split(_body(files=[('stl_file', 'd.stl', b'x' * 500)]), 50))
+    assert error.value.status_code == 413
+
+
+@pytest.mark.parametrize('dimensions', ['not json', '[1, 2]', '{"length": "ten"}', '{"length": true}',
+                                        '{"width": null}', '{"height": NaN}'])
+def test_upload_rejects_bad_critical_dimensions(dimensions):
+    app = FastAPI()
+    app.include_router(qc.router, prefix='/qc')
+    body = _body([('job_id', 'J1'), ('critical_dimensions', dimensions)], [('evidence_photos', 'a.jpg', _jpeg())])
+    response = TestClient(app).post(
+        '/qc/upload', content=body, headers={'content-type': f'multipart/form-data; boundary={BOUNDARY}'},
+    )
+    assert response.status_code == 400
+    assert 'critical_dimensions' in response.json()['detail']
+
+
+def test_critical_dimensions_parsing():
+    assert qc._parse_critical_dimensions(None) is None
+    assert qc._parse_critical_dimensions('{"length": 10, "hole@z=50%": 4.5}') == {'length': 10.0, 'hole@z=50%': 4.5}
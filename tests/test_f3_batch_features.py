@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter, ImageStat
+
+from f3_batch_features import (
+    EDGE_THRESHOLD, extract_batch_features, find_edges, histograms, tile_statistics, to_grayscale,
+)
+
+
+@pytest.fixture(scope='module')
+def images():
+    rng = np.random.default_rng(7)
+    noise = rng.integers(0, 256, (2, 64, 80, 3), dtype=np.uint8)
+    # Smooth content too, where the edge response is mostly clipped to 0
+    ramp = np.broadcast_to(np.linspace(0, 255, 80, dtype=np.uint8)[None, :, None], (64, 80, 3))
+    part = ramp.copy()
+    part[16:48, 20:60] = (30, 140, 220)
+    return np.concatenate([noise, ramp[None], part[None], np.full((1, 64, 80, 3), 255, np.uint8)])
+
+
+def test_grayscale_is_bit_identical_to_pil(images):
+    gray = to_grayscale(images)
+    for image, batched in zip(images, gray):
+        assert np.array_equal(batched, np.asarray(Image.fromarray(image).convert('L')))
+
+
+def test_edges_are_bit_identical_to_pil(images):
+    edges = find_edges(to_grayscale(images))
+    for image, batched in zip(images, edges):
+        expected = np.asarray(Image.fromarray(image).convert('L').filter(ImageFilter.FIND_EDGES))
+        assert np.array_equal(batched, expected)
+
+
+def test_statistics_match_pil(images):
+    gray = to_grayscale(images)
+    hists = histograms(gray)
+    features = extract_batch_features(images)
+    for image, hist, feature in zip(images, hists, features):
+        pil_gray = Image.fromarray(image).convert('L')
+        pil_hist = np.array(pil_gray.histogram()) / (image.shape[0] * image.shape[1])
+        assert np.array_equal(hist, pil_hist)
+        assert np.array_equal(feature['histogram'], pil_hist)
+
+        color = ImageStat.Stat(Image.fromarray(image))
+        assert np.allclose(feature['color_mean'], color.mean, rtol=0, atol=1e-9)
+        assert np.allclose(feature['color_std'], color.stddev, rtol=0, atol=1e-6)
+        brightness = ImageStat.Stat(pil_gray)
+        assert feature['brightness'] == pytest.approx(brightness.mean[0] / 255.0, abs=1e-12)
+        assert feature['contrast'] == pytest.approx(brightness.stddev[0] / 255.0, abs=1e-9)
+
+        edges = np.asarray(pil_gray.filter(ImageFilter.FIND_EDGES))
+        assert feature['edge_density'] == pytest.approx(np.mean(edges > EDGE_THRESHOLD) / 255.0, abs=1e-15)
+        assert feature['texture_variance'] == pytest.approx(np.var(image.astype(np.float64)), rel=1e-12)
+
+
+def test_batch_results_do_not_depend_on_batch_composition(images):
+    together = extract_batch_features(images)
+    for i, image in enumerate(images):
+        (alone,) = extract_batch_features(image[None])
+        for name, value in alone.items():
+            assert np.array_equal(np.asarray(value), np.asarray(together[i][name])), name
+
+
+def test_tile_statistics_match_brute_force(images):
+    gray = to_grayscale(images)
+    edges = find_edges(gray)
+    mask = gray < 128
+    for g, e, m in zip(gray, edges, mask):
+        tiles = tile_statistics(g, e, m, grid=4)
+        window, stride = (16, 20), (8, 10)
+        assert tiles['tile_variance'].shape == (7, 7)
+        for row in range(7):
+            for col in range(7):
+                y, x = row * stride[0], col * stride[1]
+                block = (slice(y, y + window[0]), slice(x, x + window[1]))
+                assert tiles['tile_variance'][row, col] == pytest.approx(np.var(g[block].astype(np.float64)), rel=1e-4, abs=1e-3)
+                assert tiles['tile_edge_density'][row, col] == pytest.approx(np.mean(e[block] > EDGE_THRESHOLD), abs=1e-6)
+                assert tiles['tile_foreground'][row, col] == pytest.approx(np.mean(m[block]), abs=1e-6)
@@ -0,0 +1,119 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from f3_feature_cache import FeatureCache, content_key
+import f3_vision_quality_check as vqc
+from f3_qc_session import SessionStore
+from f3_reference_index import ReferenceIndex
+
+PREDATOR_STL = os.path.join(os.path.dirname(__file__), '..', 'Predator.stl')
+
+
+def _entry_file(cache, namespace, key):
+    return cache._entry_path(namespace, key)
+
+
+def test_content_key_is_the_same_for_every_source_kind(tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 17)  # spans several hash chunks
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(data)
+    key = content_key(data)
+    assert content_key(str(path)) == key
+    assert content_key(io.BytesIO(data)) == key
+    assert content_key(memoryview(data)) == key
+    assert content_key(data, salt='image-v2') != key
+
+
+def test_memory_hit():
+    cache = FeatureCache(None)
+    value = {'hist': np.arange(4)}
+    cache.put('image', 'k1', value)
+    assert cache.get('image', 'k1') is value
+    assert cache.get('stl', 'k1') is None  # namespaces are separate
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_memory_tier_is_lru():
+    cache = FeatureCache(None, max_memory_entries=2)
+    cache.put('image', 'a', 1)
+    cache.put('image', 'b', 2)
+    cache.get('image', 'a')  # b is now least recently used
+    cache.put('image', 'c', 3)
+    assert cache.get('image', 'a') == 1 and cache.get('image', 'c') == 3
+    assert cache.get('image', 'b') is None
+
+
+def test_disk_hit_survives_a_new_process(tmp_path):
+    FeatureCache(str(tmp_path)).put('stl', 'k1', {'volume': 12.5})
+    cache = FeatureCache(str(tmp_path))  # empty memory tier, like a restarted server
+    assert cache.get('stl', 'k1') == {'volume': 12.5}
+    os.remove(_entry_file(cache, 'stl', 'k1'))
+    assert cache.get('stl', 'k1') == {'volume': 12.5}  # promoted to memory on the first read
+    assert not [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith('.tmp')]
+
+
+def test_unreadable_entry_is_dropped(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    cache.put('image', 'k1', [1, 2, 3])
+    path = _entry_file(cache, 'image', 'k1')
+    with open(path, 'wb') as fh:
+        fh.write(b'not a pickle')
+    assert FeatureCache(str(tmp_path)).get('image', 'k1') is None
+    assert not os.path.exists(path)
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    payload = os.urandom(4000)
+    cache = FeatureCache(str(tmp_path), max_disk_bytes=14000)  # three entries fit in 90%
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put('image', key, payload)
+        os.utime(_entry_file(cache, 'image', key), (1000 + i, 1000 + i))
+    cache.clear_memory()
+    cache.get('image', 'a')  # read from disk: now the most recently used
+    cache.put('image', 'd', payload)  # over budget: evict down to 90%
+    remaining = {key for key in 'abcd' if os.path.exists(_entry_file(cache, 'image', key))}
+    assert remaining == {'a', 'c', 'd'}
+
+
+def _model(cache, **kwargs):
+    return vqc.VisionQualityCheckModel(
+        feature_cache=cache, reference_index=ReferenceIndex(None), session_store=SessionStore(), **kwargs,
+    )
+
+
+def _photo() -> bytes:
+    pixels = np.full((120, 160, 3), 200, dtype=np.uint8)
+    pixels[30:90, 40:120] = 80
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_feature_version_bump_invalidates_entries(tmp_path, monkeypatch):
+    cache = FeatureCache(str(tmp_path))
+    photo = _photo()
+    _model(cache)._analyze_images([photo])
+    _model(cache)._analyze_stl(PREDATOR_STL)
+    misses = cache.misses
+    _model(cache)._analyze_images([photo])
+    _model(cache)._analyze_stl(PREDATOR_STL)
+    assert cache.misses == misses  # same versions: both served from the cache
+
+    monkeypatch.setattr(vqc, 'IMAGE_FEATURES_VERSION', 'image-test')
+    monkeypatch.setattr(vqc, 'STL_FEATURES_VERSION', 'stl-test')
+    _model(cache)._analyze_images([photo])
+    _model(cache)._analyze_stl(PREDATOR_STL)
+    assert cache.misses == misses + 2
+
+
+def test_fast_decode_and_coarse_size_use_their_own_entries(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    photo = _photo()
+    _model(cache)._analyze_images([photo])
+    misses = cache.misses
+    _model(cache, fast_decode=False)._analyze_images([photo])
+    _model(cache)._analyze_images([photo], size=vqc.COARSE_SIZE)
+    assert cache.misses == misses + 2
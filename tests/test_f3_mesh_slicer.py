@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from f3_mesh_slicer import MeshSlicer
+from f3_mesh_topology import IndexedMesh
+
+
+def _box(length=20.0, width=10.0, height=30.0):
+    """Closed box with outward-wound faces, from the origin to (length, width, height)"""
+    vertices = np.array([
+        [0, 0, 0], [length, 0, 0], [length, width, 0], [0, width, 0],
+        [0, 0, height], [length, 0, height], [length, width, height], [0, width, height],
+    ], dtype=np.float32)
+    faces = np.array([
+        [0, 2, 1], [0, 3, 2],  # bottom
+        [4, 5, 6], [4, 6, 7],  # top
+        [0, 1, 5], [0, 5, 4],  # front
+        [2, 3, 7], [2, 7, 6],  # back
+        [1, 2, 6], [1, 6, 5],  # right
+        [3, 0, 4], [3, 4, 7],  # left
+    ], dtype=np.int32)
+    return IndexedMesh(vertices, faces)
+
+
+def test_plane_inside_part_is_measured():
+    slicer = MeshSlicer(_box())
+    assert slicer.measure_dimension('width@z=15') == pytest.approx(10.0)
+    assert slicer.measure_dimension('length@z=50%') == pytest.approx(20.0)
+
+
+def test_plane_outside_part_misses():
+    slicer = MeshSlicer(_box())
+    assert slicer.measure_dimension('width@z=40') is None
+    assert slicer.measure_dimension('width@z=-1') is None
+    assert slicer.measure_dimension('width@z=150%') is None
+
+
+def test_plane_on_bounding_face_is_nudged_inside():
+    slicer = MeshSlicer(_box())
+    assert slicer.measure_dimension('width@z=0') == pytest.approx(10.0)
+    assert slicer.measure_dimension('width@z=30') == pytest.approx(10.0)
+    assert slicer.measure_dimension('width@z=100%') == pytest.approx(10.0)
+
+
+@pytest.mark.parametrize('name, message', [
+    ('bogus', "Unrecognized dimension 'bogus'"),
+    ('bogus@z=5', "Unrecognized dimension 'bogus@z=5'"),
+    ('width@q=5', "Unrecognized dimension 'width@q=5'"),
+    ('hole', "needs a plane"),
+    ('height@z=5', "along the plane's normal"),
+])
+def test_bad_dimension_names(name, message):
+    with pytest.raises(ValueError, match=message):
+        MeshSlicer(_box()).measure_dimension(name)
+
+
+def test_axis_extents_need_no_plane():
+    slicer = MeshSlicer(_box())
+    assert slicer.measure_dimension('Height') == pytest.approx(30.0)
+    assert slicer.measure_dimension('x') == pytest.approx(20.0)
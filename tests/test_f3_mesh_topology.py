@@ -0,0 +1,73 @@
+import threading
+
+import numpy as np
+import pytest
+
+import f3_mesh_topology
+from f3_mesh_topology import IndexedMesh, load_indexed_mesh, topology_metrics, topology_quality, weld_stl
+from f3_stl_reader import FACET_DTYPE
+
+_CUBE_VERTICES = np.array([
+    [0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+    [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1],
+], dtype=np.float32)
+_CUBE_FACES = [
+    [0, 2, 1], [0, 3, 2], [4, 5, 6], [4, 6, 7], [0, 1, 5], [0, 5, 4],
+    [2, 3, 7], [2, 7, 6], [1, 2, 6], [1, 6, 5], [3, 0, 4], [3, 4, 7],
+]
+
+
+def _binary_stl(faces) -> bytes:
+    records = np.zeros(len(faces), dtype=FACET_DTYPE)
+    records['vertices'] = _CUBE_VERTICES[faces]
+    return b'cube'.ljust(80, b' ') + np.uint32(len(records)).tobytes() + records.tobytes()
+
+
+@pytest.mark.parametrize('chunk_facets', [2, 5, 65536])
+def test_welded_cube_is_watertight(monkeypatch, chunk_facets):
+    monkeypatch.setattr(f3_mesh_topology, 'WELD_CHUNK_FACETS', chunk_facets)
+    mesh = weld_stl(_binary_stl(_CUBE_FACES))
+    assert mesh.vertices.dtype == np.float32 and mesh.faces.dtype == np.int32
+    assert len(mesh.vertices) == 8 and len(mesh.faces) == 12
+    assert np.allclose(mesh.triangles(), _CUBE_VERTICES[_CUBE_FACES])
+    metrics = topology_metrics(mesh)
+    assert metrics['watertight'] and metrics['euler_characteristic'] == 2
+    assert metrics['num_edges'] == 18
+    assert metrics['boundary_edges'] == metrics['inconsistent_edges'] == metrics['degenerate_triangles'] == 0
+    assert topology_quality(metrics, len(mesh.faces)) == 1.0
+
+
+def test_defects_are_counted():
+    open_box = topology_metrics(weld_stl(_binary_stl(_CUBE_FACES[:-1])))
+    assert not open_box['watertight'] and open_box['boundary_edges'] == 3
+
+    flipped = [face[::-1] if i == 0 else face for i, face in enumerate(_CUBE_FACES)]
+    assert topology_metrics(weld_stl(_binary_stl(flipped)))['inconsistent_edges'] == 3
+
+    fin = _CUBE_FACES + [[0, 1, 6]]  # a third face on the 0-1 edge and the 1-6 face diagonal
+    metrics = topology_metrics(weld_stl(_binary_stl(fin)))
+    assert metrics['non_manifold_edges'] == 2 and not metrics['watertight']
+    assert topology_quality(metrics, len(fin)) < 0.9
+
+
+def test_cached_mesh_round_trip_with_concurrent_writers(tmp_path):
+    mesh = IndexedMesh(_CUBE_VERTICES, np.array(_CUBE_FACES, dtype=np.int32))
+    path = str(tmp_path / 'mesh.npz')
+    errors = []
+
+    def write():
+        try:
+            for _ in range(5):
+                mesh.save(path)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['mesh.npz']
+    loaded = load_indexed_mesh(b'not an stl', cache_path=path)  # served from the cache
+    assert np.array_equal(loaded.vertices, mesh.vertices) and np.array_equal(loaded.faces, mesh.faces)
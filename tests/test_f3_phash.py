@@ -0,0 +1,48 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from f3_phash import DUPLICATE_DISTANCE, group_near_duplicates, hamming_distance, perceptual_hash
+
+
+def _thumbnail(image: Image.Image) -> np.ndarray:
+    return np.asarray(image.convert('L').resize((32, 32), Image.Resampling.BOX))
+
+
+def _scene(seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    pixels = np.full((240, 320), 200.0)
+    for _ in range(4):
+        x, y = rng.integers(0, 260), rng.integers(0, 180)
+        pixels[y:y + 60, x:x + 60] = rng.uniform(30, 120)
+    return Image.fromarray(pixels.astype(np.uint8))
+
+
+def _reencoded(image: Image.Image, quality: int) -> Image.Image:
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def test_reencoded_and_rescaled_copies_stay_close():
+    original = _scene(1)
+    reference = perceptual_hash(_thumbnail(original))
+    assert hamming_distance(reference, perceptual_hash(_thumbnail(_reencoded(original, 40)))) <= DUPLICATE_DISTANCE
+    assert hamming_distance(reference, perceptual_hash(_thumbnail(original.resize((160, 120))))) <= DUPLICATE_DISTANCE
+    brighter = Image.fromarray(np.clip(np.asarray(original, dtype=np.int16) + 20, 0, 255).astype(np.uint8))
+    assert hamming_distance(reference, perceptual_hash(_thumbnail(brighter))) <= DUPLICATE_DISTANCE
+
+
+def test_different_scenes_are_far_apart():
+    hashes = [perceptual_hash(_thumbnail(_scene(seed))) for seed in range(6)]
+    for i in range(len(hashes)):
+        for j in range(i + 1, len(hashes)):
+            assert hamming_distance(hashes[i], hashes[j]) > DUPLICATE_DISTANCE
+
+
+def test_grouping_maps_duplicates_to_the_first_similar_item():
+    assert group_near_duplicates([0b0, 0b1, 0xFF00, 0b11, 0xFF01]) == [0, 0, 2, 0, 2]
+    assert group_near_duplicates([0b0, 0b111], max_distance=2) == [0, 1]
+    # None is never collapsed and never a representative
+    assert group_near_duplicates([None, 0b0, None, 0b0]) == [0, 1, 2, 1]
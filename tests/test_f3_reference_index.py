@@ -0,0 +1,103 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+import f3_reference_index
+from f3_reference_index import MIN_REFERENCE_VECTORS, MIN_SCALE, VECTOR_DIM, ReferenceIndex, feature_vector
+
+DESIGN = 'ab' + '0' * 62
+
+
+def _key(i) -> str:
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def _passes(n: int, seed: int = 0, spread: float = 0.05) -> list:
+    """Vectors of n passed photos scattered around one typical photo"""
+    rng = np.random.default_rng(seed)
+    center = np.random.default_rng(99).uniform(0.2, 0.8, VECTOR_DIM)
+    return list((center + rng.normal(0, spread, (n, VECTOR_DIM))).astype(np.float32))
+
+
+@pytest.mark.parametrize('root', ['memory', 'disk'])
+def test_photos_are_recorded_once_per_design(tmp_path, root):
+    index = ReferenceIndex(str(tmp_path) if root == 'disk' else None)
+    vectors = _passes(6)
+    keys = [_key(i) for i in range(6)]
+    index.add(DESIGN, vectors, keys=keys)
+    index.add(DESIGN, vectors, keys=keys)  # a re-check of the same photos
+    index.add(DESIGN, vectors[:2] + vectors[:2], keys=[_key(10), _key(11), _key(10), _key(11)])
+    assert index.size(DESIGN) == 8
+    index.add(DESIGN, vectors[:2], keys=None)  # unknown photos are always added
+    assert index.size(DESIGN) == 10
+    index.add('cd' + '0' * 62, vectors, keys=keys)  # other designs keep their own history
+    assert index.size('cd' + '0' * 62) == 6
+
+
+def test_history_and_keys_survive_a_restart(tmp_path):
+    vectors, keys = _passes(5), [_key(i) for i in range(5)]
+    ReferenceIndex(str(tmp_path)).add(DESIGN, vectors, keys=keys)
+    index = ReferenceIndex(str(tmp_path))
+    assert index.size(DESIGN) == 5
+    index.add(DESIGN, vectors, keys=keys)
+    assert index.size(DESIGN) == 5
+    assert np.array_equal(index._history(DESIGN).vectors, np.stack(vectors))
+
+
+def test_history_is_compacted_to_the_newest_vectors(tmp_path):
+    index = ReferenceIndex(str(tmp_path), max_vectors=10)
+    vectors = _passes(13)
+    for i, vector in enumerate(vectors):
+        index.add(DESIGN, [vector], keys=[_key(i)])
+    assert index.size(DESIGN) == 10
+    reloaded = ReferenceIndex(str(tmp_path), max_vectors=10)
+    assert np.array_equal(reloaded._history(DESIGN).vectors, np.stack(vectors[-10:]))
+
+
+def test_knn_distances_match_brute_force(monkeypatch):
+    monkeypatch.setattr(f3_reference_index, '_DISTANCE_BLOCK_ELEMENTS', 100)  # several query blocks
+    index = ReferenceIndex(None, k=3)
+    stored = _passes(40)
+    index.add(DESIGN, stored, keys=[_key(i) for i in range(40)])
+    queries = np.stack(_passes(7, seed=1))
+    all_distances = np.linalg.norm(queries[:, None, :] - np.stack(stored)[None], axis=2)
+    expected = np.sort(all_distances, axis=1)[:, :3]
+    assert np.allclose(index._history(DESIGN).knn_distances(queries, 3), expected, atol=1e-4)
+
+
+def test_knn_score():
+    index = ReferenceIndex(None)
+    stored = _passes(MIN_REFERENCE_VECTORS + 20)
+    assert index.score(DESIGN, stored[:1]) is None  # no history yet
+    index.add(DESIGN, stored[:MIN_REFERENCE_VECTORS - 1], keys=[_key(i) for i in range(MIN_REFERENCE_VECTORS - 1)])
+    assert index.score(DESIGN, stored[:1]) is None  # too thin to judge against
+    index.add(DESIGN, stored, keys=[_key(i) for i in range(len(stored))])
+
+    typical = index.score(DESIGN, _passes(5, seed=1))
+    assert typical > 0.8
+    off = [vector + 0.5 for vector in _passes(5, seed=2)]  # e.g. another material or a wrong part
+    assert index.score(DESIGN, off) < 0.3
+    assert index.score(DESIGN, []) is None
+
+
+def test_scale_floor_tolerates_a_history_of_identical_photos():
+    index = ReferenceIndex(None)
+    same = _passes(1)[0]
+    index.add(DESIGN, [same] * 30, keys=[_key(i) for i in range(30)])  # different files, same picture
+    assert index._history(DESIGN).scale(index.k) == MIN_SCALE
+    assert index.score(DESIGN, [same + 0.005]) == 1.0
+    assert index.score(DESIGN, [same + 0.1]) < 0.5
+
+
+def test_feature_vector_layout():
+    features = {
+        'histogram': np.full(256, 1 / 256), 'color_mean': np.array([255.0, 0, 127.5]),
+        'color_std': np.zeros(3), 'edge_density': 0.1 / 255.0, 'texture_variance': 128.0 ** 2,
+        'brightness': 0.4, 'contrast': 0.2, 'width': 128,
+    }
+    vector = feature_vector(features)
+    assert vector.dtype == np.float32 and vector.shape == (VECTOR_DIM,)
+    assert np.allclose(vector[:32], np.sqrt(1 / 32))
+    assert np.allclose(vector[32:35], [1.0, 0.0, 0.5])
+    assert np.allclose(vector[38:], [0.025, 1.0, 0.4, 0.2])  # edge density scaled by width / 512
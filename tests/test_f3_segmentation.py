@@ -0,0 +1,41 @@
+"""Tests for F3 foreground segmentation and part cropping"""
+
+import numpy as np
+
+from f3_segmentation import crop_box
+
+
+def _photo(height=144, width=192):
+    """Grey backdrop with sensor noise (int16, so parts can be painted before clipping)"""
+    rng = np.random.default_rng(0)
+    image = np.full((height, width, 3), 200, dtype=np.int16) + rng.integers(-4, 5, (height, width, 3))
+    return image
+
+
+def test_thin_protrusion_stays_inside_crop():
+    image = _photo()
+    image[60:110, 70:120] = 60  # body
+    image[20:60, 94:95] = 60  # one-pixel-wide pin rising to y=20
+    image = image.clip(0, 255).astype(np.uint8)
+
+    box = crop_box(image, (1920, 1440))
+
+    assert box is not None
+    left, top, right, bottom = box
+    assert top <= 20 * 10 and bottom >= 110 * 10
+    assert left <= 70 * 10 and right >= 120 * 10
+
+
+def test_foreground_on_crop_edge_keeps_full_frame():
+    image = _photo()
+    image[60:110, 70:120] = 60  # body: 50 px tall, so the 8% margin puts the box top at y=56
+    image[56, 90] = 60  # isolated foreground pixel (not in the box's mask) on that edge
+    image = image.clip(0, 255).astype(np.uint8)
+
+    assert crop_box(image, (1920, 1440)) is None
+
+
+def test_speckle_free_background_is_not_cropped():
+    image = _photo().clip(0, 255).astype(np.uint8)
+
+    assert crop_box(image, (1920, 1440)) is None
@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+import pytest
+
+from f3_mesh_topology import IndexedMesh
+from f3_silhouette import (
+    CANONICAL_VIEWS, SilhouetteAtlas, build_atlas, match_silhouette, render_view, silhouette_descriptor,
+)
+
+
+def _box(length=2.0, width=1.0, height=1.0):
+    vertices = np.array([
+        [0, 0, 0], [length, 0, 0], [length, width, 0], [0, width, 0],
+        [0, 0, height], [length, 0, height], [length, width, height], [0, width, height],
+    ], dtype=np.float32)
+    faces = np.array([
+        [0, 2, 1], [0, 3, 2], [4, 5, 6], [4, 6, 7], [0, 1, 5], [0, 5, 4],
+        [2, 3, 7], [2, 7, 6], [1, 2, 6], [1, 6, 5], [3, 0, 4], [3, 4, 7],
+    ], dtype=np.int32)
+    return IndexedMesh(vertices, faces)
+
+
+def _grid_square(n: int, z: float = 0.0) -> IndexedMesh:
+    """Unit square in the z plane split into 2 * n * n triangles"""
+    ticks = np.linspace(0.0, 1.0, n + 1)
+    xs, ys = np.meshgrid(ticks, ticks, indexing='ij')
+    vertices = np.stack([xs.ravel(), ys.ravel(), np.full(xs.size, z)], axis=1).astype(np.float32)
+    index = np.arange((n + 1) ** 2).reshape(n + 1, n + 1)
+    a, b, c, d = index[:-1, :-1], index[1:, :-1], index[1:, 1:], index[:-1, 1:]
+    faces = np.concatenate([np.stack([a, b, c], -1).reshape(-1, 3), np.stack([a, c, d], -1).reshape(-1, 3)])
+    return IndexedMesh(vertices, faces.astype(np.int32))
+
+
+def test_front_view_of_box_is_a_filled_rectangle():
+    depth, shade = render_view(_box(), CANONICAL_VIEWS['front'], 64)
+    mask = np.isfinite(depth)
+    rows, cols = np.nonzero(mask)
+    height, width = np.ptp(rows) + 1, np.ptp(cols) + 1
+    assert width == pytest.approx(2 * height, abs=2)  # 2 x 1 face
+    assert mask[rows.min():rows.max() + 1, cols.min():cols.max() + 1].mean() > 0.99
+    assert np.allclose(shade[mask], 1.0)  # the front face looks straight at the camera
+    assert np.all(shade[~mask] == 0)
+
+
+def test_tessellation_does_not_change_coverage():
+    top = CANONICAL_VIEWS['top']
+    coarse, _ = render_view(_grid_square(1), top, 64)
+    fine, _ = render_view(_grid_square(40), top, 64)  # tiny triangles land in other buckets
+    assert np.array_equal(np.isfinite(coarse), np.isfinite(fine))
+
+
+def test_nearer_surface_wins():
+    near, far = _grid_square(3, z=1.0), _grid_square(1, z=0.0)
+    mesh = IndexedMesh(
+        np.concatenate([far.vertices, near.vertices]),
+        np.concatenate([far.faces, near.faces + len(far.vertices)]),
+    )
+    depth, _ = render_view(mesh, CANONICAL_VIEWS['top'], 32)
+    visible = depth[np.isfinite(depth)]
+    # Seen from above the camera looks down -z: the z=1 square is in front everywhere
+    assert np.allclose(visible, visible.min())
+    only_far, _ = render_view(far, CANONICAL_VIEWS['top'], 32)
+    assert visible.min() < only_far[np.isfinite(only_far)].min()
+
+
+def test_descriptor_ignores_position_and_scale():
+    small = np.zeros((100, 100), dtype=bool)
+    small[10:30, 20:60] = True
+    large = np.zeros((300, 200), dtype=bool)
+    large[150:230, 30:190] = True
+    assert np.allclose(silhouette_descriptor(small), silhouette_descriptor(large), atol=0.05)
+    assert not silhouette_descriptor(np.zeros((10, 10), dtype=bool)).any()
+
+
+def test_match_silhouette():
+    mask = np.zeros((64, 64), dtype=bool)
+    mask[8:56, 20:40] = True
+    mask[8:20, 20:56] = True  # an L shape
+    descriptor = silhouette_descriptor(mask)
+    references = np.stack([silhouette_descriptor(np.ones((10, 10), dtype=bool)), descriptor])
+    assert match_silhouette(descriptor, references) == pytest.approx(1.0)
+    # Rotated and mirrored views match through the dihedral variants
+    assert match_silhouette(silhouette_descriptor(np.rot90(mask)[:, ::-1]), references[1:]) > 0.95
+    assert match_silhouette(descriptor, references[:1]) < 0.8
+    assert match_silhouette(np.zeros_like(descriptor), references) is None
+    assert match_silhouette(descriptor, references[:0]) is None
+
+
+def test_atlas_round_trip_with_concurrent_writers(tmp_path):
+    atlas = build_atlas(_box(), resolution=48)
+    assert atlas.view_names == list(CANONICAL_VIEWS)
+    assert atlas.silhouettes.shape == (len(CANONICAL_VIEWS), 48, 48)
+
+    path = str(tmp_path / 'atlas.npz')
+    errors = []
+
+    def write():
+        try:
+            for _ in range(5):
+                atlas.save(path)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['atlas.npz']  # no temp files left
+    loaded = SilhouetteAtlas.load(path)
+    assert loaded.view_names == atlas.view_names
+    assert np.array_equal(loaded.shading, atlas.shading)
+    assert np.array_equal(loaded.descriptors, atlas.descriptors)
@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pytest
+
+from f3_stl_reader import FACET_DTYPE, stream_stl_features
+
+# Unit cube, outward winding
+_CUBE_VERTICES = np.array([
+    [0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+    [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1],
+], dtype=np.float32)
+_CUBE_FACES = [
+    [0, 2, 1], [0, 3, 2], [4, 5, 6], [4, 6, 7], [0, 1, 5], [0, 5, 4],
+    [2, 3, 7], [2, 7, 6], [1, 2, 6], [1, 6, 5], [3, 0, 4], [3, 4, 7],
+]
+
+
+def _binary_cube(header=b'binary cube', padding=0):
+    records = np.zeros(len(_CUBE_FACES), dtype=FACET_DTYPE)
+    records['vertices'] = _CUBE_VERTICES[_CUBE_FACES]
+    count = np.uint32(len(records)).tobytes()
+    return header.ljust(80, b' ') + count + records.tobytes() + b'\0' * padding
+
+
+def _ascii_cube():
+    lines = ['solid cube']
+    for face in _CUBE_FACES:
+        lines += ['facet normal 0 0 0', 'outer loop']
+        lines += ['vertex %g %g %g' % tuple(_CUBE_VERTICES[i]) for i in face]
+        lines += ['endloop', 'endfacet']
+    lines.append('endsolid cube')
+    return '\n'.join(lines).encode()
+
+
+@pytest.mark.parametrize('padding', [0, 1, 100])
+@pytest.mark.parametrize('kind', ['bytes', 'path', 'stream'])
+def test_binary_stl_with_trailing_padding(tmp_path, kind, padding):
+    data = _binary_cube(padding=padding)
+    if kind == 'bytes':
+        source = data
+    elif kind == 'path':
+        source = str(tmp_path / 'cube.stl')
+        with open(source, 'wb') as fh:
+            fh.write(data)
+    else:
+        source = io.BytesIO(data)
+    features = stream_stl_features(source)
+    assert features['num_facets'] == 12
+    assert features['volume'] == pytest.approx(1.0)
+
+
+def test_ascii_stl_is_not_read_as_binary():
+    features = stream_stl_features(_ascii_cube())
+    assert features['num_facets'] == 12
+    assert features['volume'] == pytest.approx(1.0)
+
+
+def test_exact_size_binary_with_solid_header():
+    features = stream_stl_features(_binary_cube(header=b'solid exported by a CAD tool'))
+    assert features['num_facets'] == 12
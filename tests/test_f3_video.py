@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import f3_video
+from f3_video import sample_video_frames
+
+
+def _gif(values) -> bytes:
+    """Animated GIF whose frame i is a flat grey of values[i] (consecutive values must differ)"""
+    frames = [Image.new('L', (48, 32), int(v)) for v in values]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:], duration=40, loop=0)
+    return buffer.getvalue()
+
+
+def _grey(frame: bytes) -> float:
+    return float(np.asarray(Image.open(io.BytesIO(frame)).convert('L')).mean())
+
+
+def test_uniform_sampling_is_evenly_spaced():
+    values = [40 + 4 * i for i in range(50)]  # frame index recoverable from its grey level
+    frames = sample_video_frames(_gif(values), max_frames=8, mode='uniform')
+    assert len(frames) == 8
+    indices = [round((_grey(frame) - 40) / 4) for frame in frames]
+    assert indices[0] == 0 and indices[-1] >= 40
+    gaps = np.diff(indices)
+    assert gaps.min() > 0 and gaps.max() <= 2 * gaps.min()
+
+
+def test_uniform_sampling_keeps_short_clips_whole():
+    values = [60, 120, 180]
+    frames = sample_video_frames(_gif(values), max_frames=8, mode='uniform')
+    assert [round(_grey(frame)) for frame in frames] == values
+
+
+def test_scene_sampling_keeps_one_frame_per_view():
+    # A turntable clip with four views, each held for ten frames with a little flicker
+    bases = [40, 100, 160, 220]
+    values = [bases[i // 10] + 2 * (i % 2) for i in range(40)]
+    frames = sample_video_frames(_gif(values), max_frames=4, mode='scene')
+    assert [round(_grey(frame)) for frame in frames] == bases
+
+
+def test_sampling_from_a_path(tmp_path):
+    path = tmp_path / 'clip.gif'
+    path.write_bytes(_gif([40 + 4 * i for i in range(20)]))
+    assert len(sample_video_frames(str(path), max_frames=5)) == 5
+
+
+def test_decoding_stops_at_the_frame_limit(monkeypatch):
+    monkeypatch.setattr(f3_video, 'MAX_DECODED_FRAMES', 10)
+    frames = sample_video_frames(_gif([40 + 4 * i for i in range(30)]), max_frames=20)
+    assert [round((_grey(frame) - 40) / 4) for frame in frames] == list(range(10))
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError, match='Unknown video sampling mode'):
+        sample_video_frames(_gif([40, 80]), mode='random')
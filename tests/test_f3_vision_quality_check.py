@@ -0,0 +1,342 @@
+import io
+import os
+from dataclasses import asdict
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from f3_feature_cache import FeatureCache
+from f3_mesh_topology import load_indexed_mesh
+from f3_phash import DUPLICATE_DISTANCE, hamming_distance
+from f3_qc_session import SessionStore
+from f3_reference_index import ReferenceIndex
+from f3_silhouette import _view_rotation, render_view
+from f3_video import sample_video_frames
+import f3_vision_quality_check as vqc
+from f3_vision_quality_check import QualityCheckInput, VisionQualityCheckModel
+from routes import qc
+
+PREDATOR_STL = os.path.join(os.path.dirname(__file__), '..', 'Predator.stl')
+OBLIQUE_VIEWS = [(0.3, -1, 0.4), (-0.5, -1, 0.3), (1, -0.4, 0.5), (0.8, 0.6, 0.6)]
+
+
+def _model(**kwargs) -> VisionQualityCheckModel:
+    """Model with private, memory-only caches and sessions"""
+    kwargs.setdefault('feature_cache', FeatureCache(None))
+    kwargs.setdefault('reference_index', ReferenceIndex(None))
+    kwargs.setdefault('session_store', SessionStore())
+    return VisionQualityCheckModel(**kwargs)
+
+
+def _render_photo(mesh, direction, seed: int) -> bytes:
+    """JPEG 'photo' of the design: shaded render on a plain backdrop, off the canonical views"""
+    depth, shade = render_view(mesh, _view_rotation(direction), 384)
+    mask = np.isfinite(depth)
+    part = np.full((384, 384), 215.0)
+    part[mask] = 70 + 120 * shade[mask]
+    part += np.random.default_rng(seed).normal(0, 2, part.shape)
+    canvas = np.full((480, 640), 215.0)
+    canvas[48:432, 128:512] = part
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(canvas, 0, 255).astype(np.uint8)).convert('RGB').save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope='module')
+def design_photos():
+    mesh = load_indexed_mesh(PREDATOR_STL)
+    return [_render_photo(mesh, direction, seed) for seed, direction in enumerate(OBLIQUE_VIEWS)]
+
+
+def _check(model, photos, job_id='job', tier='medium'):
+    return model.check_quality(QualityCheckInput(
+        evidence_image_paths=photos, job_id=job_id, tolerance_tier=tier, stl_file_path=PREDATOR_STL,
+    ))
+
+
+@pytest.mark.parametrize('coarse_to_fine', [True, False])
+def test_renders_of_the_design_pass(design_photos, coarse_to_fine):
+    result = _check(_model(coarse_to_fine=coarse_to_fine), design_photos)
+    assert result.status == 'pass', result.notes
+    assert any(note.startswith('Design silhouette match') for note in result.notes)
+
+
+def test_design_match_only_penalizes_below_the_floor():
+    apply = VisionQualityCheckModel._apply_design_match
+    assert apply(0.9, None) == 0.9
+    assert apply(0.9, vqc.DESIGN_MATCH_FLOOR) == pytest.approx(0.9)
+    assert apply(0.9, 0.8) == pytest.approx(0.9)
+    assert apply(0.9, vqc.DESIGN_MATCH_FLOOR / 2) == pytest.approx(0.9 * 0.75)
+    assert apply(0.9, 0.0) == pytest.approx(0.45)
+
+
+def _assert_same_features(first, second):
+    assert len(first) == len(second)
+    for a, b in zip(first, second):
+        assert a.keys() == b.keys()
+        for name in a:
+            if isinstance(a[name], np.ndarray):
+                assert np.array_equal(a[name], b[name]), name
+            else:
+                assert a[name] == b[name], name
+
+
+def test_cached_rerun_equals_a_cold_run(design_photos):
+    cold = _model()._analyze_images(design_photos)
+
+    cache = FeatureCache(None)
+    model = _model(feature_cache=cache)
+    model._analyze_images(design_photos[:2])  # a warm cache for half of the photos
+    hits = cache.hits
+    partly_cached = model._analyze_images(design_photos)
+    assert cache.hits == hits + 2
+    fully_cached = model._analyze_images(design_photos)
+    assert cache.hits == hits + 2 + len(design_photos)
+    _assert_same_features(partly_cached, cold)
+    _assert_same_features(fully_cached, cold)
+
+
+def test_cached_check_equals_a_cold_check(design_photos):
+    model = _model(coarse_to_fine=False)
+    cold = _check(model, design_photos, job_id='cold')
+    warm = _check(model, design_photos, job_id='warm')
+    assert model.feature_cache.hits > 0
+    assert asdict(warm) == asdict(cold)
+
+
+def _large_jpeg(width=4000, height=3000, part=None) -> bytes:
+    """Smooth-gradient JPEG, optionally with a dark part at box (left, top, right, bottom)"""
+    gradient = np.linspace(150, 230, width, dtype=np.float32)
+    pixels = np.repeat(np.broadcast_to(gradient, (height, width))[..., None], 3, axis=2).copy()
+    if part is not None:
+        left, top, right, bottom = part
+        pixels[top:bottom, left:right] = 60
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def test_oversized_image_is_rejected_from_the_header():
+    header_only = _large_jpeg()[:2048]  # the pixel data never arrives
+    with pytest.raises(ValueError, match='px limit'):
+        vqc.decode_image(header_only, max_pixels=10_000_000)
+
+
+def _resize_inputs(monkeypatch):
+    """Sizes of the images decode_image resizes to the analysis size"""
+    sizes = []
+    resize = Image.Image.resize
+
+    def recording_resize(self, size, *args, **kwargs):
+        if tuple(size) == vqc.ANALYSIS_SIZE:
+            sizes.append(self.size)
+        return resize(self, size, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, 'resize', recording_resize)
+    return sizes
+
+
+def test_fast_decode_never_materializes_the_full_photo(monkeypatch):
+    photo = _large_jpeg()
+    sizes = _resize_inputs(monkeypatch)
+    fast = vqc.decode_image(photo, crop_to_part=False)
+    full = vqc.decode_image(photo, crop_to_part=False, fast_decode=False)
+    assert sizes[1] == (4000, 3000)
+    assert min(sizes[0]) >= 512 and sizes[0][0] <= 1000  # a 1/4-scale draft
+    assert fast.info['source_size'] == full.info['source_size'] == (4000, 3000)
+    difference = np.abs(np.asarray(fast, dtype=np.int16) - np.asarray(full, dtype=np.int16))
+    assert difference.mean() < 2
+
+
+def test_crop_is_decoded_at_or_above_the_analysis_size(monkeypatch):
+    photo = _large_jpeg(part=(1500, 1000, 2700, 2100))
+    sizes = _resize_inputs(monkeypatch)
+    decoded = vqc.decode_image(photo)
+    assert min(sizes[0]) >= 512 and sizes[0][0] < 1500  # drafted, then cropped to the part
+    crop_width, crop_height = decoded.info['source_size']
+    assert 1200 <= crop_width < 4000 and 1100 <= crop_height < 3000
+
+
+def _pairwise_similarity(model, first, second) -> float:
+    """The per-pair comparison the similarity matrix replaced"""
+    hist_sim = model._compare_histograms(first['histogram'], second['histogram'])
+    color_sim = 1.0 / (1.0 + np.linalg.norm(first['color_mean'] - second['color_mean']) / 255.0)
+    edge_sim = 1.0 - abs(first['edge_density'] - second['edge_density'])
+    return hist_sim * 0.5 + color_sim * 0.3 + edge_sim * 0.2
+
+
+def test_similarity_matrix_matches_the_pairwise_loop(design_photos):
+    model = _model()
+    features = model._analyze_images(design_photos + [_large_jpeg(800, 600, part=(200, 150, 600, 450))])
+    matrix = model._similarity_matrix(features)
+    n = len(features)
+    expected = np.array([[_pairwise_similarity(model, features[i], features[j]) for j in range(n)] for i in range(n)])
+    assert np.allclose(matrix, expected, rtol=0, atol=1e-12)
+    assert np.allclose(matrix, matrix.T)
+
+    pairs = [expected[i, j] for i in range(n) for j in range(i + 1, n)]
+    assert model._compute_image_similarity(features) == pytest.approx(np.mean(pairs), abs=1e-12)
+    assert model._compute_image_similarity(features, matrix) == pytest.approx(np.mean(pairs), abs=1e-12)
+    # Blocks (used when photos are added) are slices of the full matrix
+    assert np.allclose(model._similarity_block(features[3:], features), matrix[3:], rtol=0, atol=1e-12)
+
+
+def _reencode(photo: bytes, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.open(io.BytesIO(photo)).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def _kept(model, job_id, size=vqc.ANALYSIS_SIZE) -> int:
+    return len(model.sessions.get(job_id).state(size).features)
+
+
+def test_near_duplicate_photos_collapse(design_photos):
+    model = _model(coarse_to_fine=False)
+    result = _check(model, design_photos[:3] + [_reencode(design_photos[0], 60)], job_id='dupes')
+    assert _kept(model, 'dupes') == 3
+    assert 'Ignored 1 near-duplicate photo(s)' in result.notes
+
+
+@pytest.fixture(scope='module')
+def turntable_gif():
+    """A turntable clip of the design: 24 frames around the vertical axis"""
+    mesh = load_indexed_mesh(PREDATOR_STL)
+    frames = []
+    for k in range(24):
+        angle = 2 * np.pi * k / 24
+        photo = _render_photo(mesh, (np.cos(angle), np.sin(angle), 0.5), seed=k)
+        frames.append(Image.open(io.BytesIO(photo)).convert('RGB').resize((320, 240)))
+    buffer = io.BytesIO()
+    frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:], duration=40, loop=0)
+    return buffer.getvalue()
+
+
+def test_turntable_frames_are_never_collapsed(turntable_gif):
+    frames = sample_video_frames(turntable_gif)
+    hashes = [vqc.decode_image_array(frame)[2] for frame in frames]
+    distances = [hamming_distance(a, b) for i, a in enumerate(hashes) for b in hashes[i + 1:]]
+    assert min(distances) <= DUPLICATE_DISTANCE  # opposite sides of the part hash alike
+
+    model = _model(coarse_to_fine=False)
+    result = model.check_quality(QualityCheckInput(
+        evidence_image_paths=[], evidence_video_paths=[turntable_gif], job_id='turntable', tolerance_tier='medium',
+        stl_file_path=PREDATOR_STL,
+    ))
+    assert _kept(model, 'turntable') == len(frames)
+    assert not any('near-duplicate' in note for note in result.notes)
+
+
+def test_clear_result_exits_after_the_coarse_pass(design_photos):
+    model = _model()
+    before = vqc.coarse_pass_metrics()
+    result = _check(model, design_photos, job_id='clear', tier='low')
+    assert result.coarse_pass and result.status == 'pass'
+    assert any(note.startswith('Decided from 128x128 thumbnails') for note in result.notes)
+    assert _kept(model, 'clear', vqc.COARSE_SIZE) == len(design_photos)
+    assert model.sessions.get('clear').state(vqc.ANALYSIS_SIZE).analyzed == 0  # no full-size decode
+    after = vqc.coarse_pass_metrics()
+    assert (after['checks'], after['escalations']) == (before['checks'] + 1, before['escalations'])
+
+
+def test_borderline_result_escalates_to_the_full_analysis(design_photos, monkeypatch):
+    monkeypatch.setattr(vqc, 'COARSE_MARGIN', 1.0)  # every coarse score counts as borderline
+    before = vqc.coarse_pass_metrics()
+    escalated = _check(_model(), design_photos, job_id='borderline', tier='low')
+    full = _check(_model(coarse_to_fine=False), design_photos, job_id='full', tier='low')
+    assert not escalated.coarse_pass
+    assert asdict(escalated) == asdict(full)
+    after = vqc.coarse_pass_metrics()
+    assert (after['checks'], after['escalations']) == (before['checks'] + 1, before['escalations'] + 1)
+
+
+def test_metrics_endpoint(design_photos):
+    _check(_model(), design_photos, job_id='metrics', tier='low')
+    app = FastAPI()
+    app.include_router(qc.router, prefix='/qc')
+    metrics = TestClient(app).get('/qc/metrics').json()
+    assert metrics == vqc.coarse_pass_metrics()
+    assert metrics['checks'] >= 1 and metrics['early_exits'] == metrics['checks'] - metrics['escalations']
+    assert metrics['escalation_rate'] == pytest.approx(metrics['escalations'] / metrics['checks'])
+
+
+def _part_features(crack: bool = False, seed: int = 0) -> dict:
+    """Features of a 512x512 photo: a smooth grey part on a light backdrop, optionally cracked"""
+    rng = np.random.default_rng(seed)
+    pixels = np.full((512, 512, 3), 215.0) + rng.normal(0, 2, (512, 512, 3))
+    pixels[64:448, 64:448] = 110.0 + rng.normal(0, 3, (384, 384, 3))
+    if crack:
+        pixels[300:340, 150:190] = 110.0
+        pixels[300:340:4, 150:190] = 20.0  # a patch of dark scratches at about (33%, 62%)
+    image = np.clip(pixels, 0, 255).astype(np.uint8)
+    return vqc.extract_batch_features(image[None])[0]
+
+
+def test_tile_defects_localize_a_scratched_patch():
+    assert VisionQualityCheckModel._tile_defects(_part_features()) == []
+    regions = VisionQualityCheckModel._tile_defects(_part_features(crack=True))
+    assert regions and regions[0]['z_score'] > vqc.DEFECT_Z_THRESHOLD
+    worst = regions[0]
+    center = (worst['x'] + worst['width'] / 2, worst['y'] + worst['height'] / 2)
+    assert center == (pytest.approx(170 / 512, abs=0.07), pytest.approx(320 / 512, abs=0.07))
+
+
+def test_defect_regions_are_reported_per_image():
+    model = _model()
+    features = [_part_features(seed=1), _part_features(crack=True, seed=2)]
+    clean_score, _, _ = model._detect_anomalies(features[:1])
+    score, notes, regions = model._detect_anomalies(features)
+    assert regions and all(region['image'] == 1 for region in regions)
+    assert any(note.startswith('Image 2: Localized surface anomaly') for note in notes)
+    assert score < clean_score
+
+
+def test_passed_photos_are_recorded_once_per_resolution(design_photos):
+    model = _model(coarse_to_fine=False)
+    first = _check(model, design_photos, job_id='first')
+    assert first.status == 'pass'
+    design_hash = vqc.content_key(PREDATOR_STL)
+    full = model._reference_key(design_hash, vqc.ANALYSIS_SIZE)
+    assert model.reference_index.size(full) == len(design_photos)
+    assert model.reference_index.size(model._reference_key(design_hash, vqc.COARSE_SIZE)) == 0
+
+    _check(model, design_photos, job_id='again')  # the same photos for another job
+    assert model.reference_index.size(full) == len(design_photos)
+    _check(_model(coarse_to_fine=True, reference_index=model.reference_index), design_photos, job_id='coarse', tier='low')
+    assert model.reference_index.size(model._reference_key(design_hash, vqc.COARSE_SIZE)) == len(design_photos)
+    assert model.reference_index.size(full) == len(design_photos)
+
+
+@pytest.mark.parametrize('coarse_to_fine', [True, False])
+def test_added_evidence_rescores_like_a_fresh_check(design_photos, coarse_to_fine):
+    photos = design_photos + [_reencode(design_photos[1], 60)]  # includes a near-duplicate
+    incremental = _model(coarse_to_fine=coarse_to_fine)
+    _check(incremental, photos[:2], job_id='job')
+    added = incremental.add_evidence('job', photos[2:])
+    fresh = _check(_model(coarse_to_fine=coarse_to_fine), photos, job_id='job')
+    assert asdict(added) == asdict(fresh)
+    assert _kept(incremental, 'job', vqc.COARSE_SIZE if added.coarse_pass else vqc.ANALYSIS_SIZE) == 4
+
+
+def test_unknown_job_has_no_session(design_photos):
+    with pytest.raises(KeyError):
+        _model().add_evidence('never-checked', design_photos[:1])
+
+
+def test_photos_spilled_after_a_coarse_decision_are_read_back(design_photos, monkeypatch):
+    model = _model()
+    first = _check(model, design_photos[:2], job_id='spill', tier='low')
+    assert first.coarse_pass
+    session = model.sessions.get('spill')
+    assert all(isinstance(source, str) and os.path.exists(source) for source in session.sources)
+    scratch = session.scratch.path
+
+    monkeypatch.setattr(vqc, 'COARSE_MARGIN', 1.0)  # the added photos make the part borderline
+    added = model.add_evidence('spill', design_photos[2:])
+    fresh = _check(_model(coarse_to_fine=False), design_photos, job_id='spill', tier='low')
+    assert not added.coarse_pass
+    assert asdict(added) == asdict(fresh)
+    assert session.sources == [None] * len(design_photos) and not os.path.exists(scratch)
@@ -0,0 +1,46 @@
+import itertools
+import random
+
+from f4_compatibility import DeviceTypeIndex
+from f4_workflow_scheduling import DeviceAvailability
+
+DEVICE_TYPES = ['3d_printer_fdm', '3d_printer_sla', 'cnc_mill', 'cnc_lathe', 'laser_cutter', 'fdm', '']
+REQUIRED_TYPES = ['fdm', 'sla', '3d_printer', 'cnc', 'mill', 'cnc_mill', 'laser', 'printer_fdm', 'waterjet', '_', '']
+
+
+def _devices(seed: int, count: int = 30):
+    rng = random.Random(seed)
+    return [
+        DeviceAvailability(
+            device_id=f'd{i}', device_type=rng.choice(DEVICE_TYPES),
+            available_hours_per_day={}, current_tasks=[], maintenance_scheduled=[],
+        )
+        for i in range(count)
+    ]
+
+
+def _substring_rule(devices, required_types):
+    """The per-task scan the index replaces"""
+    return [d for d in devices if any(required in d.device_type for required in required_types)]
+
+
+def test_index_matches_substring_rule():
+    devices = _devices(seed=3)
+    index = DeviceTypeIndex(devices)
+    requirement_sets = [list(c) for n in range(3) for c in itertools.permutations(REQUIRED_TYPES, n)]
+    for _ in range(2):  # second pass is served from the caches
+        for required_types in requirement_sets:
+            expected = _substring_rule(devices, required_types)
+            assert index.compatible(required_types) == expected, required_types
+            assert index.compatible_positions(required_types) == [devices.index(d) for d in expected]
+            type_ids = index.compatible_type_ids(required_types)
+            assert [d for p, d in enumerate(devices) if index.device_type_ids[p] in type_ids] == expected
+
+
+def test_device_order_is_kept_across_types():
+    devices = _devices(seed=11, count=12)
+    index = DeviceTypeIndex(devices)
+    positions = index.compatible_positions(['3d_printer', 'cnc'])
+    assert positions == sorted(positions)
+    assert index.compatible_positions([]) == [] and index.compatible([]) == []
+    assert DeviceTypeIndex([]).compatible(['fdm']) == []
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from f4_device_timeline import DeviceTimeline
+from f4_workflow_scheduling import DeviceAvailability, ScheduleInput, Task, WorkflowSchedulingModel
+
+MONDAY = datetime(2026, 1, 19)
+
+
+def _device(hours=None, maintenance=None):
+    return DeviceAvailability(
+        device_id='p1',
+        device_type='3d_printer_fdm',
+        available_hours_per_day=hours or {},
+        current_tasks=[],
+        maintenance_scheduled=maintenance or [],
+    )
+
+
+def _task(estimated_hours, deadline):
+    return Task(
+        job_id='t1', priority=5, estimated_hours=estimated_hours, deadline=deadline,
+        required_device_types=['fdm'], pay_amount=100.0, materials_needed=[], tolerance_tier='low',
+    )
+
+
+def test_empty_week_fits_nothing():
+    timeline = DeviceTimeline(_device(), MONDAY, MONDAY)
+    assert timeline.free_intervals() == []
+    assert timeline.earliest_fit(0.0) is None
+    assert timeline.earliest_fit(1.0) is None
+
+
+def test_zero_duration_takes_first_free_gap():
+    # Monday off, Tuesday's window partly under maintenance
+    timeline = DeviceTimeline(
+        _device({'2026-01-19': 0.0}, [(MONDAY + timedelta(hours=32), MONDAY + timedelta(hours=34))]),
+        MONDAY, MONDAY + timedelta(days=7),
+    )
+    assert timeline.earliest_fit(0.0) == pytest.approx(34.0)
+    assert timeline.earliest_fit(0.0, latest_end=30.0) is None
+
+
+def test_zero_duration_task_in_empty_week_is_unscheduled():
+    result = WorkflowSchedulingModel().schedule(ScheduleInput(
+        tasks=[_task(0.0, MONDAY + timedelta(days=1))],
+        devices=[_device()],
+        week_start=MONDAY,
+        week_end=MONDAY,
+    ))
+    assert result.scheduled_tasks == []
+    assert result.unscheduled_tasks == ['t1']
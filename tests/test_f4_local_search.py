@@ -0,0 +1,121 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from f4_device_timeline import DeviceTimeline, to_hours, week_origin
+from f4_workflow_scheduling import DeviceAvailability, ScheduleInput, Task, WorkflowSchedulingModel
+
+MONDAY = datetime(2026, 1, 19)
+DEVICE_TYPES = ['3d_printer_fdm', '3d_printer_sla', 'cnc_mill']
+REQUIRED_TYPES = [['fdm'], ['sla'], ['cnc'], ['3d_printer'], ['fdm', 'cnc']]
+
+
+def _task(job_id, hours, deadline, pay, priority=5, required=('fdm',)):
+    return Task(
+        job_id=job_id, priority=priority, estimated_hours=hours, deadline=deadline,
+        required_device_types=list(required), pay_amount=pay, materials_needed=[], tolerance_tier='low',
+    )
+
+
+def _device(device_id, device_type='3d_printer_fdm', hours=None, maintenance=None, efficiency=1.0):
+    return DeviceAvailability(
+        device_id=device_id, device_type=device_type, available_hours_per_day=hours or {},
+        current_tasks=[], maintenance_scheduled=maintenance or [], efficiency_factor=efficiency,
+    )
+
+
+def _random_input(seed: int, time_budget_ms: float = 0.0) -> ScheduleInput:
+    """An overbooked week: more work than the devices' free hours"""
+    rng = random.Random(seed)
+    devices = []
+    for i in range(4):
+        start = MONDAY + timedelta(days=rng.randrange(5), hours=rng.choice([9, 12]))
+        devices.append(_device(
+            f'd{i}', rng.choice(DEVICE_TYPES),
+            hours={(MONDAY + timedelta(days=d)).date().isoformat(): rng.choice([0.0, 4.0, 8.0, 10.0]) for d in range(7)},
+            maintenance=[(start, start + timedelta(hours=rng.uniform(1, 4)))],
+            efficiency=rng.choice([0.5, 0.8, 1.0]),
+        ))
+    tasks = [
+        _task(
+            f't{i}', rng.uniform(0.5, 9.0), MONDAY + timedelta(days=rng.uniform(0.5, 7)),
+            round(rng.uniform(20, 900), 2), rng.randint(1, 10), rng.choice(REQUIRED_TYPES),
+        )
+        for i in range(40)
+    ]
+    return ScheduleInput(
+        tasks=tasks, devices=devices, week_start=MONDAY, week_end=MONDAY + timedelta(days=7),
+        time_budget_ms=time_budget_ms,
+    )
+
+
+def _assert_feasible(input_data: ScheduleInput, result):
+    tasks = {t.job_id: t for t in input_data.tasks}
+    devices = {d.device_id: d for d in input_data.devices}
+    origin = week_origin(input_data.week_start)
+    booked = {device_id: [] for device_id in devices}
+    for st in result.scheduled_tasks:
+        task, device = tasks[st.job_id], devices[st.device_id]
+        assert any(required in device.device_type for required in task.required_device_types)
+        start, end = to_hours(st.start_time, origin), to_hours(st.end_time, origin)
+        assert end - start == pytest.approx(task.estimated_hours / device.efficiency_factor)
+        assert st.end_time <= task.deadline + timedelta(microseconds=1)
+        # Within one free interval of the device's empty week
+        free = DeviceTimeline(device, input_data.week_start, input_data.week_end).free_intervals()
+        assert any(lo - 1e-6 <= start and end <= hi + 1e-6 for lo, hi in free), st.job_id
+        booked[st.device_id].append((start, end))
+    for intervals in booked.values():
+        intervals.sort()
+        for (_, end), (start, _) in zip(intervals, intervals[1:]):
+            assert start >= end - 1e-6  # no overlaps
+    scheduled = {st.job_id for st in result.scheduled_tasks}
+    assert len(scheduled) == len(result.scheduled_tasks)
+    assert scheduled.isdisjoint(result.unscheduled_tasks)
+    assert scheduled | set(result.unscheduled_tasks) == set(tasks)
+    assert result.total_profit == pytest.approx(sum(tasks[j].pay_amount for j in scheduled))
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_annealing_is_never_worse_than_greedy(seed):
+    model = WorkflowSchedulingModel()
+    greedy = model.schedule(_random_input(seed))
+    annealed_input = _random_input(seed, time_budget_ms=40)
+    annealed = model.schedule(annealed_input)
+    _assert_feasible(annealed_input, annealed)
+    assert annealed.total_profit >= greedy.total_profit - 1e-6
+
+
+def test_annealing_beats_a_greedy_trap():
+    # One 8-hour day: greedy takes the urgent 8-hour job first, the two 4-hour jobs pay more
+    deadline = MONDAY + timedelta(days=1)
+    input_data = ScheduleInput(
+        tasks=[_task('long', 8.0, deadline, 500.0, priority=10),
+               _task('a', 4.0, deadline, 400.0, priority=1),
+               _task('b', 4.0, deadline, 400.0, priority=1)],
+        devices=[_device('p1')], week_start=MONDAY, week_end=deadline,
+    )
+    model = WorkflowSchedulingModel()
+    assert model.schedule(input_data).total_profit == pytest.approx(500.0)
+    input_data.time_budget_ms = 200
+    result = model.schedule(input_data)
+    _assert_feasible(input_data, result)
+    assert result.total_profit == pytest.approx(800.0)
+    assert result.unscheduled_tasks == ['long']
+
+
+@pytest.mark.parametrize('time_budget_ms', [20, 150])
+def test_annealing_respects_the_time_budget(time_budget_ms):
+    model = WorkflowSchedulingModel()
+    input_data = _random_input(0)
+    begin = time.perf_counter()
+    model.schedule(input_data)
+    greedy_seconds = time.perf_counter() - begin
+
+    input_data.time_budget_ms = time_budget_ms
+    begin = time.perf_counter()
+    model.schedule(input_data)
+    elapsed = time.perf_counter() - begin
+    # The search checks the clock every few hundred moves; allow for that and the greedy pass
+    assert elapsed <= time_budget_ms / 1000.0 + greedy_seconds + 0.1
@@ -0,0 +1,70 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from routes import qc
+
+PREDATOR_STL = os.path.join(os.path.dirname(__file__), '..', 'Predator.stl')
+
+
+def _photo(seed: int) -> bytes:
+    """A grey part on a light backdrop, JPEG-encoded"""
+    rng = np.random.default_rng(seed)
+    pixels = np.full((240, 320, 3), 200.0) + rng.normal(0, 3, (240, 320, 3))
+    pixels[60:180, 90:230] = 90.0 + rng.normal(0, 6, (120, 140, 3))
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(qc, 'BATCH_CONCURRENCY', 2)
+    monkeypatch.setattr(qc, 'BATCH_MAX_BYTES', 2 * 2_000_000)  # 2 MB per part
+    app = FastAPI()
+    app.include_router(qc.router, prefix='/qc')
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_batch_reports_each_part(stand_in, client):
+    with open(PREDATOR_STL, 'rb') as fh:
+        stand_in.files['/design.stl'] = fh.read()
+    for i in range(3):
+        stand_in.files[f'/p{i}.jpg'] = _photo(i)
+    stand_in.files['/huge.jpg'] = os.urandom(3_000_000)
+    url = stand_in.url
+    parts = [
+        {'part_id': 'ok', 'job_id': 'J1', 'manufacturer_id': 'm1', 'stl_file_url': url('/design.stl'),
+         'evidence_photo_urls': [url('/p0.jpg'), url('/p1.jpg')], 'tolerance_tier': 'low'},
+        {'part_id': 'one-missing', 'job_id': 'J1', 'stl_file_url': url('/design.stl'),
+         'evidence_photo_urls': [url('/missing.jpg'), url('/p2.jpg')], 'tolerance_tier': 'low'},
+        {'part_id': 'none', 'job_id': 'J2', 'evidence_photo_urls': [url('/missing.jpg')]},
+        {'part_id': 'too-big', 'job_id': 'J2', 'evidence_photo_urls': [url('/p0.jpg'), url('/huge.jpg')]},
+    ]
+    response = client.post('/qc/batch', json={'parts': parts})
+    assert response.status_code == 200
+    body = response.json()
+    results = {part['part_id']: part for part in body['parts']}
+    assert [part['part_id'] for part in body['parts']] == ['ok', 'one-missing', 'none', 'too-big']
+
+    assert results['ok']['manufacturer_id'] == 'm1'
+    for part_id in ('ok', 'one-missing'):
+        assert 'error' not in results[part_id]
+        assert 0.0 <= results[part_id]['qc_score'] <= 1.0
+    assert results['none']['error'] == "At least one evidence photo is required"
+    assert 'per-part limit' in results['too-big']['error']
+
+    assert body['jobs']['J1']['parts'] == 2 and body['jobs']['J1']['errors'] == 0
+    assert body['jobs']['J2']['parts'] == 2 and body['jobs']['J2']['errors'] == 2
+
+
+def test_batch_limits(client):
+    assert client.post('/qc/batch', json={'parts': []}).status_code == 400
+    too_many = [{'part_id': str(i), 'job_id': 'J', 'evidence_photo_urls': []} for i in range(qc.BATCH_MAX_PARTS + 1)]
+    assert client.post('/qc/batch', json={'parts': too_many}).status_code == 400
@@ -0,0 +1,162 @@
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import qc_jobs
+from qc_jobs import DONE, FAILED, QUEUED, RUNNING, JobStore, check_callback_url
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def _payload(tier='medium'):
+    return {'job_id': 'J1', 'evidence_photo_urls': ['https://example.com/p.jpg'], 'tolerance_tier': tier}
+
+
+def test_each_job_is_claimed_once(store):
+    for i in range(20):
+        store.submit(f'J{i}', {'job_id': f'J{i}'})
+    claimed, lock = [], threading.Lock()
+
+    def work(worker_id):
+        local = JobStore(store.db_path)  # own connection, like a worker process
+        while (job := local.claim(worker_id)) is not None:
+            with lock:
+                claimed.append(job['job_id'])
+
+    threads = [threading.Thread(target=work, args=(f'w{i}',)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(f'J{i}' for i in range(20))
+    assert store.counts() == {RUNNING: 20}
+
+
+def test_expired_lease_is_reclaimed_until_max_attempts(store, monkeypatch):
+    monkeypatch.setattr(qc_jobs, 'JOB_LEASE_SECONDS', -1.0)  # every lease is already expired
+    store.submit('J1', _payload())
+    for attempt in range(1, qc_jobs.JOB_MAX_ATTEMPTS + 1):
+        job = store.claim(f'w{attempt}')
+        assert job['attempt'] == attempt
+    assert store.claim('w-last') is None
+    job = store.get('J1')
+    assert job['status'] == FAILED and job['error'] == 'Worker lost the job too many times'
+
+
+def test_live_lease_is_not_reclaimed(store):
+    store.submit('J1', _payload())
+    assert store.claim('w1') is not None
+    assert store.claim('w2') is None
+
+
+def test_failures_are_retried_until_max_attempts(store):
+    store.submit('J1', _payload())
+    for attempt in range(1, qc_jobs.JOB_MAX_ATTEMPTS + 1):
+        job = store.claim('w1')
+        assert job['attempt'] == attempt
+        store.fail(job['job_id'], job['fingerprint'], f'boom {attempt}')
+    job = store.get('J1')
+    assert job['status'] == FAILED and job['error'] == f'boom {qc_jobs.JOB_MAX_ATTEMPTS}'
+    assert store.claim('w1') is None
+
+
+def test_bad_input_is_not_retried(store):
+    store.submit('J1', _payload())
+    job = store.claim('w1')
+    store.fail(job['job_id'], job['fingerprint'], 'no photos', retry=False)
+    assert store.get('J1')['status'] == FAILED
+
+
+def test_resubmission_coalesces_by_fingerprint(store):
+    first = store.submit('J1', _payload())
+    assert first['status'] == QUEUED and not first['coalesced']
+    job = store.claim('w1')
+    assert store.submit('J1', _payload(), callback_url='https://example.com/cb')['coalesced']
+    assert store.get('J1')['callback_url'] == 'https://example.com/cb'
+    assert store.complete(job['job_id'], job['fingerprint'], {'qc_score': 0.9})
+    again = store.submit('J1', _payload())
+    assert again['coalesced'] and again['status'] == DONE and again['result'] == {'qc_score': 0.9}
+
+
+def test_changed_payload_replaces_the_job(store):
+    store.submit('J1', _payload('medium'))
+    stale = store.claim('w1')
+    replaced = store.submit('J1', _payload('high'))
+    assert not replaced['coalesced'] and replaced['status'] == QUEUED and replaced['attempts'] == 0
+    # The old run's result no longer applies
+    assert not store.complete(stale['job_id'], stale['fingerprint'], {'qc_score': 0.9})
+    assert not store.fail(stale['job_id'], stale['fingerprint'], 'boom')
+    assert store.claim('w2')['payload']['tolerance_tier'] == 'high'
+
+
+def test_failed_job_is_rerun_on_resubmission(store):
+    store.submit('J1', _payload())
+    job = store.claim('w1')
+    store.fail(job['job_id'], job['fingerprint'], 'bad', retry=False)
+    again = store.submit('J1', _payload())
+    assert not again['coalesced'] and again['status'] == QUEUED
+
+
+@pytest.mark.parametrize('url', [
+    'http://93.184.216.34/cb',  # plain http is off by default
+    'ftp://93.184.216.34/cb',
+    'https:///cb',
+    'https://127.0.0.1/cb',
+    'https://localhost:8000/cb',
+    'https://10.0.0.5/cb',
+    'https://192.168.1.10/cb',
+    'https://169.254.169.254/latest/meta-data',  # cloud metadata service
+    'https://[::1]/cb',
+    'https://[::ffff:127.0.0.1]/cb',
+    'https://0.0.0.0/cb',
+])
+def test_callback_url_refused(url):
+    with pytest.raises(ValueError):
+        check_callback_url(url)
+
+
+def test_callback_url_allowlist(monkeypatch):
+    check_callback_url('https://93.184.216.34/cb')
+    monkeypatch.setattr(qc_jobs, 'CALLBACK_HOSTS', ['.example.com'])
+    with pytest.raises(ValueError, match='not allowed'):
+        check_callback_url('https://93.184.216.34/cb')
+    with pytest.raises(ValueError, match='not allowed'):
+        check_callback_url('https://evil-example.com/cb')
+
+
+def test_refused_callback_is_not_sent(stand_in, monkeypatch):
+    monkeypatch.setattr(qc_jobs, 'CALLBACK_SCHEMES', {'http', 'https'})
+    requests = []
+    stand_in.server.RequestHandlerClass.do_POST = lambda handler: requests.append(handler.path)
+    qc_jobs._post_callback(stand_in.url('/cb'), {'job_id': 'J1'})  # loopback
+    assert requests == []
+
+
+def test_submit_rejects_private_callback(monkeypatch, tmp_path):
+    from routes import qc
+
+    monkeypatch.setattr(qc, 'get_store', lambda: JobStore(str(tmp_path / 'jobs.sqlite3')))
+    app = FastAPI()
+    app.include_router(qc.router, prefix='/qc')
+    client = TestClient(app)
+    body = _payload()
+    response = client.post('/qc/jobs', json={**body, 'callback_url': 'https://127.0.0.1/cb'})
+    assert response.status_code == 400
+    assert 'non-public' in response.json()['detail']
+    response = client.post('/qc/jobs', json={**body, 'callback_url': 'https://93.184.216.34/cb'})
+    assert response.status_code == 202
+
+
+def test_pool_is_shared_between_api_and_workers(monkeypatch):
+    monkeypatch.delenv('MAMA_F3_POOL_WORKERS', raising=False)
+    monkeypatch.setattr(qc_jobs.os, 'cpu_count', lambda: 12)
+    assert qc_jobs.pool_workers_per_process(2) == 4
+    assert qc_jobs.pool_workers_per_process(0) == 12
+    assert qc_jobs.pool_workers_per_process(20) == 1
+    monkeypatch.setenv('MAMA_F3_POOL_WORKERS', '3')
+    assert qc_jobs.pool_workers_per_process(2) == 3